@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Prompt Generator Benchmarks
+Performance checks for generate_prompt.py. Each command exits non-zero when a
+hard time bound is exceeded or a result regresses against a stored baseline,
+so it can gate CI like a test run.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from generate_prompt import PromptGenerator, TemplateSyntaxError, __version__
+
+
+# ---------------------------------------------------------------------------
+# Adversarial corpus
+# ---------------------------------------------------------------------------
+
+FILLER = (
+    "Use [package-manager] to add dependencies to [package_file], run "
+    "`[build_command]` and check the result with `[linter]`.\n"
+    "```[language]\nFuture<Either<Failure, T>> load();\n```\n"
+)
+
+
+def unclosed_markers(size: int) -> str:
+    """Thousands of BEGIN markers that are never closed, spread over the text."""
+    count = max(1, size // 200)
+    chunk = FILLER[:max(0, size // count - 24)]
+    return ''.join(f"<!-- BEGIN:TAG{i % 7} -->{chunk}" for i in range(count))
+
+
+def stray_end_markers(size: int) -> str:
+    """END markers without any BEGIN."""
+    count = max(1, size // 200)
+    chunk = FILLER[:max(0, size // count - 22)]
+    return ''.join(f"{chunk}<!-- END:TAG{i % 7} -->" for i in range(count))
+
+
+def deep_nesting(size: int) -> str:
+    """Balanced sections nested thousands of levels deep."""
+    depth = max(1, size // 64)
+    tags = ['FLUTTER', 'REACT', 'KOTLIN', 'GO']
+    opening = ''.join(f"<!-- BEGIN:{tags[i % 4]} -->x" for i in range(depth))
+    closing = ''.join(f"<!-- END:{tags[i % 4]} -->" for i in reversed(range(depth)))
+    return opening + closing
+
+
+def crossed_nesting(size: int) -> str:
+    """Sections whose END markers close them in the wrong order."""
+    depth = max(1, size // 64)
+    opening = ''.join(f"<!-- BEGIN:T{i} -->x" for i in range(depth))
+    closing = ''.join(f"<!-- END:T{i} -->" for i in range(depth))
+    return opening + closing
+
+
+def truncated_markers(size: int) -> str:
+    """Marker prefixes with long tag names and no closing -->."""
+    word = 'a' * 4000
+    count = max(1, size // (len(word) + 12))
+    return ''.join(f"<!-- BEGIN:{word}\n" for _ in range(count))
+
+
+def large_template(size: int) -> str:
+    """Megabyte-scale document built from well-formed language sections."""
+    block = (
+        "<!-- BEGIN:FLUTTER -->\n" + FILLER + "<!-- END:FLUTTER -->\n"
+        "<!-- BEGIN:REACT -->\n" + FILLER + "<!-- END:REACT -->\n"
+        + FILLER
+    )
+    return block * max(1, size // len(block))
+
+
+ADVERSARIAL_CASES: Dict[str, Callable[[int], str]] = {
+    'unclosed_markers': unclosed_markers,
+    'stray_end_markers': stray_end_markers,
+    'deep_nesting': deep_nesting,
+    'crossed_nesting': crossed_nesting,
+    'truncated_markers': truncated_markers,
+    'large_template': large_template,
+}
+
+FUZZ_ATOMS = [
+    '<!-- BEGIN:REACT -->', '<!-- END:REACT -->', '<!--BEGIN:go-->', '<!-- end:GO -->',
+    '<!-- BEGIN:FLUTTER -->', '<!-- END:FLUTTER -->', '<!-- BEGIN:', '-->', '<!--',
+    '[language]', '```[LANGUAGE]', '```', '[extension]', 'pub dependencies',
+    'pubspec.yaml', 'Future<Either<', '---', '\n', ' ', 'text',
+]
+
+
+def fuzz_corpus(count: int, seed: int = 0) -> List[str]:
+    """Seeded random marker soup."""
+    rnd = random.Random(seed)
+    return [
+        ''.join(rnd.choice(FUZZ_ATOMS) for _ in range(rnd.randint(0, 400)))
+        for _ in range(count)
+    ]
+
+
+def _time_render(generator: PromptGenerator, content: str, language: str) -> float:
+    """Render content once from scratch and return the elapsed seconds."""
+    generator._compiled_templates.clear()
+    lang_config = generator.get_language_config(language)
+    start = time.perf_counter()
+    try:
+        generator.customize_content(content, lang_config, 'Benchmark requirements', language)
+    except TemplateSyntaxError:
+        pass
+    return time.perf_counter() - start
+
+
+def run_adversarial(args) -> int:
+    """Render the adversarial corpus in both section modes under hard time bounds."""
+    failures = []
+    with tempfile.TemporaryDirectory(prefix='prompt-bench-') as temp_dir:
+        base_dir = Path(temp_dir)
+        size = int(args.size_mb * 1024 * 1024)
+        print(f"{'case':<20} {'mode':<8} {'size':>10} {'time':>10} {'4x size':>10} {'ratio':>6}")
+        for name, build in ADVERSARIAL_CASES.items():
+            small, large = build(size), build(size * 4)
+            for strict in (True, False):
+                generator = PromptGenerator(base_dir, strict_sections=strict)
+                elapsed = _time_render(generator, small, 'react')
+                elapsed_large = _time_render(generator, large, 'react')
+                ratio = elapsed_large / max(elapsed, 1e-6)
+                mode = 'strict' if strict else 'lenient'
+                print(f"{name:<20} {mode:<8} {len(small):>10} {elapsed:>9.3f}s "
+                      f"{elapsed_large:>9.3f}s {ratio:>6.1f}")
+                if elapsed_large > args.max_seconds:
+                    failures.append(f"{name} ({mode}): {elapsed_large:.3f}s > {args.max_seconds}s")
+                # Linear work grows ~4x; allow noise but catch quadratic (16x) growth
+                if elapsed > 0.01 and ratio > args.max_ratio:
+                    failures.append(f"{name} ({mode}): 4x input took {ratio:.1f}x longer")
+
+        start = time.perf_counter()
+        for content in fuzz_corpus(args.fuzz):
+            for strict in (True, False):
+                generator = PromptGenerator(base_dir, strict_sections=strict)
+                try:
+                    generator.customize_content(
+                        content, generator.get_language_config('flutter'), None, 'flutter'
+                    )
+                except TemplateSyntaxError:
+                    if not strict:
+                        failures.append(f"lenient mode raised on fuzz input {content[:60]!r}")
+        elapsed = time.perf_counter() - start
+        print(f"{'fuzz':<20} {'both':<8} {args.fuzz:>10} {elapsed:>9.3f}s")
+        if elapsed > args.max_seconds:
+            failures.append(f"fuzz corpus: {elapsed:.3f}s > {args.max_seconds}s")
+
+    for failure in failures:
+        print(f"✗ {failure}", file=sys.stderr)
+    if not failures:
+        print("✓ All adversarial cases within bounds")
+    return 1 if failures else 0
+
+
+# ---------------------------------------------------------------------------
+# Pipeline benchmarks
+# ---------------------------------------------------------------------------
+
+DEFAULT_SIZES_KB = [10, 100, 1024, 10 * 1024, 50 * 1024]
+
+LANGUAGE_INPUTS = [
+    'flutter', 'React.js', 'react typescript', 'TSX', 'android kotlin', 'SwiftUI',
+    'node.js', 'python', 'golang', 'C#', 'rust', 'java', 'ios', 'unknown',
+]
+
+
+def _measure(func: Callable[[], int], repeat: int) -> Dict:
+    """
+    Time func (best of repeat runs), then run it once more under tracemalloc.
+
+    func returns the amount of work it did (calls or bytes), which is turned
+    into a throughput figure.
+    """
+    best = float('inf')
+    work = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work = func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': best,
+        'work': work,
+        'throughput': work / max(best, 1e-9),
+        'peak_memory': peak,
+    }
+
+
+def _pipeline_cases(generator: PromptGenerator, output_dir: Path,
+                    sizes_kb: List[int]) -> Dict[str, Callable[[], int]]:
+    """Build the named benchmark callables over the real and synthetic templates."""
+    templates = {
+        prompt_type: generator.read_template(config['template'])
+        for prompt_type, config in generator.PROMPT_TYPES.items()
+    }
+    languages = list(generator.languages)
+    lang_configs = {lang: generator.get_language_config(lang) for lang in languages}
+
+    def normalize_language() -> int:
+        for _ in range(1000):
+            for language in LANGUAGE_INPUTS:
+                generator.normalize_language(language)
+        return 1000 * len(LANGUAGE_INPUTS)
+
+    def process_conditional_sections() -> int:
+        total = 0
+        for content in templates.values():
+            for lang in languages:
+                generator._process_conditional_sections(content, lang)
+                total += len(content)
+        return total
+
+    def clear_stages() -> None:
+        # Measure the rendering, not the per-language stage memo
+        for results in generator._stages.values():
+            results.clear()
+
+    def customize_content() -> int:
+        clear_stages()
+        total = 0
+        for content in templates.values():
+            for lang in languages:
+                generator.customize_content(content, lang_configs[lang], 'Benchmark', lang)
+                total += len(content)
+        return total
+
+    def generate() -> int:
+        count = 0
+        for prompt_type in templates:
+            for lang in languages:
+                generator.generate(prompt_type, lang, 'Benchmark', None, output_dir)
+                count += 1
+        return count
+
+    def generate_all() -> int:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for lang in languages:
+                generator.generate_all(lang, 'Benchmark', None, output_dir)
+        return len(languages)
+
+    def render_matrix() -> int:
+        clear_stages()
+        for prompt_type in templates:
+            generator.render_matrix(prompt_type, languages, 'Benchmark')
+        return len(templates) * len(languages)
+
+    cases = {
+        'normalize_language': normalize_language,
+        'process_conditional_sections': process_conditional_sections,
+        'customize_content': customize_content,
+        'generate': generate,
+        'generate_all': generate_all,
+        'render_matrix': render_matrix,
+    }
+    for size_kb in sizes_kb:
+        content = large_template(size_kb * 1024)
+
+        def synthetic(content=content) -> int:
+            clear_stages()
+            generator.customize_content(content, lang_configs['react'], 'Benchmark', 'react')
+            return len(content)
+
+        cases[f'synthetic_{size_kb}kb'] = synthetic
+    return cases
+
+
+UNITS = {
+    'normalize_language': 'calls/s',
+    'generate': 'files/s',
+    'generate_all': 'languages/s',
+    'render_matrix': 'prompts/s',
+}
+
+
+def _format_throughput(name: str, throughput: float) -> str:
+    """Human-readable throughput for the results table."""
+    unit = UNITS.get(name)
+    if unit:
+        return f"{throughput:,.0f} {unit}"
+    return f"{throughput / (1024 * 1024):,.2f} MB/s"
+
+
+def compare_results(current: Dict, baseline: Dict, max_slowdown: float,
+                    max_memory_growth: float) -> List[str]:
+    """Return the regressions of current against baseline beyond the thresholds."""
+    failures = []
+    for name, base in baseline['benchmarks'].items():
+        result = current['benchmarks'].get(name)
+        if result is None:
+            continue
+        if result['throughput'] < base['throughput'] * (1 - max_slowdown):
+            change = 1 - result['throughput'] / base['throughput']
+            failures.append(f"{name}: throughput dropped {change:.0%} "
+                            f"(limit {max_slowdown:.0%})")
+        if result['peak_memory'] > base['peak_memory'] * (1 + max_memory_growth):
+            change = result['peak_memory'] / max(base['peak_memory'], 1) - 1
+            failures.append(f"{name}: peak memory grew {change:.0%} "
+                            f"(limit {max_memory_growth:.0%})")
+    return failures
+
+
+def run_pipeline(args) -> int:
+    """Time every pipeline stage over the full matrix and the synthetic templates."""
+    sizes_kb = [size for size in args.sizes_kb if size <= args.max_size_mb * 1024]
+    with tempfile.TemporaryDirectory(prefix='prompt-bench-') as temp_dir:
+        output_dir = Path(temp_dir)
+        generator = PromptGenerator(args.base_dir)
+        results = {
+            'version': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(),
+            'benchmarks': {},
+        }
+        print(f"{'benchmark':<30} {'time':>10} {'throughput':>20} {'peak memory':>14}")
+        for name, func in _pipeline_cases(generator, output_dir, sizes_kb).items():
+            if args.filter and args.filter not in name:
+                continue
+            result = _measure(func, args.repeat)
+            results['benchmarks'][name] = result
+            print(f"{name:<30} {result['seconds']:>9.4f}s "
+                  f"{_format_throughput(name, result['throughput']):>20} "
+                  f"{result['peak_memory'] / 1024:>11,.0f} KB")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + '\n', encoding='utf-8')
+        print(f"Results written to {args.output}")
+    if not args.baseline:
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+    failures = compare_results(results, baseline, args.max_slowdown, args.max_memory_growth)
+    for failure in failures:
+        print(f"✗ {failure}", file=sys.stderr)
+    if not failures:
+        print(f"✓ No regressions against {args.baseline}")
+    return 1 if failures else 0
+
+
+def _size_list(value: str) -> List[int]:
+    """Parse a comma-separated list of sizes in KB."""
+    return [int(size) for size in value.split(',') if size.strip()]
+
+
+# ---------------------------------------------------------------------------
+# Startup
+# ---------------------------------------------------------------------------
+
+# Modules generate_prompt must not import until a code path needs them
+DEFERRED_MODULES = [
+    'argparse', 'json', 'hashlib', 'threading', 'tempfile', 'datetime',
+    'concurrent.futures', 'http.server', 'socketserver', 'tracemalloc', 'cProfile', 'csv',
+]
+
+STARTUP_PROBE = """
+import os, sys
+sys.path.insert(0, {repo_dir!r})
+import generate_prompt
+loaded = [name for name in {deferred!r} if name in sys.modules]
+generator = generate_prompt.PromptGenerator({base_dir!r})
+generator.normalize_language('React.js')
+generator.get_language_config('flutter')
+print(','.join(loaded))
+"""
+
+
+def _import_time_ms(repo_dir: Path) -> float:
+    """Cumulative import time of generate_prompt in a fresh interpreter, from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         f"import sys; sys.path.insert(0, {str(repo_dir)!r}); import generate_prompt"],
+        capture_output=True, text=True, check=True,
+    )
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'generate_prompt':
+            return int(fields[1]) / 1000
+    raise RuntimeError('generate_prompt missing from -X importtime output')
+
+
+def run_startup(args) -> int:
+    """Check the import time budget and that importing and constructing have no side effects."""
+    failures = []
+    repo_dir = Path(__file__).resolve().parent
+    # Measure warm starts: bytecode is normally cached after the first run
+    import py_compile
+    py_compile.compile(str(repo_dir / 'generate_prompt.py'))
+    timings = [_import_time_ms(repo_dir) for _ in range(args.runs)]
+    best = min(timings)
+    print(f"import generate_prompt: best {best:.1f}ms of {args.runs} runs "
+          f"(budget {args.max_ms:.0f}ms)")
+    if best > args.max_ms:
+        failures.append(f"import took {best:.1f}ms > {args.max_ms:.0f}ms")
+
+    with tempfile.TemporaryDirectory(prefix='prompt-startup-') as temp_dir:
+        base_dir = Path(temp_dir)
+        env = dict(os.environ, HOME=str(base_dir), XDG_CACHE_HOME=str(base_dir / 'cache'))
+        probe = STARTUP_PROBE.format(
+            repo_dir=str(repo_dir), deferred=DEFERRED_MODULES, base_dir=str(base_dir)
+        )
+        result = subprocess.run([sys.executable, '-c', probe], capture_output=True,
+                                text=True, check=True, cwd=str(base_dir), env=env)
+        loaded = [name for name in result.stdout.strip().split(',') if name]
+        if loaded:
+            failures.append(f"importing eagerly loads {', '.join(loaded)}")
+        created = sorted(str(path.relative_to(base_dir)) for path in base_dir.rglob('*'))
+        if created:
+            failures.append(f"import and construction created {', '.join(created)}")
+
+    for failure in failures:
+        print(f"✗ {failure}", file=sys.stderr)
+    if not failures:
+        print("✓ Startup within budget and free of side effects")
+    return 1 if failures else 0
+
+
+def main():
+    """Main CLI entry point."""
+    parser = argparse.ArgumentParser(description='Benchmark the prompt generator')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    adversarial = subparsers.add_parser(
+        'adversarial',
+        help='Render malformed and megabyte-scale templates under a hard time bound'
+    )
+    adversarial.add_argument('--size-mb', type=float, default=1.0,
+                             help='Base size of each generated template (default: 1)')
+    adversarial.add_argument('--max-seconds', type=float, default=5.0,
+                             help='Hard upper bound per case at 4x the base size (default: 5)')
+    adversarial.add_argument('--max-ratio', type=float, default=8.0,
+                             help='Largest allowed slowdown for 4x the input (default: 8)')
+    adversarial.add_argument('--fuzz', type=int, default=500,
+                             help='Number of random fuzz templates (default: 500)')
+    adversarial.set_defaults(func=run_adversarial)
+
+    pipeline = subparsers.add_parser(
+        'pipeline',
+        help='Time each generation stage over every prompt type and language'
+    )
+    pipeline.add_argument('--base-dir', type=Path,
+                          help='Directory with the templates (default: script directory)')
+    pipeline.add_argument('--sizes-kb', type=_size_list, default=DEFAULT_SIZES_KB,
+                          help='Synthetic template sizes in KB (default: 10 KB to 50 MB)')
+    pipeline.add_argument('--max-size-mb', type=float, default=50.0,
+                          help='Skip synthetic templates larger than this (default: 50)')
+    pipeline.add_argument('--repeat', type=int, default=3,
+                          help='Timed runs per benchmark; the best is kept (default: 3)')
+    pipeline.add_argument('--filter',
+                          help='Only run benchmarks whose name contains this text')
+    pipeline.add_argument('--output', type=Path,
+                          help='Write the results as JSON to this file')
+    pipeline.add_argument('--baseline', type=Path,
+                          help='Compare against results from an earlier --output run')
+    pipeline.add_argument('--max-slowdown', type=float, default=0.25,
+                          help='Largest allowed throughput drop vs. the baseline (default: 0.25)')
+    pipeline.add_argument('--max-memory-growth', type=float, default=0.25,
+                          help='Largest allowed peak memory growth vs. the baseline (default: 0.25)')
+    pipeline.set_defaults(func=run_pipeline)
+
+    startup = subparsers.add_parser(
+        'startup',
+        help='Enforce the import time budget (-X importtime) and side-effect-free construction'
+    )
+    startup.add_argument('--max-ms', type=float, default=25.0,
+                         help='Import time budget in milliseconds (default: 25)')
+    startup.add_argument('--runs', type=int, default=20,
+                         help='Fresh interpreters to measure; the best is kept (default: 20)')
+    startup.set_defaults(func=run_startup)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
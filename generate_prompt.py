@@ -4,13 +4,1569 @@ Prompt Generator Tool
 Generates specific prompt files from common templates based on language/framework requirements.
 """
 
-import argparse
+# Only what every run needs is imported here. Everything else (json,
+# hashlib, threading, argparse, tempfile, datetime, concurrent.futures,
+# http.server and so on) is imported where it is used, to keep startup fast.
 import os
 import re
 import sys
+import time
 from pathlib import Path
-from typing import Dict, List, Optional
-from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+__version__ = '1.2.0'
+
+
+class TemplateSyntaxError(ValueError):
+    """Raised when a template has unbalanced conditional section markers."""
+
+    def __init__(self, message: str, line: int, template: Optional[str] = None):
+        super().__init__(message)
+        self.message = message
+        self.line = line
+        self.template = template
+
+    def __str__(self) -> str:
+        location = f"{self.template}, line {self.line}" if self.template else f"line {self.line}"
+        return f"{location}: {self.message}"
+
+
+class CompiledTemplate:
+    """
+    A template tokenized once into literal segments and placeholder slots.
+
+    Conditional sections stay in the compiled form and are resolved at render
+    time, so a single compiled template serves every target language. Sections
+    may be nested; each one is compiled to a jump past its end so an excluded
+    section is skipped without looking at its contents. Rendering is one walk
+    over the segments followed by a single join.
+
+    <!-- PRIORITY: n --> markers (see SectionPruner) are compiled to segments
+    of their own, removed along with any whitespace before them unless the
+    render asks to keep them.
+    """
+
+    LITERAL = 0
+    SLOT = 1
+    SECTION = 2
+    FENCE_SLOT = 3
+    PRIORITY = 4
+
+    MARKER_PATTERN = re.compile(
+        r'<!--\s*(BEGIN|END):(\w+)\s*-->|[ \t]*<!--\s*PRIORITY:\s*\d+\s*-->', re.IGNORECASE
+    )
+
+    def __init__(self, source: str, placeholders: List[str], strict: bool = True):
+        """
+        Tokenize the template source in a single pass.
+
+        With strict=False, unbalanced markers are kept as plain text instead of
+        raising TemplateSyntaxError: a stray END is left in place, an END whose
+        section is open further down the stack closes it, and any section left
+        open is treated as unmarked text. Every marker is pushed and popped at
+        most once, so both modes stay linear in the size of the template.
+        """
+        if placeholders:
+            alternatives = '|'.join(re.escape(p) for p in placeholders)
+            # Code fence tags accept any case variant of [language], e.g. ```[LANGUAGE];
+            # whether a fence precedes them is only known once sections are resolved
+            self._slot_pattern = re.compile(alternatives + r'|\[(?i:language)\]')
+        else:
+            self._slot_pattern = None
+        self._placeholders = set(placeholders)
+        self._merge_from = 0
+        self.ops: List[tuple] = []
+        self.tags = set()
+
+        # Stack of (tag, op index, line, marker) for the sections currently open
+        stack: List[Tuple[str, int, int, str]] = []
+        open_counts: Dict[str, int] = {}
+        pos = 0
+        line = 1
+        for match in self.MARKER_PATTERN.finditer(source):
+            self._tokenize(source[pos:match.start()])
+            line += source.count('\n', pos, match.start())
+            if match.group(1) is None:
+                self.ops.append((self.PRIORITY, match.group(0)))
+                self._merge_from = len(self.ops)
+                pos = match.end()
+                continue
+            kind, tag = match.group(1).upper(), match.group(2).lower()
+            if kind == 'BEGIN':
+                stack.append((tag, len(self.ops), line, match.group(0)))
+                open_counts[tag] = open_counts.get(tag, 0) + 1
+                self.ops.append((self.SECTION, tag, None))
+                self.tags.add(tag)
+            elif stack and stack[-1][0] == tag:
+                self._close_section(stack.pop(), open_counts)
+            elif strict and not stack:
+                raise TemplateSyntaxError(
+                    f"Unexpected {match.group(0)} without a matching BEGIN:{match.group(2)}", line
+                )
+            elif strict:
+                open_tag, _, open_line, _ = stack[-1]
+                raise TemplateSyntaxError(
+                    f"Unexpected {match.group(0)}, expected END:{open_tag.upper()} "
+                    f"for the section opened at line {open_line}", line
+                )
+            elif open_counts.get(tag):
+                while stack[-1][0] != tag:
+                    self._keep_marker(stack.pop(), open_counts)
+                self._close_section(stack.pop(), open_counts)
+            else:
+                self._append_literal(match.group(0))
+            self._merge_from = len(self.ops)
+            pos = match.end()
+        if stack and strict:
+            open_tag, _, open_line, _ = stack[-1]
+            raise TemplateSyntaxError(
+                f"Unclosed <!-- BEGIN:{open_tag.upper()} --> section", open_line
+            )
+        while stack:
+            self._keep_marker(stack.pop(), open_counts)
+        self._tokenize(source[pos:])
+
+    def _close_section(self, entry: Tuple[str, int, int, str], open_counts: Dict[str, int]) -> None:
+        """Point an open section at the end of its contents."""
+        tag, index = entry[0], entry[1]
+        open_counts[tag] -= 1
+        self.ops[index] = (self.SECTION, tag, len(self.ops))
+
+    def _keep_marker(self, entry: Tuple[str, int, int, str], open_counts: Dict[str, int]) -> None:
+        """Turn the BEGIN marker of a section that is never closed back into text."""
+        tag, index, marker = entry[0], entry[1], entry[3]
+        open_counts[tag] -= 1
+        self.ops[index] = (self.LITERAL, marker)
+
+    def _tokenize(self, text: str) -> None:
+        """Append literal and slot segments for a run of plain text."""
+        if self._slot_pattern is None:
+            if text:
+                self._append_literal(text)
+            return
+        pos = 0
+        for match in self._slot_pattern.finditer(text):
+            if match.start() > pos:
+                self._append_literal(text[pos:match.start()])
+            token = match.group(0)
+            if token in self._placeholders:
+                self.ops.append((self.SLOT, token))
+            else:
+                self.ops.append((self.FENCE_SLOT, token))
+            pos = match.end()
+        if pos < len(text):
+            self._append_literal(text[pos:])
+
+    def _append_literal(self, text: str) -> None:
+        """Append a literal segment, merging it with a preceding literal."""
+        if len(self.ops) > self._merge_from and self.ops[-1][0] == self.LITERAL:
+            self.ops[-1] = (self.LITERAL, self.ops[-1][1] + text)
+        else:
+            self.ops.append((self.LITERAL, text))
+
+    def render(self, values: Dict[str, str], included_tags, keep_priorities: bool = False) -> str:
+        """
+        Render the template for one language in a single pass.
+
+        included_tags holds the lowercase section tags to keep; every other
+        section is skipped along with any sections nested inside it.
+        keep_priorities keeps the PRIORITY markers for a later SectionPruner.
+        """
+        return ''.join(self.iter_render(values, included_tags, keep_priorities))
+
+    def iter_render(self, values: Dict[str, str], included_tags, keep_priorities: bool = False):
+        """Yield the rendered segments of the template in order (see render)."""
+        ops = self.ops
+        tail = ''
+        i = 0
+        count = len(ops)
+        while i < count:
+            op = ops[i]
+            kind = op[0]
+            if kind == self.SECTION:
+                if op[1] not in included_tags:
+                    i = op[2]
+                    continue
+                i += 1
+                continue
+            if kind == self.LITERAL:
+                piece = op[1]
+            elif kind == self.SLOT:
+                piece = values[op[1]]
+            elif kind == self.PRIORITY:
+                if not keep_priorities:
+                    i += 1
+                    continue
+                piece = op[1]
+            elif tail.endswith('```'):
+                piece = values['[language]']
+            else:
+                piece = op[1]
+            # Only the last three characters are needed to spot a code fence
+            tail = piece[-3:] if len(piece) >= 3 else (tail + piece)[-3:]
+            yield piece
+            i += 1
+
+    def select_sections(self, included_tags) -> Tuple['CompiledTemplate', int]:
+        """
+        Resolve only the conditional sections, returning a template without
+        them and the number of sections removed.
+
+        Rendering the result gives the same text as render(); the two steps
+        are split only so that they can be timed separately (see StageProfiler).
+        """
+        ops = self.ops
+        kept = []
+        removed = 0
+        i = 0
+        count = len(ops)
+        while i < count:
+            op = ops[i]
+            if op[0] != self.SECTION:
+                kept.append(op)
+            elif op[1] not in included_tags:
+                removed += 1
+                i = op[2]
+                continue
+            i += 1
+        return self.from_data({'tags': [], 'ops': kept}), removed
+
+    def specialize(self, included_tags, keep_priorities: bool = False) -> 'CompiledTemplate':
+        """
+        Resolve everything that is the same for all languages keeping
+        included_tags, leaving a template of only the spans that vary.
+
+        Conditional sections and PRIORITY markers are resolved, the literal
+        text between the remaining slots is merged into single
+        segments, and code fence tags are settled wherever the text before
+        them is literal. Rendering the result with the same keep_priorities
+        (and no tags) gives the same text as render(), in a walk over far
+        fewer segments; see PromptGenerator.render_matrix.
+        """
+        ops = self.ops
+        kept: List[tuple] = []
+        # The last three characters rendered, while they do not depend on the language
+        tail: Optional[str] = ''
+        i = 0
+        count = len(ops)
+        while i < count:
+            op = ops[i]
+            kind = op[0]
+            i += 1
+            if kind == self.SECTION:
+                if op[1] not in included_tags:
+                    i = op[2]
+                continue
+            if kind == self.PRIORITY:
+                if not keep_priorities:
+                    continue
+                kind = self.LITERAL
+            elif kind == self.FENCE_SLOT and tail is not None:
+                if not tail.endswith('```'):
+                    kind = self.LITERAL
+                else:
+                    op = (self.SLOT, '[language]')
+                    kind = self.SLOT
+            if kind != self.LITERAL:
+                kept.append(op)
+                tail = None
+                continue
+            piece = op[1]
+            if len(piece) >= 3:
+                tail = piece[-3:]
+            elif tail is not None:
+                tail = (tail + piece)[-3:]
+            if kept and kept[-1][0] == self.LITERAL:
+                kept[-1] = (self.LITERAL, kept[-1][1] + piece)
+            else:
+                kept.append((self.LITERAL, piece))
+        return self.from_data({'tags': [], 'ops': kept})
+
+    def to_data(self) -> Dict:
+        """Serialize the compiled form (see from_data)."""
+        return {'tags': sorted(self.tags), 'ops': self.ops}
+
+    @classmethod
+    def from_data(cls, data: Dict) -> 'CompiledTemplate':
+        """Rebuild a compiled template without re-parsing its source."""
+        compiled = cls.__new__(cls)
+        compiled.tags = set(data['tags'])
+        compiled.ops = [tuple(op) for op in data['ops']]
+        return compiled
+
+
+class FileLock:
+    """
+    Advisory lock on a file shared between processes, held in a with block.
+
+    Locks are taken with flock(), so they are released when the holder exits
+    however it ends. Where fcntl is unavailable, or the lock file cannot be
+    created, acquiring always succeeds without locking: locks coordinate
+    concurrent runs but never stop generation. A lock is not reentrant.
+
+    Locks on output files and directories (see for_path) keep their lock
+    files elsewhere, so nothing is added next to the outputs.
+    """
+
+    LOCK_DIR = '.prompt-locks'
+
+    def __init__(self, path: Path, blocking: bool = True):
+        self.path = Path(path)
+        self.blocking = blocking
+        self.locked = False
+        self._fd: Optional[int] = None
+
+    @classmethod
+    def in_directory(cls, directory: Path, name: str, blocking: bool = True) -> 'FileLock':
+        """The lock called name among the lock files kept in directory."""
+        return cls(Path(directory) / cls.LOCK_DIR / f'{name}.lock', blocking)
+
+    @classmethod
+    def for_path(cls, path: Path, lock_dir: Optional[Path] = None,
+                 blocking: bool = True) -> 'FileLock':
+        """
+        The lock on a file or directory, whose lock file is named by a hash of
+        its absolute path and kept in lock_dir (default: runtime_dir()).
+        """
+        import hashlib
+        key = hashlib.sha256(str(Path(path).resolve()).encode('utf-8')).hexdigest()
+        return cls(Path(lock_dir or cls.runtime_dir()) / f'{key[:32]}.lock', blocking)
+
+    @staticmethod
+    def runtime_dir() -> Path:
+        """Per-user directory for lock files when there is no cache to keep them in."""
+        root = os.environ.get('XDG_RUNTIME_DIR')
+        if root:
+            return Path(root) / 'cursorflow-locks'
+        import tempfile
+        uid = os.getuid() if hasattr(os, 'getuid') else 0
+        return Path(tempfile.gettempdir()) / f'cursorflow-locks-{uid}'
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.release()
+
+    def acquire(self) -> bool:
+        """Take the lock, waiting for it unless non-blocking; returns whether it is held."""
+        try:
+            import fcntl
+        except ImportError:
+            self.locked = True
+            return True
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            self.locked = True
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            os.close(fd)
+            # Held elsewhere, or (any other error) not supported by the filesystem
+            self.locked = not isinstance(e, BlockingIOError)
+            return self.locked
+        self._fd = fd
+        self.locked = True
+        return True
+
+    def release(self) -> None:
+        """Let go of the lock."""
+        if self._fd is not None:
+            # Closing the descriptor releases the flock
+            os.close(self._fd)
+            self._fd = None
+        self.locked = False
+
+
+class TemplateCache:
+    """
+    Persistent on-disk cache of compiled templates and per-language text.
+
+    Entries are keyed by a hash of everything they were built from plus the
+    generator version, so a changed template or generator simply misses and
+    stale entries are never read again. A stat index maps template paths to
+    content hashes, which lets warm runs skip reading and hashing templates
+    whose size and mtime are unchanged. The directory is kept under max_bytes
+    by evicting the least recently used entries. Processes sharing the
+    directory coordinate their index updates and evictions with FileLock.
+    """
+
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        """Initialize the cache; the directory is created on first write."""
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.index_path = self.cache_dir / 'index.json'
+        self._index: Optional[Dict[str, List]] = None
+
+    @staticmethod
+    def default_dir() -> Path:
+        """Get the per-user cache directory."""
+        root = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+        return Path(root) / 'cursorflow'
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        """Hash entry inputs together with the generator version."""
+        import hashlib
+        digest = hashlib.sha256(__version__.encode('utf-8'))
+        for part in parts:
+            digest.update(b'\0' + part.encode('utf-8'))
+        return digest.hexdigest()
+
+    def content_hash(self, path: Path) -> str:
+        """Get the content hash of a file, reading it only when it changed."""
+        import hashlib
+        import json
+        index = self._load_index()
+        stat = path.stat()
+        entry = index.get(str(path))
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        content_hash = hashlib.sha256(path.read_bytes()).hexdigest()
+        index[str(path)] = [stat.st_mtime_ns, stat.st_size, content_hash]
+        try:
+            with self.lock('index'):
+                # Keep what other processes added since the index was loaded
+                index.update(self._read_index())
+                index[str(path)] = [stat.st_mtime_ns, stat.st_size, content_hash]
+                self._write_atomic(self.index_path, json.dumps(index))
+        except OSError:
+            # A read-only or full cache directory must never fail generation;
+            # the index is still kept in memory
+            pass
+        return content_hash
+
+    def get_compiled(self, key: str) -> Optional[CompiledTemplate]:
+        """Load a compiled template, or None on a miss."""
+        import json
+        text = self._read(f'{key}.compiled.json')
+        if text is None:
+            return None
+        try:
+            return CompiledTemplate.from_data(json.loads(text))
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def put_compiled(self, key: str, compiled: CompiledTemplate) -> None:
+        """Store a compiled template."""
+        import json
+        self._write_entry(f'{key}.compiled.json', json.dumps(compiled.to_data()))
+
+    def get_text(self, key: str) -> Optional[str]:
+        """Load a cached text entry, or None on a miss."""
+        return self._read(f'{key}.txt')
+
+    def put_text(self, key: str, text: str) -> None:
+        """Store a text entry."""
+        self._write_entry(f'{key}.txt', text)
+
+    @property
+    def lock_dir(self) -> Path:
+        """Where the lock files of this cache, and of outputs built with it, are kept."""
+        return self.cache_dir / FileLock.LOCK_DIR
+
+    def lock(self, name: str, blocking: bool = True) -> FileLock:
+        """A lock called name, shared with every process using this directory."""
+        return FileLock.in_directory(self.cache_dir, name, blocking)
+
+    def _load_index(self) -> Dict[str, List]:
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    def _read_index(self) -> Dict[str, List]:
+        import json
+        try:
+            index = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def _read(self, name: str) -> Optional[str]:
+        path = self.cache_dir / name
+        try:
+            text = path.read_text(encoding='utf-8')
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path)
+        except (OSError, UnicodeDecodeError):
+            return None
+        return text
+
+    def _write_entry(self, name: str, text: str) -> None:
+        try:
+            self._write_atomic(self.cache_dir / name, text)
+            self._evict()
+        except OSError:
+            # A read-only or full cache directory must never fail generation
+            pass
+
+    def _write_atomic(self, path: Path, text: str) -> None:
+        """Write through a temporary file so readers never see partial entries."""
+        _write_atomic(path, text)
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache fits max_bytes."""
+        with self.lock('evict', blocking=False) as lock:
+            # Otherwise another process is evicting already
+            if lock.locked:
+                self._evict_entries()
+
+    def _evict_entries(self) -> None:
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(('.compiled.json', '.txt')):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class RenderCache:
+    """
+    Bounded in-memory LRU cache of rendered prompts, keyed by a hash of every
+    generation input (see PromptGenerator.input_hash).
+
+    With a store, entries are also written to and read back from a
+    TemplateCache, so they outlive the process, and get_or_render() renders
+    each entry once across the processes sharing it. Entries are dropped least
+    recently used first once there are more than max_entries of them or they
+    hold more than max_chars characters in total. hits, store_hits, misses
+    and evictions count what happened to each lookup and entry.
+    """
+
+    def __init__(self, max_entries: int = 256, max_chars: int = 64 * 1024 * 1024,
+                 store: Optional[TemplateCache] = None):
+        import collections
+        import threading
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.store = store
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'collections.OrderedDict[str, str]' = collections.OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a rendered prompt, or None on a miss."""
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+        text = self.store.get_text(key) if self.store is not None else None
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.store_hits += 1
+            self._insert(key, text)
+        return text
+
+    def get_or_render(self, key: str, render) -> str:
+        """
+        Get a rendered prompt, calling render() for it on a miss. With a
+        store, a process that misses while another renders the same key waits
+        for it and reads its result instead of rendering again.
+        """
+        if self.store is None:
+            text = self.get(key)
+            if text is None:
+                text = render()
+                self.put(key, text)
+            return text
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+        # Keys share 256 lock files; a collision only delays a render
+        with self.store.lock(f'render-{key[:2]}'):
+            text = self.get(key)
+            if text is None:
+                text = render()
+                self.put(key, text)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        """Store a rendered prompt."""
+        with self._lock:
+            self._insert(key, text)
+        if self.store is not None:
+            self.store.put_text(key, text)
+
+    def _insert(self, key: str, text: str) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._chars -= len(previous)
+        self._entries[key] = text
+        self._chars += len(text)
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._chars > self.max_chars):
+            _, evicted = self._entries.popitem(last=False)
+            self._chars -= len(evicted)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every in-memory entry; the counters and the store are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count, size and counters."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'chars': self._chars,
+                'hits': self.hits,
+                'store_hits': self.store_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class BuildManifest:
+    """
+    Record of the inputs each generated file in a directory was built from,
+    stored as .prompt-manifest.json next to the files.
+
+    An output is current when the hash of its inputs (see
+    PromptGenerator.input_hash) is unchanged and the file still has the size
+    and mtime it was left with, so edited or deleted outputs are rebuilt.
+    """
+
+    FILENAME = '.prompt-manifest.json'
+
+    def __init__(self, directory: Path, lock_dir: Optional[Path] = None):
+        """lock_dir holds the lock file of the directory (see FileLock.for_path)."""
+        import threading
+        self.path = Path(directory) / self.FILENAME
+        self.lock_dir = lock_dir
+        self._entries = self._read()
+        self._updated: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Dict]:
+        import json
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        outputs = data.get('outputs') if isinstance(data, dict) else None
+        return outputs if isinstance(outputs, dict) else {}
+
+    def is_current(self, output_path: Path, inputs: str) -> bool:
+        """Whether output_path was built from inputs and has not changed since."""
+        entry = self._entries.get(output_path.name)
+        if not isinstance(entry, dict) or entry.get('inputs') != inputs:
+            return False
+        try:
+            stat = output_path.stat()
+        except OSError:
+            return False
+        return entry.get('stat') == [stat.st_mtime_ns, stat.st_size]
+
+    def record(self, output_path: Path, inputs: str, source: Optional[Path] = None) -> None:
+        """
+        Note that output_path was just built from inputs. source is the file
+        holding its text until it is put in place (see OutputTransaction).
+        """
+        stat = (source or output_path).stat()
+        entry = {'inputs': inputs, 'stat': [stat.st_mtime_ns, stat.st_size]}
+        with self._lock:
+            self._entries[output_path.name] = entry
+            self._updated[output_path.name] = entry
+
+    def discard(self) -> None:
+        """Forget the entries recorded since the last save."""
+        with self._lock:
+            self._entries = self._read()
+            self._updated = {}
+
+    def take_updates(self) -> Dict[str, Dict]:
+        """The entries recorded here since the last save or take, which are handed over."""
+        with self._lock:
+            updates, self._updated = self._updated, {}
+        return updates
+
+    def merge(self, updates: Dict[str, Dict]) -> None:
+        """Add entries recorded by another process (see take_updates)."""
+        with self._lock:
+            self._entries.update(updates)
+            self._updated.update(updates)
+
+    def save(self) -> None:
+        """Write the entries recorded here over those currently on disk."""
+        import json
+        with self._lock:
+            if not self._updated:
+                return
+            with FileLock.for_path(self.path.parent, self.lock_dir):
+                entries = self._read()
+                entries.update(self._updated)
+                _write_atomic(self.path, json.dumps(
+                    {'version': __version__, 'outputs': entries}, indent=2, sort_keys=True
+                ) + '\n', mode=0o644)
+            self._entries = entries
+            self._updated = {}
+
+
+class OutputTransaction:
+    """
+    Writes of one run, staged next to their destinations and published
+    together, so a failed or interrupted run leaves every output as it was.
+
+    Each destination directory gets a hidden staging directory on the same
+    filesystem, named after the transaction id so that worker processes
+    holding the id stage into it too. commit() syncs the staged files and
+    renames each into place, then saves the build manifests tracked by the
+    transaction; rollback() discards both. Used as a context manager, it
+    commits when the block completes and rolls back otherwise.
+    """
+
+    STAGING_PREFIX = '.prompt-staging-'
+
+    def __init__(self, transaction_id: Optional[str] = None, lock_dir: Optional[Path] = None):
+        """lock_dir holds the lock files of the destination directories (see FileLock.for_path)."""
+        self.id = transaction_id or os.urandom(8).hex()
+        self.lock_dir = lock_dir
+        self._directories: Dict[Path, Path] = {}
+        self._manifests: List[BuildManifest] = []
+
+    def __enter__(self) -> 'OutputTransaction':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def staging_dir(self, directory: Path) -> Path:
+        """Where files bound for directory are staged."""
+        return Path(directory) / f"{self.STAGING_PREFIX}{self.id}"
+
+    def adopt(self, directory: Path) -> None:
+        """Publish what other processes staged for directory with this transaction."""
+        directory = Path(directory)
+        self._directories.setdefault(directory, self.staging_dir(directory))
+
+    def track(self, manifest: BuildManifest) -> None:
+        """Save manifest once the staged files are in place, and only then."""
+        if not any(tracked is manifest for tracked in self._manifests):
+            self._manifests.append(manifest)
+
+    def staged(self, path: Path) -> Optional[Path]:
+        """The staged file for path, if one was written."""
+        staged = self.staging_dir(path.parent) / path.name
+        return staged if staged.exists() else None
+
+    def write(self, path: Path, first_chunk: str, chunks) -> bool:
+        """
+        Stage the chunks for path unless path (or what is already staged for
+        it) holds exactly that text; returns whether they were staged.
+        """
+        staging = self.staging_dir(path.parent)
+        staging.mkdir(parents=True, exist_ok=True)
+        self.adopt(path.parent)
+        staged = staging / path.name
+        if staged.exists():
+            return _write_if_changed(staged, first_chunk, chunks)
+        return _write_if_changed(path, first_chunk, chunks, destination=staged)
+
+    def commit(self) -> int:
+        """Publish the staged files, returning how many were put in place."""
+        moves = []
+        for directory, staging in sorted(self._directories.items()):
+            try:
+                names = sorted(os.listdir(staging))
+            except OSError:
+                continue
+            moves.extend((staging / name, directory / name) for name in names)
+        if moves:
+            # The text of each file must be on disk before it replaces its target
+            for staged, _ in moves:
+                _fsync(staged)
+            directories = sorted({target.parent for _, target in moves})
+            # Runs publishing into the same directories take turns, whole run by whole run
+            locks = [FileLock.for_path(directory, self.lock_dir) for directory in directories]
+            try:
+                for lock in locks:
+                    lock.acquire()
+                with _deferred_interrupts():
+                    for staged, target in moves:
+                        os.replace(staged, target)
+            finally:
+                for lock in locks:
+                    lock.release()
+            if os.name == 'posix':
+                for directory in directories:
+                    _fsync(directory)
+        self._remove_staging()
+        # Saved last, so that a manifest never lists outputs that were not published
+        for manifest in self._manifests:
+            manifest.save()
+        self._manifests = []
+        return len(moves)
+
+    def rollback(self) -> None:
+        """Discard the staged files and manifest entries, leaving every destination untouched."""
+        self._remove_staging()
+        for manifest in self._manifests:
+            manifest.discard()
+        self._manifests = []
+
+    def _remove_staging(self) -> None:
+        import shutil
+        for staging in self._directories.values():
+            shutil.rmtree(staging, ignore_errors=True)
+        self._directories = {}
+
+
+class PromptOverlay:
+    """
+    A feature's prompt stored as what it adds to the shared base file of its
+    prompt type and language (see PromptGenerator's layered option).
+
+    The base file holds the rendered template for the language; the overlay
+    holds the feature's requirements section (with any reference rows) and
+    metadata footer, after a header naming the base file, the hash of the
+    base text it was built against and where in it the requirements go.
+    resolve() puts the full prompt back together, the same text a run
+    without layered outputs writes.
+    """
+
+    BASE_SUFFIX = '.base.md'
+    HEADER_PATTERN = re.compile(r'<!-- prompt-overlay (\{.*\}) -->\n')
+
+    @staticmethod
+    def _note(base_name: str) -> str:
+        return (f"> Feature overlay of [{base_name}]({base_name}). For the full prompt, run "
+                f"`python generate_prompt.py resolve` on this file.\n\n")
+
+    @classmethod
+    def build(cls, base_name: str, base_hash: str, offset: int, head: str, footer: str) -> str:
+        """
+        Text of an overlay inserting head at character offset of the base
+        file base_name (whose text has SHA-256 base_hash) and appending footer.
+        """
+        import json
+        header = json.dumps(
+            {'base': base_name, 'sha256': base_hash, 'offset': offset, 'head': len(head)},
+            sort_keys=True,
+        )
+        return f"<!-- prompt-overlay {header} -->\n" + cls._note(base_name) + head + footer
+
+    @classmethod
+    def resolve(cls, path: Path) -> str:
+        """The full prompt of an overlay; ValueError if it or its base file does not fit."""
+        import hashlib
+        import json
+        path = Path(path)
+        text = path.read_text(encoding='utf-8')
+        match = cls.HEADER_PATTERN.match(text)
+        if match is None:
+            raise ValueError(f"Not a prompt overlay: {path}")
+        try:
+            info = json.loads(match.group(1))
+            base_name, base_hash = str(info['base']), str(info['sha256'])
+            offset, head_length = int(info['offset']), int(info['head'])
+        except (ValueError, KeyError, TypeError):
+            raise ValueError(f"Malformed prompt overlay header in {path}") from None
+        if Path(base_name).name != base_name:
+            raise ValueError(f"Prompt overlay {path} names a base file outside its directory")
+        rest = text[match.end():]
+        note = cls._note(base_name)
+        if not rest.startswith(note):
+            raise ValueError(f"Malformed prompt overlay: {path}")
+        rest = rest[len(note):]
+        
+        base_path = path.parent / base_name
+        base = base_path.read_text(encoding='utf-8')
+        if hashlib.sha256(base.encode('utf-8')).hexdigest() != base_hash:
+            raise ValueError(f"{base_path} changed after {path.name} was generated; generate it again")
+        return base[:offset] + rest[:head_length] + base[offset:] + rest[head_length:]
+
+
+class TerminologyRewriter:
+    """
+    Rewrites language terminology in a single left-to-right scan.
+
+    All rules of a language are compiled once into one case-insensitive
+    alternation. Regex rules are kept in declaration order; plain terms are
+    folded into a prefix trie so hundreds of them cost about as much to scan
+    for as a handful.
+
+    Precedence when rules overlap: the leftmost match in the text wins. At the
+    same position regex rules are tried first, in declaration order, then plain
+    terms, longest first. Replacement text is inserted literally and is not
+    rescanned, so one rule's output never feeds another rule.
+    """
+
+    def __init__(self, patterns: List[Tuple[str, str]], terms: Optional[Dict[str, str]] = None):
+        """Compile regex rules and whole-word terms into a single pattern."""
+        self._rules = [(re.compile(pattern, re.IGNORECASE), replacement)
+                       for pattern, replacement in patterns]
+        self._terms = {term.lower(): value for term, value in (terms or {}).items()}
+        # Non-capturing alternatives keep the regex engine's fast paths; the
+        # rule that matched is identified afterwards, which only costs per hit
+        alternatives = [f'(?:{pattern})' for pattern, _ in patterns]
+        if self._terms:
+            alternatives.append(r'(?<!\w)' + self._trie_pattern(self._terms) + r'(?!\w)')
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE)
+
+    @staticmethod
+    def _trie_pattern(words) -> str:
+        """Build a regex matching any of the words, sharing common prefixes."""
+        trie: Dict = {}
+        for word in words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def build(node: Dict) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            if '' in node:
+                # Greedy optional suffix: longer terms win over their prefixes
+                return '(?:' + body + ')?'
+            return body
+
+        return build(trie)
+
+    def _replace(self, match) -> str:
+        pos = match.start()
+        for rule, replacement in self._rules:
+            if rule.match(match.string, pos):
+                return replacement
+        return self._terms[match.group(0).lower()]
+
+    def subn(self, content: str) -> Tuple[str, int]:
+        """Rewrite content, returning the new text and the number of rewrites."""
+        return self.pattern.subn(self._replace, content)
+
+    def sub(self, content: str) -> str:
+        """Rewrite content."""
+        return self.pattern.sub(self._replace, content)
+
+    def iter_sub(self, chunks, overlap: int = 4096):
+        """
+        Rewrite a stream of text chunks, yielding rewritten chunks.
+
+        Text within overlap characters of the end of what has been received is
+        held back, so the result matches sub() on the whole text as long as no
+        rule matches or looks ahead further than overlap characters.
+        """
+        buffer = ''
+        pos = 0
+        for chunk in chunks:
+            buffer += chunk
+            if len(buffer) - pos < 2 * overlap:
+                continue
+            text, emitted = self._sub_until(buffer, pos, len(buffer) - overlap)
+            yield text
+            # Keep a little context before the resume point for \b and lookbehinds
+            keep = min(emitted, 16)
+            buffer = buffer[emitted - keep:]
+            pos = keep
+        text, _ = self._sub_until(buffer, pos, len(buffer))
+        if text:
+            yield text
+
+    def _sub_until(self, buffer: str, pos: int, limit: int) -> Tuple[str, int]:
+        """Rewrite matches starting before limit; returns text and where it ended."""
+        parts = []
+        last = pos
+        for match in self.pattern.finditer(buffer, pos):
+            if match.start() >= limit:
+                break
+            parts.append(buffer[last:match.start()])
+            parts.append(self._replace(match))
+            last = match.end()
+        end = max(last, limit)
+        parts.append(buffer[last:end])
+        return ''.join(parts), end
+
+
+class LanguageRegistry:
+    """
+    Language configurations indexed by every name they can be asked for.
+
+    Keys and aliases are indexed as typed (lowercased) and in a normalized
+    form without dots, dashes, underscores and spaces, so resolving a name is
+    a couple of dict lookups however many stacks are registered. Unknown
+    names get "did you mean" suggestions from a trigram index over the same
+    names, built on first use.
+    """
+
+    NORMALIZE_PATTERN = re.compile(r'[\.\-\s_]+')
+    TOKEN_PATTERN = re.compile(r'[^\w#+]+')
+    REQUIRED_FIELDS = (
+        'name', 'extension', 'package_manager', 'package_file', 'build_command',
+        'linter', 'code_gen', 'di_library', 'state_management', 'async_pattern',
+        'result_type', 'immutability', 'json_serialization',
+    )
+
+    def __init__(self, languages: Dict[str, Dict], aliases: Optional[Dict[str, str]] = None):
+        """Index the given languages and aliases (alias → language key)."""
+        self.languages: Dict[str, Dict] = {}
+        self._exact: Dict[str, str] = {}
+        self._normalized: Dict[str, str] = {}
+        self._trigrams: Optional[Dict[str, List[str]]] = None
+        for key, config in languages.items():
+            self.add(key, config)
+        for alias, key in (aliases or {}).items():
+            self.add_alias(alias, key)
+
+    @classmethod
+    def normalize(cls, name: str) -> str:
+        """Normalized form of a name, e.g. 'React.js' → 'reactjs'."""
+        return cls.NORMALIZE_PATTERN.sub('', name.lower().strip())
+
+    def add(self, key: str, config: Dict, aliases=()) -> None:
+        """Register (or replace) a language and its aliases."""
+        missing = [field for field in self.REQUIRED_FIELDS if field not in config]
+        if missing:
+            raise ValueError(f"Language '{key}' is missing {', '.join(missing)}")
+        key = key.lower()
+        self.languages[key] = config
+        self._index(key, key)
+        for alias in aliases:
+            self.add_alias(alias, key)
+
+    def add_alias(self, alias: str, key: str) -> None:
+        """Register another name for a language; aliases take precedence over keys."""
+        if key not in self.languages:
+            raise ValueError(f"Alias '{alias}' refers to unknown language '{key}'")
+        self._index(alias, key)
+
+    def load_dir(self, directory: Path) -> None:
+        """
+        Register the languages defined in directory/*.json.
+
+        Each file defines one language, named after the file, with the same
+        fields as PromptGenerator.LANGUAGE_MAPPINGS plus an optional list of
+        "aliases". A file named after a built-in language replaces it.
+        """
+        import json
+        if not directory.is_dir():
+            return
+        for path in sorted(directory.glob('*.json')):
+            try:
+                config = json.loads(path.read_text(encoding='utf-8'))
+                aliases = config.pop('aliases', [])
+                self.add(path.stem, config, aliases)
+            except (ValueError, AttributeError) as e:
+                raise ValueError(f"Invalid language file {path}: {e}")
+
+    def resolve(self, name: str) -> Optional[str]:
+        """
+        Get the language key for a name, or None if it is unknown.
+
+        Tries the name as typed, then its normalized form, then each of its
+        words (so "flutter app" resolves to flutter).
+        """
+        lowered = name.lower().strip()
+        key = self._exact.get(lowered) or self._normalized.get(self.normalize(lowered))
+        if key is not None:
+            return key
+        for token in self.TOKEN_PATTERN.split(lowered):
+            key = self._exact.get(token)
+            if key is not None:
+                return key
+        return None
+
+    def suggest(self, name: str, limit: int = 3) -> List[str]:
+        """Language keys whose names share the most trigrams with name."""
+        if self._trigrams is None:
+            self._trigrams = {}
+            for indexed in self._normalized:
+                for trigram in self._trigrams_of(indexed):
+                    self._trigrams.setdefault(trigram, []).append(indexed)
+        query = self._trigrams_of(self.normalize(name))
+        shared: Dict[str, int] = {}
+        for trigram in query:
+            for indexed in self._trigrams.get(trigram, ()):
+                shared[indexed] = shared.get(indexed, 0) + 1
+        # Dice coefficient over the trigram sets
+        scored = sorted(
+            ((2 * count / (len(query) + len(self._trigrams_of(indexed))), indexed)
+             for indexed, count in shared.items()),
+            reverse=True,
+        )
+        suggestions: List[str] = []
+        for score, indexed in scored:
+            key = self._normalized[indexed]
+            if score >= 0.3 and key not in suggestions:
+                suggestions.append(key)
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+    def _index(self, name: str, key: str) -> None:
+        self._exact[name.lower().strip()] = key
+        self._normalized[self.normalize(name)] = key
+        self._trigrams = None
+
+    @staticmethod
+    def _trigrams_of(name: str) -> set:
+        padded = f'  {name} '
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ReferenceIndex:
+    """
+    Inverted keyword index over the UI/UX reference CSV files.
+
+    Rows are indexed by the words of their descriptive columns (Keywords,
+    Product Type, Best For and the like), weighted per column. A query scores
+    rows by the inverse document frequency of the words they share with it,
+    separately for each file, since each file answers a different question
+    (styles, colors, typography, ...).
+
+    Each file's index is rebuilt on its own when its size or mtime changes.
+    With a TemplateCache, per-file indexes are stored under the file's content
+    hash, so later runs do not parse unchanged files again.
+    """
+
+    # Column → weight of its words
+    INDEXED_COLUMNS = {
+        'Keywords': 3,
+        'Mood/Style Keywords': 3,
+        'Product Type': 3,
+        'Style Category': 3,
+        'Pattern Name': 3,
+        'Data Type': 3,
+        'Best For': 2,
+        'Category': 2,
+        'Issue': 2,
+        'Guideline': 2,
+        'Type': 1,
+        'Platform': 1,
+    }
+
+    WORD_PATTERN = re.compile(r'[a-z0-9#+]+')
+    STOPWORDS = frozenset(
+        'a an and are as at be by for from in into is it of on or the to with'.split()
+    )
+
+    def __init__(self, data_dir: Path, cache: Optional[TemplateCache] = None):
+        """Index the CSV files under data_dir (including subdirectories) on first use."""
+        self.data_dir = Path(data_dir)
+        self.cache = cache
+        # Source name (path relative to data_dir, without .csv) → (stat signature, index)
+        self._files: Dict[str, Tuple[Tuple[int, int], Dict]] = {}
+
+    def refresh(self) -> List[str]:
+        """Re-index the files that changed since the last call; returns their names."""
+        changed = []
+        seen = set()
+        for path in sorted(self.data_dir.rglob('*.csv')):
+            source = path.relative_to(self.data_dir).with_suffix('').as_posix()
+            seen.add(source)
+            stat = path.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            entry = self._files.get(source)
+            if entry is None or entry[0] != signature:
+                self._files[source] = (signature, self._load(path))
+                changed.append(source)
+        for source in set(self._files) - seen:
+            del self._files[source]
+            changed.append(source)
+        return changed
+
+    def search(self, text: str, limit: int = 3,
+               include=None) -> Dict[str, Tuple[List[str], List[List[str]]]]:
+        """
+        Get the best matching rows of each file for text.
+
+        Returns source → (header, rows) for the files with at least one
+        matching row, best rows first. include, if given, is called with each
+        source name to select the files searched.
+        """
+        import math
+        self.refresh()
+        query = set(self.terms(text))
+        results = {}
+        for source, (_, index) in self._files.items():
+            if include is not None and not include(source):
+                continue
+            rows = index['rows']
+            scores: Dict[int, float] = {}
+            for term in query:
+                postings = index['postings'].get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + len(rows) / len(postings))
+                for row, weight in postings:
+                    scores[row] = scores.get(row, 0.0) + idf * weight
+            best = sorted(scores, key=lambda row: (-scores[row], row))[:limit]
+            if best:
+                results[source] = (index['header'], [rows[row] for row in best])
+        return results
+
+    @classmethod
+    def terms(cls, text: str) -> List[str]:
+        """Lowercase words of text without stopwords, with plurals folded."""
+        terms = []
+        for word in cls.WORD_PATTERN.findall(text.lower()):
+            if word in cls.STOPWORDS or len(word) < 2:
+                continue
+            if len(word) > 4 and word.endswith('ies'):
+                word = word[:-3] + 'y'
+            elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+                word = word[:-1]
+            terms.append(word)
+        return terms
+
+    @classmethod
+    def build(cls, text: str) -> Dict:
+        """Parse CSV text into its header, rows and postings (term → [[row, weight]])."""
+        import csv
+        import io
+        records = list(csv.reader(io.StringIO(text)))
+        header, rows = (records[0], records[1:]) if records else ([], [])
+        columns = [(i, cls.INDEXED_COLUMNS[name]) for i, name in enumerate(header)
+                   if name in cls.INDEXED_COLUMNS]
+        postings: Dict[str, List[List[int]]] = {}
+        for row_number, row in enumerate(rows):
+            weights: Dict[str, int] = {}
+            for column, weight in columns:
+                if column < len(row):
+                    for term in cls.terms(row[column]):
+                        weights[term] = weights.get(term, 0) + weight
+            for term, weight in weights.items():
+                postings.setdefault(term, []).append([row_number, weight])
+        return {'header': header, 'rows': rows, 'postings': postings}
+
+    def _load(self, path: Path) -> Dict:
+        """Index one file, through the cache when there is one."""
+        import json
+        if self.cache is None:
+            return self.build(path.read_text(encoding='utf-8'))
+        key = TemplateCache.key('reference', self.cache.content_hash(path))
+        text = self.cache.get_text(key)
+        if text is not None:
+            try:
+                return json.loads(text)
+            except ValueError:
+                pass
+        index = self.build(path.read_text(encoding='utf-8'))
+        self.cache.put_text(key, json.dumps(index))
+        return index
+
+
+class SectionPruner:
+    """
+    Fits rendered markdown into a token budget by condensing, then dropping,
+    its lowest-priority sections.
+
+    Sections start at markdown headings outside code fences and contain their
+    subsections. As in the templates, a fence with an info string (```dart)
+    opens a code block even inside another one and a bare fence closes the
+    innermost block. A section's priority is declared with <!-- PRIORITY: n -->
+    at the end of its heading line or anywhere in its own text (higher is more
+    important) and is inherited by its subsections; undeclared sections get
+    DEFAULT_PRIORITY. Sections with KEEP_PRIORITY or more, and the text before
+    the first heading (frontmatter and preamble), are never cut; a section with
+    a more important subsection is condensed but never dropped. Tokens are
+    estimated at CHARS_PER_TOKEN characters each, with no tokenizer needed.
+    """
+
+    DEFAULT_PRIORITY = 50
+    KEEP_PRIORITY = 100
+    CHARS_PER_TOKEN = 4
+
+    HEADING_PATTERN = re.compile(r'(#{1,6})[ \t]+(.*?)[ \t#]*$')
+    FENCE_PATTERN = re.compile(r'[ ]{0,3}(`{3,}|~{3,})(.*)$')
+    # Same as the PRIORITY markers removed by CompiledTemplate
+    PRIORITY_PATTERN = re.compile(r'[ \t]*<!--\s*PRIORITY:\s*(\d+)\s*-->', re.IGNORECASE)
+    CONDENSED_NOTE = '*[Condensed to fit the token budget]*'
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        """Rough token count of text."""
+        return -(-len(text) // cls.CHARS_PER_TOKEN)
+
+    def __init__(self, text: str):
+        """Split text into the preamble and its sections."""
+        self.preamble = ''
+        # Per section: heading line, own text (up to the next heading), level,
+        # title, priority and the index just past its last subsection
+        self.sections: List[Dict] = []
+        current: List[str] = []
+        depth = 0
+        for line in text.splitlines(keepends=True):
+            stripped = line.rstrip('\r\n')
+            fence = self.FENCE_PATTERN.match(stripped)
+            if fence:
+                depth = depth - 1 if depth and not fence.group(2).strip() else depth + 1
+            elif not depth:
+                heading = self.HEADING_PATTERN.match(stripped)
+                if heading:
+                    self._close(current)
+                    title = self.PRIORITY_PATTERN.sub('', heading.group(2)).strip()
+                    self.sections.append({
+                        'heading': line, 'level': len(heading.group(1)), 'title': title,
+                    })
+                    current = []
+                    continue
+            current.append(line)
+        self._close(current)
+
+        stack: List[int] = []
+        for index, section in enumerate(self.sections):
+            while stack and self.sections[stack[-1]]['level'] >= section['level']:
+                self.sections[stack.pop()]['end'] = index
+            declared = self.PRIORITY_PATTERN.search(section['heading'] + section['body'])
+            if declared:
+                section['priority'] = int(declared.group(1))
+            elif stack:
+                section['priority'] = self.sections[stack[-1]]['priority']
+            else:
+                section['priority'] = self.DEFAULT_PRIORITY
+            stack.append(index)
+        for index in stack:
+            self.sections[index]['end'] = len(self.sections)
+        for index, section in enumerate(self.sections):
+            section['droppable'] = all(
+                other['priority'] <= section['priority']
+                for other in self.sections[index:section['end']]
+            )
+        self._length = len(self.PRIORITY_PATTERN.sub('', text))
+
+    def tokens_with(self, extra: str) -> int:
+        """Estimated tokens of the whole text, without PRIORITY markers, followed by extra."""
+        return -(-(self._length + len(extra)) // self.CHARS_PER_TOKEN)
+
+    def _close(self, lines: List[str]) -> None:
+        text = ''.join(lines)
+        if self.sections:
+            self.sections[-1]['body'] = text
+        else:
+            self.preamble = text
+
+    def fit(self, budget: int) -> Tuple[str, List[Dict]]:
+        """
+        Cut sections, lowest priority first, until the text fits budget tokens.
+
+        Within a priority, the largest sections are condensed to their first
+        sentence first; if that is not enough they are dropped. Returns the
+        text (without PRIORITY markers) and the cuts made, each with its
+        action, title, priority and tokens before and after.
+        """
+        sections = self.sections
+        # Counted on the first fit only, as fit may be called again with a new budget
+        for section in sections:
+            if 'tokens' not in section:
+                section['tokens'] = self.estimate_tokens(section['heading'] + section['body'])
+                section['condensed_tokens'] = self.estimate_tokens(
+                    section['heading'] + self._condense(section['body'])
+                )
+        full = [s['tokens'] for s in sections]
+        subtree = [sum(full[i:s['end']]) for i, s in enumerate(sections)]
+        condensed = [s['condensed_tokens'] for s in sections]
+        counted = list(full)
+        state = ['keep'] * len(sections)
+        total = self.estimate_tokens(self.preamble) + sum(full)
+        cuts: List[Dict] = []
+
+        priorities = sorted({s['priority'] for s in sections if s['priority'] < self.KEEP_PRIORITY})
+        for priority in priorities:
+            if total <= budget:
+                break
+            candidates = sorted(
+                (i for i, s in enumerate(sections) if s['priority'] == priority),
+                key=lambda i: (-full[i], i),
+            )
+            for i in candidates:
+                if total <= budget:
+                    break
+                if state[i] == 'keep' and condensed[i] < full[i]:
+                    total -= counted[i] - condensed[i]
+                    counted[i] = condensed[i]
+                    state[i] = 'condensed'
+                    cuts.append({'action': 'condensed', 'index': i})
+            # Whole subtrees go first, so a parent is reported instead of its children
+            for i in sorted(candidates, key=lambda i: (-subtree[i], i)):
+                if total <= budget:
+                    break
+                if state[i] == 'dropped' or not sections[i]['droppable']:
+                    continue
+                for j in range(i, sections[i]['end']):
+                    total -= counted[j]
+                    counted[j] = 0
+                    state[j] = 'dropped'
+                cuts.append({'action': 'dropped', 'index': i})
+
+        parts = [self.preamble]
+        for i, section in enumerate(sections):
+            if state[i] == 'keep':
+                parts.append(section['heading'] + section['body'])
+            elif state[i] == 'condensed':
+                parts.append(section['heading'] + self._condense(section['body']))
+        text = self.PRIORITY_PATTERN.sub('', ''.join(parts))
+
+        # A section condensed and later dropped is reported once, as dropped
+        report = []
+        for cut in cuts:
+            i = cut['index']
+            if cut['action'] == 'condensed':
+                if state[i] == 'dropped':
+                    continue
+                before, after = full[i], condensed[i]
+            else:
+                before, after = subtree[i], 0
+            report.append({
+                'action': cut['action'],
+                'title': sections[i]['title'],
+                'priority': sections[i]['priority'],
+                'tokens_before': before,
+                'tokens_after': after,
+            })
+        return text, report
+
+    def _condense(self, body: str) -> str:
+        """The first sentence of a section's prose, followed by a note."""
+        sentence = ''
+        depth = 0
+        for line in body.splitlines():
+            stripped = line.strip()
+            fence = self.FENCE_PATTERN.match(line)
+            if fence:
+                depth = depth - 1 if depth and not fence.group(2).strip() else depth + 1
+                continue
+            stripped = self.PRIORITY_PATTERN.sub('', stripped).strip()
+            if depth or not stripped:
+                continue
+            if stripped.startswith(('|', '<!--', '---')):
+                continue
+            sentence = re.split(r'(?<=[.!?:])\s', stripped, maxsplit=1)[0]
+            if len(sentence) > 200:
+                sentence = sentence[:200].rsplit(' ', 1)[0] + '…'
+            break
+        lead = f"{sentence}\n\n" if sentence else ''
+        return f"\n{lead}{self.CONDENSED_NOTE}\n\n"
+
+
+class StageProfiler:
+    """
+    Accumulates wall time, bytes in and out, and replacement counts for each
+    stage of the generation pipeline (see PromptGenerator.generate).
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict] = {}
+
+    def stage(self, name: str, bytes_in: int = 0) -> '_StageTimer':
+        """
+        Time a stage in a with block. The record returned by the context
+        manager can be updated with 'bytes_out' and 'replacements' before the
+        block ends.
+        """
+        return _StageTimer(self, name, bytes_in)
+
+    def add(self, name: str, seconds: float, record: Dict) -> None:
+        """Add one timed run of a stage to its totals."""
+        totals = self.stages.setdefault(name, {
+            'calls': 0, 'seconds': 0.0, 'bytes_in': 0, 'bytes_out': 0, 'replacements': 0,
+        })
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        for field in ('bytes_in', 'bytes_out', 'replacements'):
+            totals[field] += record[field]
+
+    def to_data(self) -> Dict:
+        """Stage totals in pipeline order, plus the overall time."""
+        return {
+            'stages': self.stages,
+            'total_seconds': sum(stage['seconds'] for stage in self.stages.values()),
+        }
+
+    def report(self) -> str:
+        """
+        Format the stage totals as a table. Stages whose output is not text
+        (compile, sections) report no bytes out.
+        """
+        total = sum(stage['seconds'] for stage in self.stages.values())
+        lines = [f"{'stage':<14} {'calls':>6} {'time':>10} {'share':>6} "
+                 f"{'bytes in':>12} {'bytes out':>12} {'replacements':>12}"]
+        for name, stage in self.stages.items():
+            share = stage['seconds'] / total if total else 0.0
+            lines.append(
+                f"{name:<14} {stage['calls']:>6} {stage['seconds'] * 1000:>8.2f}ms {share:>6.1%} "
+                f"{stage['bytes_in']:>12,} {stage['bytes_out']:>12,} {stage['replacements']:>12,}"
+            )
+        lines.append(f"{'total':<14} {'':>6} {total * 1000:>8.2f}ms")
+        return '\n'.join(lines)
+
+
+class _StageTimer:
+    """Context manager behind StageProfiler.stage."""
+
+    def __init__(self, profiler: StageProfiler, name: str, bytes_in: int):
+        self.profiler = profiler
+        self.name = name
+        self.record = {'bytes_in': bytes_in, 'bytes_out': 0, 'replacements': 0}
+
+    def __enter__(self) -> Dict:
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc_info) -> None:
+        self.profiler.add(self.name, time.perf_counter() - self.start, self.record)
+
+
+def _table_cell(text: str) -> str:
+    """Escape text for a markdown table cell."""
+    return ' '.join(text.split()).replace('|', '\\|')
+
+
+def _utf8_size(text: str) -> int:
+    return len(text.encode('utf-8'))
+
+
+# How each JobResult.status is shown
+STATUS_LABELS = {'written': 'Generated', 'unchanged': 'Unchanged', 'skipped': 'Up to date'}
+
+
+class JobResult(NamedTuple):
+    """Outcome of one (prompt_type, language) generation job."""
+    prompt_type: str
+    language: str
+    path: Optional[Path]
+    error: Optional[str]
+    duration: float
+    # 'written', 'unchanged' or 'skipped' (see PromptGenerator._generate)
+    status: str = 'written'
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
 
 
 class PromptGenerator:
@@ -227,6 +1783,8 @@ class PromptGenerator:
         'ui_ux_design': {
             'template': 'ui_ux_design_generator.prompt.md',
             'output_prefix': 'ui_ux_design',
+            # Embed the reference rows that best match the requirements
+            'reference_data': True,
         },
         'ui_ux_bridge': {
             'template': 'ui_ux_bridge.prompt.md',
@@ -242,84 +1800,266 @@ class PromptGenerator:
         },
     }
     
-    def __init__(self, base_dir: Optional[Path] = None):
-        """Initialize the generator with base directory."""
+    # Generic placeholders replaced with language-specific values (see _build_replacements)
+    PLACEHOLDERS = [
+        '[language]',
+        '[Language]',
+        '[extension]',
+        '[package-manager-format]',
+        '[package-manager]',
+        '[package_file]',
+        '[build_command]',
+        '[linter]',
+        '[code-gen-tool]',
+        '[di-library]',
+        '[state-management-library]',
+        '[async_pattern]',
+        '[result_type]',
+        '[immutability]',
+        '[json_serialization]',
+    ]
+    
+    # Other names for the languages above; more can be registered per language
+    # in .cursor/prompt_generator/languages/ (see LanguageRegistry.load_dir)
+    LANGUAGE_ALIASES = {
+        # React variations
+        'reactjs': 'react',
+        'react.js': 'react',
+        'react-js': 'react',
+        'reactjsx': 'react',
+        'react tsx': 'react',
+        'react typescript': 'react',
+        # TypeScript variations
+        'ts': 'typescript',
+        'tsx': 'react',  # TSX usually means React with TypeScript
+        'typescript react': 'react',
+        # Flutter variations
+        'dart flutter': 'flutter',
+        'flutter dart': 'flutter',
+        # Android variations
+        'android kotlin': 'kotlin',
+        'kotlin android': 'kotlin',
+        'android studio': 'kotlin',
+        'kt': 'kotlin',
+        'jetpack compose': 'kotlin',
+        # iOS variations
+        'ios swift': 'swift',
+        'swift ios': 'swift',
+        'swiftui': 'swift',
+        'swift ui': 'swift',
+        # Other common variations
+        'js': 'typescript',  # Default JS to TypeScript
+        'javascript': 'typescript',
+        'node': 'typescript',
+        'nodejs': 'typescript',
+        'node.js': 'typescript',
+        'py': 'python',
+        'python3': 'python',
+        'c#': 'csharp',
+        'dotnet': 'csharp',
+        '.net': 'csharp',
+        'golang': 'go',
+        'rustlang': 'rust',
+    }
+    
+    # Size of the chunks produced by iter_render
+    STREAM_CHUNK_SIZE = 64 * 1024
+    
+    # Stages of a render that depend only on the template and the language,
+    # and the inputs each is keyed by. Their results are kept in memory (see
+    # _run_stage), so rendering many features of one language runs them once;
+    # only the reference rows, budget cuts, requirements and metadata are
+    # applied per feature.
+    STAGE_INPUTS = {
+        # Sections, placeholders and terminology resolved
+        'body': ('template', 'language', 'config', 'terminology', 'strict_sections',
+                 'keep_priorities'),
+        # A body split into sections for the token budget (see SectionPruner)
+        'outline': ('body',),
+    }
+    # Results kept per stage, least recently used dropped first
+    STAGE_MEMO_ENTRIES = 16
+    # Results of larger templates are not kept, to bound memory
+    STAGE_MEMO_MAX_CHARS = 8 * 1024 * 1024
+    
+    # Stands in for generation dates in prompts kept by a RenderCache (private use characters)
+    DATE_PLACEHOLDER = '\ue000date\ue000'
+    
+    # Rows per reference file embedded into prompt types with 'reference_data'
+    REFERENCE_ROWS = 3
+    
+    # Framework-specific reference file (under stacks/) for each language
+    REFERENCE_STACKS = {
+        'flutter': 'flutter',
+        'dart': 'flutter',
+        'react': 'react',
+        'typescript': 'react',
+        'swift': 'swiftui',
+        'ios': 'swiftui',
+    }
+    
+    # Language aliases for conditional sections
+    SECTION_ALIASES = {
+        'react': ['react', 'typescript', 'tsx', 'jsx'],
+        'flutter': ['flutter', 'dart'],
+        'kotlin': ['kotlin', 'android'],
+        'swift': ['swift', 'ios'],
+        'python': ['python', 'py'],
+        'java': ['java'],
+        'csharp': ['csharp', 'c#', 'dotnet'],
+        'go': ['go', 'golang'],
+        'rust': ['rust'],
+    }
+    
+    # Language-specific terminology replacements (regex → replacement), applied
+    # in declaration order when rules overlap. Extra rules and plain terms can be
+    # added per language in .cursor/prompt_generator/terminology.json.
+    TERMINOLOGY_MAP = {
+        'react': {
+            r'\bpub dependencies\b': 'npm dependencies',
+            r'\bpubspec\.yaml\b': 'package.json',
+            r'\bflutter pub\b': 'npm',
+            r'\bStatefulWidget\b': 'React.Component',
+            r'\bStatelessWidget\b': 'React.FC',
+            r'\bFuture<Either<': 'Promise<Result<',
+            r'\bEither<Failure, T>': 'Result<T, E>',
+            r'\b@freezed\b': 'readonly',
+            r'\b@JsonSerializable\b': 'class-transformer',
+            r'\bimport \'package:': 'import {',
+            r'\b\.dart\b': '.tsx',
+        },
+        'flutter': {
+            r'\bnpm dependencies\b': 'pub dependencies',
+            r'\bpackage\.json\b': 'pubspec.yaml',
+            r'\bnpm\b': 'flutter pub',
+            r'\bPromise<Result<': 'Future<Either<',
+            r'\bResult<T, E>': 'Either<Failure, T>',
+        },
+        'kotlin': {
+            r'\bpub dependencies\b': 'gradle dependencies',
+            r'\bpubspec\.yaml\b': 'build.gradle.kts',
+            r'\bFuture<Either<': 'suspend fun',
+            r'\bEither<Failure, T>': 'Result<T, E>',
+        },
+    }
+    
+    def __init__(self, base_dir: Optional[Path] = None, strict_sections: bool = True,
+                 cache: Optional[TemplateCache] = None,
+                 profiler: Optional[StageProfiler] = None,
+                 token_budget: Optional[int] = None,
+                 deterministic: bool = False,
+                 incremental: bool = False,
+                 render_cache: Optional[RenderCache] = None,
+                 layered: bool = False):
+        """
+        Initialize the generator with base directory.
+        
+        strict_sections=False keeps unbalanced conditional markers as text
+        instead of failing (see CompiledTemplate). With a cache, compiled
+        templates and per-language bodies persist across runs. With a
+        profiler, every stage of generate() is timed (see render_profiled).
+        With a token_budget, low-priority sections are cut until the prompt
+        fits (see SectionPruner).
+        
+        Generation dates come from SOURCE_DATE_EPOCH when it is set; with
+        deterministic=True and no SOURCE_DATE_EPOCH they are fixed at the
+        epoch, so the same inputs always give the same bytes. With
+        incremental=True, generate() skips outputs whose inputs are unchanged
+        since the last run (see BuildManifest). With a render_cache, render(),
+        iter_render(), generate() and customize_content() return earlier
+        results for the same inputs without rendering again.
+        
+        With layered=True, generate() writes each feature's prompt as a small
+        overlay on one base file per prompt type and language (see
+        PromptOverlay); as the base is shared, this cannot be combined with a
+        token_budget.
+        """
         if base_dir is None:
             base_dir = Path(__file__).parent
         self.base_dir = Path(base_dir)
+        self.strict_sections = strict_sections
+        self.cache = cache
+        self.profiler = profiler
+        self.token_budget = token_budget
+        self.deterministic = deterministic
+        self.incremental = incremental
+        self.render_cache = render_cache
+        if layered and token_budget is not None:
+            raise ValueError("Layered outputs cannot be combined with a token budget")
+        self.layered = layered
+        # SHA-256 of each base file written by this generator (see _generate_layered)
+        self._bases: Dict[Path, str] = {}
+        epoch = os.environ.get('SOURCE_DATE_EPOCH')
+        if epoch is not None:
+            try:
+                self.source_date_epoch: Optional[int] = int(epoch)
+            except ValueError:
+                raise ValueError(f"SOURCE_DATE_EPOCH must be an integer, got {epoch!r}") from None
+        else:
+            self.source_date_epoch = 0 if deterministic else None
+        self._manifests: Dict[Path, BuildManifest] = {}
+        # When set, generate() stages its writes here until the run is committed
+        self.transaction: Optional[OutputTransaction] = None
         self.common_dir = self.base_dir / '.cursor' / 'commands' / 'common'
+        # Created on the first write to it, so constructing a generator has no side effects
         self.specify_dir = self.base_dir / '.cursor' / 'commands' / 'specify'
-        self.specify_dir.mkdir(parents=True, exist_ok=True)
+        self.terminology_file = self.base_dir / '.cursor' / 'prompt_generator' / 'terminology.json'
+        self.language_dir = self.base_dir / '.cursor' / 'prompt_generator' / 'languages'
+        self.reference_dir = self.base_dir / '.cursor' / 'uiux_reference' / 'data'
+        self._reference_index: Optional[ReferenceIndex] = None
+        self._registry: Optional[LanguageRegistry] = None
+        self._compiled_templates: Dict[str, CompiledTemplate] = {}
+        self._loaded_templates: Dict[str, Tuple[str, CompiledTemplate]] = {}
+        self._section_tables: Dict[str, Dict[str, bool]] = {}
+        self._terminology_rewriters: Dict[str, Optional[TerminologyRewriter]] = {}
+        self._terminology_data: Optional[Dict] = None
+        # Stage results by stage and key (see STAGE_INPUTS)
+        self._stages: Dict[str, Dict[str, object]] = {stage: {} for stage in self.STAGE_INPUTS}
     
     def normalize_language(self, language: str) -> str:
-        """Normalize language input to canonical key."""
-        lang_lower = language.lower().strip()
-        
-        # Language aliases mapping common variations to canonical keys
-        aliases = {
-            # React variations
-            'reactjs': 'react',
-            'react.js': 'react',
-            'reactjs': 'react',
-            'react-js': 'react',
-            'reactjsx': 'react',
-            'react tsx': 'react',
-            'react typescript': 'react',
-            # TypeScript variations
-            'ts': 'typescript',
-            'tsx': 'react',  # TSX usually means React with TypeScript
-            'typescript react': 'react',
-            # Flutter variations
-            'dart flutter': 'flutter',
-            'flutter dart': 'flutter',
-            # Android variations
-            'android kotlin': 'kotlin',
-            'kotlin android': 'kotlin',
-            'android studio': 'kotlin',
-            # iOS variations
-            'ios swift': 'swift',
-            'swift ios': 'swift',
-            'swiftui': 'swift',
-            'swift ui': 'swift',
-            # Other common variations
-            'js': 'typescript',  # Default JS to TypeScript
-            'javascript': 'typescript',
-            'node': 'typescript',
-            'nodejs': 'typescript',
-            'node.js': 'typescript',
-        }
-        
-        # Check aliases first
-        if lang_lower in aliases:
-            return aliases[lang_lower]
-        
-        # Remove common suffixes/prefixes
-        lang_clean = re.sub(r'[\.\-\s]+', '', lang_lower)
-        if lang_clean in aliases:
-            return aliases[lang_clean]
-        
-        # If it's already a canonical key, return it
-        if lang_lower in self.LANGUAGE_MAPPINGS:
-            return lang_lower
-        
-        # Try partial matches
-        for key in self.LANGUAGE_MAPPINGS.keys():
-            if lang_lower in key or key in lang_lower:
-                return key
+        """
+        Normalize language input to canonical key.
         
-        # If still not found, return as-is (will raise error in get_language_config)
-        return lang_lower
+        Unknown input is returned lowercased as-is (get_language_config then
+        raises with suggestions).
+        """
+        key = self.registry.resolve(language)
+        return key if key is not None else language.lower().strip()
     
-    def get_language_config(self, language: str) -> Dict:
-        """Get language-specific configuration."""
-        normalized = self.normalize_language(language)
-        if normalized not in self.LANGUAGE_MAPPINGS:
+    def resolve_language(self, language: str) -> Tuple[str, Dict]:
+        """Resolve language input once, returning its canonical key and configuration."""
+        registry = self.registry
+        key = registry.resolve(language)
+        if key is None:
+            suggestions = registry.suggest(language)
+            hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ''
             raise ValueError(
-                f"Unsupported language: {language}. "
-                f"Supported: {', '.join(sorted(self.LANGUAGE_MAPPINGS.keys()))}\n"
+                f"Unsupported language: {language}.{hint} "
+                f"Supported: {', '.join(sorted(registry.languages))}\n"
                 f"Common variations like 'reactjs', 'react.js' are automatically mapped to 'react'."
             )
-        return self.LANGUAGE_MAPPINGS[normalized]
+        return key, registry.languages[key]
+    
+    def get_language_config(self, language: str) -> Dict:
+        """Get language-specific configuration."""
+        return self.resolve_language(language)[1]
+    
+    @property
+    def registry(self) -> LanguageRegistry:
+        """
+        Built-in languages plus those in .cursor/prompt_generator/languages/,
+        loaded on first use.
+        """
+        if self._registry is None:
+            registry = LanguageRegistry(self.LANGUAGE_MAPPINGS, self.LANGUAGE_ALIASES)
+            registry.load_dir(self.language_dir)
+            self._registry = registry
+        return self._registry
+    
+    @property
+    def languages(self) -> Dict[str, Dict]:
+        """All registered language configurations by key."""
+        return self.registry.languages
     
     def get_prompt_config(self, prompt_type: str) -> Dict:
         """Get prompt type configuration."""
@@ -337,20 +2077,295 @@ class PromptGenerator:
             raise FileNotFoundError(f"Template not found: {template_path}")
         return template_path.read_text(encoding='utf-8')
     
+    def compile_template(self, content: str) -> CompiledTemplate:
+        """Compile template content once and reuse it for every language."""
+        import hashlib
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        return self._compile_cached(content_hash, lambda: content)
+    
+    def load_template(self, template_name: str) -> Tuple[str, CompiledTemplate]:
+        """
+        Load a compiled template by name, returning its content hash too.
+        
+        With a cache, an unchanged template is neither read nor parsed.
+        """
+        import hashlib
+        if template_name in self._loaded_templates:
+            return self._loaded_templates[template_name]
+        if self.cache is None:
+            content = self.read_template(template_name)
+            content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            return content_hash, self._compile_cached(content_hash, lambda: content)
+        
+        template_path = self.common_dir / template_name
+        if not template_path.exists():
+            raise FileNotFoundError(f"Template not found: {template_path}")
+        content_hash = self.cache.content_hash(template_path)
+        return content_hash, self._compile_cached(
+            content_hash, lambda: self.read_template(template_name)
+        )
+    
+    def preload_templates(self, templates: Dict[str, Tuple[str, CompiledTemplate]]) -> None:
+        """Use templates loaded elsewhere (see load_template) instead of reading them."""
+        self._loaded_templates.update(templates)
+    
+    def reload_template(self, template_name: str) -> None:
+        """Load a template again after it changed on disk, keeping it resident."""
+        self._loaded_templates.pop(template_name, None)
+        self._loaded_templates[template_name] = self.load_template(template_name)
+    
+    def reload_terminology(self) -> None:
+        """Drop terminology rules so the data file is read again."""
+        self._terminology_data = None
+        self._terminology_rewriters = {}
+    
+    def reload_languages(self) -> None:
+        """Drop the language registry and everything derived from it so language files are read again."""
+        self._registry = None
+        self._section_tables = {}
+    
+    def _compile_cached(self, content_hash: str, read_content) -> CompiledTemplate:
+        """Get a compiled template from memory or disk, compiling it on a miss."""
+        compiled = self._compiled_templates.get(content_hash)
+        if compiled is not None:
+            return compiled
+        key = TemplateCache.key('compiled', str(self.strict_sections), content_hash)
+        if self.cache is not None:
+            compiled = self.cache.get_compiled(key)
+        if compiled is None:
+            compiled = CompiledTemplate(read_content(), self.PLACEHOLDERS, self.strict_sections)
+            if self.cache is not None:
+                self.cache.put_compiled(key, compiled)
+        self._compiled_templates[content_hash] = compiled
+        return compiled
+    
     def customize_content(self, content: str, lang_config: Dict, 
                          requirements: Optional[str] = None,
                          language_key: Optional[str] = None) -> str:
         """Customize template content with language-specific replacements."""
+        import hashlib
+        import json
         
         # Get normalized language key for conditional sections
         if language_key is None:
             language_key = self.normalize_language(lang_config['name'].lower())
         
-        # Step 1: Handle conditional sections (<!-- BEGIN:LANG --> ... <!-- END:LANG -->)
-        content = self._process_conditional_sections(content, language_key)
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        compiled = self._compile_cached(content_hash, lambda: content)
+        key = None
+        if self.render_cache is not None:
+            key = TemplateCache.key(
+                'customize',
+                content_hash,
+                language_key,
+                json.dumps(lang_config, sort_keys=True),
+                json.dumps(self._terminology_rules(language_key), sort_keys=True),
+                json.dumps(requirements),
+                self._options_key(),
+            )
+            cached = self.render_cache.get(key)
+            if cached is not None:
+                return self._stamp(cached)
+        
+        # The token budget pruner needs the PRIORITY markers kept in the body
+        keep_priorities = self.token_budget is not None
+        body_key = self._body_key(content_hash, lang_config, language_key, keep_priorities)
+        content = self._run_stage(
+            'body', body_key,
+            lambda: self._render_body(compiled, lang_config, language_key, keep_priorities)
+        )
+        content = self._finalize_content(content, requirements, lang_config)
+        if key is None:
+            return content
+        self.render_cache.put(key, content)
+        return self._stamp(content)
+    
+    def template_key(self, template_name: str) -> str:
+        """Content hash of a template, as used in cache and input hashes."""
+        return self.load_template(template_name)[0]
+    
+    def render_language_body(self, template_name: str, lang_config: Dict,
+                             language_key: str, keep_priorities: bool = False) -> str:
+        """
+        Render the language-dependent part of a template.
         
-        # Step 2: Replace generic placeholders with language-specific values
-        replacements = {
+        This is everything customize_content produces before the requirements
+        and metadata are added; with a cache it is stored per language.
+        keep_priorities keeps the PRIORITY markers (see SectionPruner).
+        """
+        content_hash, compiled = self.load_template(template_name)
+        key = self._body_key(content_hash, lang_config, language_key, keep_priorities)
+        return self._cached_body(key, lambda: self._render_body(
+            compiled, lang_config, language_key, keep_priorities
+        ))
+    
+    def _cached_body(self, key: str, render_body) -> str:
+        """Get a body from memory or the cache, rendering it on a miss."""
+        def load() -> str:
+            body = self.cache.get_text(key) if self.cache is not None else None
+            if body is None:
+                body = render_body()
+                if self.cache is not None:
+                    self.cache.put_text(key, body)
+            return body
+        return self._run_stage('body', key, load)
+    
+    def _body_key(self, template_hash: str, lang_config: Dict, language_key: str,
+                  keep_priorities: bool) -> str:
+        """Key of a body; template_hash is the content hash of the template (see template_key)."""
+        import json
+        return self._stage_key(
+            'body',
+            template=template_hash,
+            language=language_key,
+            config=json.dumps(lang_config, sort_keys=True),
+            terminology=json.dumps(self._terminology_rules(language_key), sort_keys=True),
+            strict_sections=str(self.strict_sections),
+            keep_priorities=str(keep_priorities),
+        )
+    
+    def _stage_key(self, stage: str, **inputs: str) -> str:
+        """Key a stage's result by exactly the inputs STAGE_INPUTS declares for it."""
+        declared = self.STAGE_INPUTS[stage]
+        if set(inputs) != set(declared):
+            raise ValueError(
+                f"Stage {stage} takes inputs {', '.join(declared)}, got {', '.join(sorted(inputs))}"
+            )
+        return TemplateCache.key(stage, *(inputs[name] for name in declared))
+    
+    def _stage_result(self, stage: str, key: str):
+        """A kept result of a stage, or None."""
+        results = self._stages[stage]
+        result = results.pop(key, None)
+        if result is not None:
+            # Most recently used last
+            results[key] = result
+        return result
+    
+    def _keep_stage_result(self, stage: str, key: str, result, size: int) -> None:
+        if size > self.STAGE_MEMO_MAX_CHARS:
+            return
+        results = self._stages[stage]
+        results[key] = result
+        while len(results) > self.STAGE_MEMO_ENTRIES:
+            try:
+                results.pop(next(iter(results)), None)
+            except (StopIteration, RuntimeError):
+                # Emptied or changed by another thread
+                break
+    
+    def _run_stage(self, stage: str, key: str, compute, size: Optional[int] = None):
+        """
+        Get the result of a stage from memory, computing and keeping it on a
+        miss. size (by default the length of the result) decides whether it
+        is small enough to keep.
+        """
+        result = self._stage_result(stage, key)
+        if result is None:
+            result = compute()
+            self._keep_stage_result(stage, key, result, len(result) if size is None else size)
+        return result
+    
+    def _iter_stage(self, stage: str, key: str, chunks):
+        """Pass chunks through, keeping their text as the stage's result if small enough."""
+        kept: Optional[List[str]] = []
+        size = 0
+        for chunk in chunks:
+            if kept is not None:
+                size += len(chunk)
+                if size <= self.STAGE_MEMO_MAX_CHARS:
+                    kept.append(chunk)
+                else:
+                    kept = None
+            yield chunk
+        if kept is not None:
+            self._keep_stage_result(stage, key, ''.join(kept), size)
+    
+    def _render_body(self, compiled: CompiledTemplate, lang_config: Dict,
+                     language_key: str, keep_priorities: bool = False) -> str:
+        """Resolve sections, placeholders and terminology for one language."""
+        # Steps 1-3: Resolve conditional sections (<!-- BEGIN:LANG --> ... <!-- END:LANG -->),
+        # generic placeholders and code block language tags in a single pass
+        content = compiled.render(
+            self._build_replacements(lang_config),
+            self._included_sections(compiled, language_key),
+            keep_priorities
+        )
+        
+        # Step 4: Replace language-specific terminology
+        return self._replace_language_terminology(content, language_key, lang_config)
+    
+    def _finalize_content(self, content: str, requirements: Optional[str],
+                          lang_config: Dict, reference: str = '') -> str:
+        """Add the requirements section (followed by any reference rows) and generation metadata."""
+        # Cut low-priority sections when a token budget is set
+        if self.token_budget is not None:
+            content = self._fit_token_budget(content, requirements, lang_config, reference)
+        
+        # Add language-specific notes
+        if requirements:
+            content = self._add_requirements_section(content, requirements, lang_config, reference)
+        
+        # Add generation metadata
+        return self._add_metadata(content, lang_config)
+    
+    def _fit_token_budget(self, content: str, requirements: Optional[str],
+                          lang_config: Dict, reference: str = '') -> str:
+        """
+        Cut the body so that the finished prompt fits token_budget, and append
+        a report of the cuts. The requirements, reference rows and metadata
+        are never cut, so their tokens are reserved first.
+        """
+        import hashlib
+        fixed = self._metadata_section(lang_config)
+        if requirements:
+            fixed += self._requirements_section(requirements, lang_config) + reference
+        key = self._stage_key('outline', body=hashlib.sha256(content.encode('utf-8')).hexdigest())
+        pruner = self._run_stage('outline', key, lambda: SectionPruner(content), len(content))
+        before = pruner.tokens_with(fixed)
+        report_section = ''
+        # The report takes tokens too; re-fit until it is accounted for
+        for _ in range(3):
+            reserved = SectionPruner.estimate_tokens(fixed + report_section)
+            body, cuts = pruner.fit(max(self.token_budget - reserved, 0))
+            after = SectionPruner.estimate_tokens(body + fixed + report_section)
+            previous, report_section = report_section, self._budget_report(before, after, cuts)
+            if len(report_section) <= len(previous):
+                break
+        return body + report_section
+    
+    def _budget_report(self, before: int, after: int, cuts: List[Dict]) -> str:
+        """Build the section listing the sections cut to fit the token budget."""
+        lines = [
+            '',
+            '---',
+            '',
+            '## Token Budget Report',
+            '',
+            f'**Budget:** {self.token_budget} tokens '
+            f'(estimated at {SectionPruner.CHARS_PER_TOKEN} characters per token)',
+            f'**Estimated size:** {before} tokens before, {after} tokens after',
+            '',
+        ]
+        if cuts:
+            lines.append('| Section | Priority | Action | Tokens before | Tokens after |')
+            lines.append('|---|---|---|---|---|')
+            for cut in cuts:
+                lines.append(
+                    f"| {_table_cell(cut['title'])} | {cut['priority']} | {cut['action']} "
+                    f"| {cut['tokens_before']} | {cut['tokens_after']} |"
+                )
+        else:
+            lines.append('No sections were cut.')
+        if after > self.token_budget:
+            lines.append('')
+            lines.append('*The prompt is still over budget: the remaining sections '
+                         'are marked as required.*')
+        return '\n'.join(lines) + '\n'
+    
+    def _build_replacements(self, lang_config: Dict) -> Dict[str, str]:
+        """Map every entry of PLACEHOLDERS to its language-specific value."""
+        return {
             '[language]': lang_config['name'].lower(),
             '[Language]': lang_config['name'],
             '[extension]': lang_config['extension'],
@@ -367,37 +2382,6 @@ class PromptGenerator:
             '[immutability]': lang_config['immutability'],
             '[json_serialization]': lang_config['json_serialization'],
         }
-        
-        # Apply replacements
-        for placeholder, value in replacements.items():
-            content = content.replace(placeholder, str(value))
-        
-        # Step 3: Replace code block language tags - handle multiple patterns
-        # Pattern 1: ```[language]
-        content = re.sub(
-            r'```\[language\]',
-            f"```{lang_config['name'].lower()}",
-            content,
-            flags=re.IGNORECASE
-        )
-        # Pattern 2: ```[Language] (capitalized)
-        content = re.sub(
-            r'```\[Language\]',
-            f"```{lang_config['name']}",
-            content
-        )
-        
-        # Step 4: Replace language-specific terminology
-        content = self._replace_language_terminology(content, language_key, lang_config)
-        
-        # Add language-specific notes
-        if requirements:
-            content = self._add_requirements_section(content, requirements, lang_config)
-        
-        # Add generation metadata
-        content = self._add_metadata(content, lang_config)
-        
-        return content
     
     def _process_conditional_sections(self, content: str, target_lang: str) -> str:
         """
@@ -408,60 +2392,52 @@ class PromptGenerator:
         <!-- BEGIN:REACT -->...<!-- END:REACT -->
         
         Only includes sections matching the target language, removes others.
+        Sections may be nested; unbalanced markers raise TemplateSyntaxError.
         """
-        # Language aliases for conditional sections
-        lang_aliases = {
-            'react': ['react', 'typescript', 'tsx', 'jsx'],
-            'flutter': ['flutter', 'dart'],
-            'kotlin': ['kotlin', 'android'],
-            'swift': ['swift', 'ios'],
-            'python': ['python', 'py'],
-            'java': ['java'],
-            'csharp': ['csharp', 'c#', 'dotnet'],
-            'go': ['go', 'golang'],
-            'rust': ['rust'],
-        }
+        compiled = CompiledTemplate(content, [], self.strict_sections)
+        return compiled.render({}, self._included_sections(compiled, target_lang))
+    
+    def _included_sections(self, compiled: CompiledTemplate, target_lang: str) -> set:
+        """Get the section tags of a compiled template kept for a language."""
+        table = self._section_table(target_lang)
+        for tag in compiled.tags - table.keys():
+            table[tag] = self._should_include_section(tag, target_lang)
+        return {tag for tag in compiled.tags if table[tag]}
+    
+    def _section_table(self, target_lang: str) -> Dict[str, bool]:
+        """Get the precomputed section tag → include lookup table for a language."""
+        target_lang = target_lang.lower()
+        table = self._section_tables.get(target_lang)
+        if table is None:
+            known_tags = set(self.languages)
+            for key, aliases in self.SECTION_ALIASES.items():
+                known_tags.add(key)
+                known_tags.update(aliases)
+            table = {tag: self._should_include_section(tag, target_lang) for tag in known_tags}
+            self._section_tables[target_lang] = table
+        return table
+    
+    def _should_include_section(self, section_lang: str, target_lang: str) -> bool:
+        """Check if a section should be included for target language."""
+        section_lang_lower = section_lang.lower()
+        target_lang_lower = target_lang.lower()
         
-        # Find all conditional sections
-        pattern = r'<!--\s*BEGIN:(\w+)\s*-->.*?<!--\s*END:\1\s*-->'
+        # Direct match
+        if section_lang_lower == target_lang_lower:
+            return True
         
-        def should_include_section(section_lang: str) -> bool:
-            """Check if a section should be included for target language."""
-            section_lang_lower = section_lang.lower()
-            target_lang_lower = target_lang.lower()
-            
-            # Direct match
-            if section_lang_lower == target_lang_lower:
+        # Check aliases
+        for key, aliases in self.SECTION_ALIASES.items():
+            if target_lang_lower == key and section_lang_lower in aliases:
                 return True
-            
-            # Check aliases
-            for key, aliases in lang_aliases.items():
-                if target_lang_lower == key and section_lang_lower in aliases:
-                    return True
-                if section_lang_lower == key and target_lang_lower in aliases:
-                    return True
-            
-            # Partial match (e.g., "REACT" matches "react")
-            if section_lang_lower in target_lang_lower or target_lang_lower in section_lang_lower:
+            if section_lang_lower == key and target_lang_lower in aliases:
                 return True
-            
-            return False
-        
-        def replace_section(match):
-            section_lang = match.group(1)
-            section_content = match.group(0)
-            
-            if should_include_section(section_lang):
-                # Include the section, but remove the markers
-                return re.sub(r'<!--\s*(BEGIN|END):\w+\s*-->', '', section_content)
-            else:
-                # Remove the entire section
-                return ''
         
-        # Process all conditional sections
-        content = re.sub(pattern, replace_section, content, flags=re.DOTALL | re.IGNORECASE)
+        # Partial match (e.g., "REACT" matches "react")
+        if section_lang_lower in target_lang_lower or target_lang_lower in section_lang_lower:
+            return True
         
-        return content
+        return False
     
     def _replace_language_terminology(self, content: str, language_key: str, lang_config: Dict) -> str:
         """
@@ -472,41 +2448,37 @@ class PromptGenerator:
         - "StatefulWidget" → "React.Component" (for React)
         - "Future<Either<...>>" → "Promise<Result<...>>" (for React)
         """
-        # Language-specific terminology replacements
-        terminology_map = {
-            'react': {
-                r'\bpub dependencies\b': 'npm dependencies',
-                r'\bpubspec\.yaml\b': 'package.json',
-                r'\bflutter pub\b': 'npm',
-                r'\bStatefulWidget\b': 'React.Component',
-                r'\bStatelessWidget\b': 'React.FC',
-                r'\bFuture<Either<': 'Promise<Result<',
-                r'\bEither<Failure, T>': 'Result<T, E>',
-                r'\b@freezed\b': 'readonly',
-                r'\b@JsonSerializable\b': 'class-transformer',
-                r'\bimport \'package:': 'import {',
-                r'\b\.dart\b': '.tsx',
-            },
-            'flutter': {
-                r'\bnpm dependencies\b': 'pub dependencies',
-                r'\bpackage\.json\b': 'pubspec.yaml',
-                r'\bnpm\b': 'flutter pub',
-                r'\bPromise<Result<': 'Future<Either<',
-                r'\bResult<T, E>': 'Either<Failure, T>',
-            },
-            'kotlin': {
-                r'\bpub dependencies\b': 'gradle dependencies',
-                r'\bpubspec\.yaml\b': 'build.gradle.kts',
-                r'\bFuture<Either<': 'suspend fun',
-                r'\bEither<Failure, T>': 'Result<T, E>',
-            },
-        }
-        
-        if language_key in terminology_map:
-            for pattern, replacement in terminology_map[language_key].items():
-                content = re.sub(pattern, replacement, content, flags=re.IGNORECASE)
-        
-        return content
+        rewriter = self.get_terminology_rewriter(language_key)
+        if rewriter is None:
+            return content
+        return rewriter.sub(content)
+    
+    def get_terminology_rewriter(self, language_key: str) -> Optional['TerminologyRewriter']:
+        """Get the compiled terminology rewriter for a language, if it has rules."""
+        if language_key not in self._terminology_rewriters:
+            patterns, terms = self._terminology_rules(language_key)
+            rewriter = TerminologyRewriter(patterns, terms) if patterns or terms else None
+            self._terminology_rewriters[language_key] = rewriter
+        return self._terminology_rewriters[language_key]
+    
+    def _terminology_rules(self, language_key: str) -> Tuple[List[Tuple[str, str]], Dict[str, str]]:
+        """Collect built-in and data file terminology rules for a language."""
+        patterns = list(self.TERMINOLOGY_MAP.get(language_key, {}).items())
+        extra = self._load_terminology_file().get(language_key, {})
+        patterns.extend(tuple(rule) for rule in extra.get('patterns', []))
+        return patterns, dict(extra.get('terms', {}))
+    
+    def _load_terminology_file(self) -> Dict:
+        """Load extra terminology rules from the optional data file."""
+        import json
+        if self._terminology_data is None:
+            self._terminology_data = {}
+            if self.terminology_file.exists():
+                try:
+                    self._terminology_data = json.loads(self.terminology_file.read_text(encoding='utf-8'))
+                except ValueError as e:
+                    raise ValueError(f"Invalid terminology file {self.terminology_file}: {e}")
+        return self._terminology_data
     
     def _get_package_format(self, lang_config: Dict) -> str:
         """Get package manager format string."""
@@ -527,13 +2499,30 @@ class PromptGenerator:
             return 'text'
     
     def _add_requirements_section(self, content: str, requirements: str, 
-                                  lang_config: Dict) -> str:
+                                  lang_config: Dict, reference: str = '') -> str:
         """Add a requirements section at the beginning."""
-        requirements_section = f"""
+        requirements_section = self._requirements_section(requirements, lang_config) + reference
+        insert_pos = self._requirements_position(content)
+        if insert_pos is not None:
+            return content[:insert_pos] + requirements_section + content[insert_pos:]
+        return requirements_section + content
+    
+    def _requirements_position(self, content: str) -> Optional[int]:
+        """Get the insert position after the frontmatter, or None to prepend."""
+        if content.startswith('---'):
+            # Find end of frontmatter
+            end_idx = content.find('---', 3)
+            if end_idx != -1:
+                return end_idx + 3
+        return None
+    
+    def _requirements_section(self, requirements: str, lang_config: Dict) -> str:
+        """Build the generated requirements section."""
+        return f"""
 ## Generated Requirements
 
 **Target Language/Framework:** {lang_config['name']}
-**Generation Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**Generation Date:** {self._generation_date()}
 
 **User Requirements:**
 {requirements}
@@ -541,25 +2530,76 @@ class PromptGenerator:
 ---
 
 """
-        # Insert after frontmatter or at the beginning
-        if content.startswith('---'):
-            # Find end of frontmatter
-            end_idx = content.find('---', 3)
-            if end_idx != -1:
-                insert_pos = end_idx + 3
-                return content[:insert_pos] + requirements_section + content[insert_pos:]
-        return requirements_section + content
+    
+    def _reference_section(self, prompt_config: Dict, language_key: str,
+                           requirements: Optional[str]) -> str:
+        """
+        Build the section with the reference rows that best match the
+        requirements, for prompt types with 'reference_data'. Top-level files
+        are searched along with the stacks/ file for the language.
+        """
+        if not (requirements and prompt_config.get('reference_data') and self.REFERENCE_ROWS):
+            return ''
+        if not self.reference_dir.is_dir():
+            return ''
+        if self._reference_index is None:
+            self._reference_index = ReferenceIndex(self.reference_dir, self.cache)
+        stack = f"stacks/{self.REFERENCE_STACKS.get(language_key)}"
+        results = self._reference_index.search(
+            requirements, self.REFERENCE_ROWS,
+            lambda source: '/' not in source or source == stack,
+        )
+        if not results:
+            return ''
+        
+        lines = [
+            '## Relevant UI/UX Reference Data',
+            '',
+            'The rows of `.cursor/uiux_reference/data/` that best match the requirements. '
+            'Start from these and open the CSV files only when more detail is needed.',
+            '',
+        ]
+        for source in sorted(results):
+            header, rows = results[source]
+            lines.append(f'### {source}.csv')
+            lines.append('')
+            lines.append('| ' + ' | '.join(_table_cell(cell) for cell in header) + ' |')
+            lines.append('|' + '---|' * len(header))
+            for row in rows:
+                cells = (row + [''] * len(header))[:len(header)]
+                lines.append('| ' + ' | '.join(_table_cell(cell) for cell in cells) + ' |')
+            lines.append('')
+        lines.append('---')
+        return '\n'.join(lines) + '\n\n'
     
     def _add_metadata(self, content: str, lang_config: Dict) -> str:
         """Add generation metadata at the end."""
-        metadata = f"""
+        return content + self._metadata_section(lang_config)
+    
+    def _generation_date(self) -> str:
+        """The date shown in a prompt, or a placeholder if it is stamped on the way out."""
+        if self.render_cache is not None and self.source_date_epoch is None:
+            # Cached prompts are dated when they are returned, not when first rendered
+            return self.DATE_PLACEHOLDER
+        return _timestamp(self.source_date_epoch)
+    
+    def _stamp(self, content: str) -> str:
+        """Fill in the dates of a prompt rendered for the render cache."""
+        if self.source_date_epoch is not None:
+            # Fixed dates are rendered in place and are part of the cache key
+            return content
+        return content.replace(self.DATE_PLACEHOLDER, _timestamp(self.source_date_epoch))
+    
+    def _metadata_section(self, lang_config: Dict) -> str:
+        """Build the generation metadata footer."""
+        return f"""
 
 ---
 
 ## Generation Metadata
 
 **Generated for:** {lang_config['name']}
-**Generated on:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**Generated on:** {self._generation_date()}
 **Language Extension:** {lang_config['extension']}
 **Package Manager:** {lang_config['package_manager']}
 **Build Command:** `{lang_config['build_command']}`
@@ -574,7 +2614,177 @@ class PromptGenerator:
 - Dependency Injection: {lang_config['di_library']}
 
 """
-        return content + metadata
+    
+    def iter_render(self, prompt_type: str, language: str,
+                    requirements: Optional[str] = None):
+        """
+        Yield a customized prompt in chunks instead of building one string.
+        
+        The first time a template is rendered for a language without a cache,
+        peak memory is about one compiled template plus a chunk buffer (and the
+        body kept for the next feature, up to STAGE_MEMO_MAX_CHARS); after that,
+        or with a cache, the language body is loaded whole and streamed out in
+        chunks.
+        """
+        if self.render_cache is not None:
+            yield from _split_chunks(self.render(prompt_type, language, requirements),
+                                     self.STREAM_CHUNK_SIZE)
+            return
+        language_key, lang_config = self.resolve_language(language)
+        prompt_config = self.get_prompt_config(prompt_type)
+        
+        try:
+            reference = self._reference_section(prompt_config, language_key, requirements)
+            if self.token_budget is not None:
+                # Pruning needs the whole body, so only the output is chunked
+                body = self.render_language_body(
+                    prompt_config['template'], lang_config, language_key, keep_priorities=True
+                )
+                content = self._finalize_content(body, requirements, lang_config, reference)
+                yield from _split_chunks(content, self.STREAM_CHUNK_SIZE)
+                return
+            template_name = prompt_config['template']
+            content_hash, compiled = self.load_template(template_name)
+            key = self._body_key(content_hash, lang_config, language_key, False)
+            body = self._stage_result('body', key)
+            if body is None and self.cache is not None:
+                body = self.render_language_body(template_name, lang_config, language_key)
+            if body is not None:
+                chunks = _split_chunks(body, self.STREAM_CHUNK_SIZE)
+            else:
+                chunks = self._iter_stage('body', key, self._iter_render_body(
+                    compiled, lang_config, language_key
+                ))
+            yield from self._iter_finalize(chunks, requirements, lang_config, reference)
+        except TemplateSyntaxError as e:
+            if e.template is None:
+                e.template = prompt_config['template']
+            raise
+    
+    def render_profiled(self, prompt_type: str, language: str,
+                        requirements: Optional[str] = None) -> str:
+        """
+        Render a customized prompt one stage at a time, recording each stage
+        with the profiler.
+        
+        The per-language body cache is bypassed so that every stage runs; the
+        output is the same as render().
+        """
+        profiler = self.profiler
+        language_key, lang_config = self.resolve_language(language)
+        prompt_config = self.get_prompt_config(prompt_type)
+        
+        with profiler.stage('read') as record:
+            content = self.read_template(prompt_config['template'])
+            record['bytes_out'] = _utf8_size(content)
+        size = record['bytes_out']
+        try:
+            with profiler.stage('compile', size):
+                compiled = self.compile_template(content)
+        except TemplateSyntaxError as e:
+            if e.template is None:
+                e.template = prompt_config['template']
+            raise
+        
+        with profiler.stage('sections', size) as record:
+            selected, removed = compiled.select_sections(
+                self._included_sections(compiled, language_key)
+            )
+            record['replacements'] = removed
+        with profiler.stage('placeholders', size) as record:
+            keep_priorities = self.token_budget is not None
+            body = selected.render(self._build_replacements(lang_config), (), keep_priorities)
+            record['replacements'] = sum(
+                1 for op in selected.ops if op[0] != CompiledTemplate.LITERAL
+            )
+            record['bytes_out'] = _utf8_size(body)
+        
+        size = record['bytes_out']
+        with profiler.stage('terminology', size) as record:
+            rewriter = self.get_terminology_rewriter(language_key)
+            if rewriter is not None:
+                body, record['replacements'] = rewriter.subn(body)
+            record['bytes_out'] = _utf8_size(body)
+        
+        size = record['bytes_out']
+        with profiler.stage('reference') as record:
+            reference = self._reference_section(prompt_config, language_key, requirements)
+            record['replacements'] = reference.count('\n| ') - reference.count('\n|---')
+            record['bytes_out'] = _utf8_size(reference)
+        
+        if self.token_budget is not None:
+            with profiler.stage('budget', size) as record:
+                body = self._fit_token_budget(body, requirements, lang_config, reference)
+                record['bytes_out'] = size = _utf8_size(body)
+        
+        with profiler.stage('requirements', size) as record:
+            if requirements:
+                body = self._add_requirements_section(body, requirements, lang_config, reference)
+                record['replacements'] = 1
+            record['bytes_out'] = _utf8_size(body)
+        
+        size = record['bytes_out']
+        with profiler.stage('metadata', size) as record:
+            body = self._add_metadata(body, lang_config)
+            record['replacements'] = 1
+            record['bytes_out'] = _utf8_size(body)
+        return body
+    
+    def write_stream(self, stream, prompt_type: str, language: str,
+                     requirements: Optional[str] = None) -> int:
+        """Render a customized prompt into any writable text stream; returns characters written."""
+        if self.profiler is not None:
+            content = self.render_profiled(prompt_type, language, requirements)
+            with self.profiler.stage('write', _utf8_size(content)) as record:
+                stream.write(content)
+                record['bytes_out'] = record['bytes_in']
+            return len(content)
+        written = 0
+        for chunk in self.iter_render(prompt_type, language, requirements):
+            stream.write(chunk)
+            written += len(chunk)
+        return written
+    
+    def _iter_render_body(self, compiled: CompiledTemplate, lang_config: Dict,
+                          language_key: str):
+        """Streaming counterpart of _render_body, yielding chunks."""
+        pieces = compiled.iter_render(
+            self._build_replacements(lang_config),
+            self._included_sections(compiled, language_key)
+        )
+        chunks = _coalesce(pieces, self.STREAM_CHUNK_SIZE)
+        rewriter = self.get_terminology_rewriter(language_key)
+        if rewriter is None:
+            return chunks
+        return rewriter.iter_sub(chunks)
+    
+    def _iter_finalize(self, chunks, requirements: Optional[str], lang_config: Dict,
+                       reference: str = ''):
+        """Streaming counterpart of _finalize_content."""
+        chunks = iter(chunks)
+        if requirements:
+            # Hold output back until the end of the frontmatter is known
+            head = ''
+            insert_pos = None
+            for chunk in chunks:
+                head += chunk
+                if len(head) < 3:
+                    continue
+                if not head.startswith('---'):
+                    break
+                insert_pos = self._requirements_position(head)
+                if insert_pos is not None:
+                    break
+            section = self._requirements_section(requirements, lang_config) + reference
+            if insert_pos is None:
+                yield section
+                yield head
+            else:
+                yield head[:insert_pos]
+                yield section
+                yield head[insert_pos:]
+        yield from chunks
+        yield self._metadata_section(lang_config)
     
     def generate_filename(self, prompt_type: str, language: str, 
                          feature_name: Optional[str] = None) -> str:
@@ -592,43 +2802,275 @@ class PromptGenerator:
         
         return f"{'_'.join(parts)}.prompt.md"
     
-    def generate(self, prompt_type: str, language: str, 
+    def generate_base_filename(self, prompt_type: str, language: str) -> str:
+        """Filename of the base file that layered feature overlays refer to."""
+        name = self.generate_filename(prompt_type, language)
+        return name[:-len('.prompt.md')] + PromptOverlay.BASE_SUFFIX
+    
+    def render(self, prompt_type: str, language: str,
+               requirements: Optional[str] = None) -> str:
+        """Render a customized prompt without writing it."""
+        if self.render_cache is None:
+            return self._render(prompt_type, language, requirements)
+        content = self.render_cache.get_or_render(
+            self.input_hash(prompt_type, language, requirements),
+            lambda: self._render(prompt_type, language, requirements),
+        )
+        return self._stamp(content)
+    
+    def _render(self, prompt_type: str, language: str, requirements: Optional[str]) -> str:
+        # Get configurations; the language key also selects conditional sections
+        language_key, lang_config = self.resolve_language(language)
+        prompt_config = self.get_prompt_config(prompt_type)
+        
+        # Render the template for the language, then add requirements and metadata
+        try:
+            body = self.render_language_body(
+                prompt_config['template'], lang_config, language_key,
+                keep_priorities=self.token_budget is not None
+            )
+        except TemplateSyntaxError as e:
+            if e.template is None:
+                e.template = prompt_config['template']
+            raise
+        reference = self._reference_section(prompt_config, language_key, requirements)
+        return self._finalize_content(body, requirements, lang_config, reference)
+
+    def render_matrix(self, prompt_type: str, languages: Optional[List[str]] = None,
+                      requirements: Optional[str] = None) -> Dict[str, str]:
+        """
+        Render one prompt type for many languages, sharing the work that does
+        not depend on the language; returns the prompts by language as given.
+
+        The template is loaded and hashed once, and its conditional sections,
+        literal text and code fence tags are resolved once per distinct set of
+        sections kept (see CompiledTemplate.specialize), so each language only
+        adds its placeholder values, terminology, requirements and
+        metadata. Each prompt is the same as render() gives; languages
+        defaults to every supported language.
+        """
+        if languages is None:
+            languages = list(self.languages)
+        prompt_config = self.get_prompt_config(prompt_type)
+        template_name = prompt_config['template']
+        keep_priorities = self.token_budget is not None
+        specialized: Dict[frozenset, CompiledTemplate] = {}
+        prompts = {}
+        try:
+            template_hash, compiled = self.load_template(template_name)
+            for language in languages:
+                key = None
+                if self.render_cache is not None:
+                    key = self.input_hash(prompt_type, language, requirements)
+                    content = self.render_cache.get(key)
+                    if content is not None:
+                        prompts[language] = self._stamp(content)
+                        continue
+
+                language_key, lang_config = self.resolve_language(language)
+
+                def render_body() -> str:
+                    tags = frozenset(self._included_sections(compiled, language_key))
+                    template = specialized.get(tags)
+                    if template is None:
+                        template = specialized[tags] = compiled.specialize(tags, keep_priorities)
+                    return self._render_body(template, lang_config, language_key, keep_priorities)
+
+                body = self._cached_body(
+                    self._body_key(template_hash, lang_config, language_key, keep_priorities),
+                    render_body,
+                )
+                reference = self._reference_section(prompt_config, language_key, requirements)
+                content = self._finalize_content(body, requirements, lang_config, reference)
+                if key is not None:
+                    self.render_cache.put(key, content)
+                    content = self._stamp(content)
+                prompts[language] = content
+        except TemplateSyntaxError as e:
+            if e.template is None:
+                e.template = template_name
+            raise
+        return prompts
+
+    def generate(self, prompt_type: str, language: str,
                 requirements: Optional[str] = None,
                 feature_name: Optional[str] = None,
                 output_path: Optional[Path] = None) -> Path:
         """Generate a customized prompt file."""
-        # Get configurations
-        lang_config = self.get_language_config(language)
-        prompt_config = self.get_prompt_config(prompt_type)
-        
-        # Normalize language key for conditional sections
-        language_key = self.normalize_language(language)
-        
-        # Read template
-        template_content = self.read_template(prompt_config['template'])
-        
-        # Customize content
-        customized_content = self.customize_content(
-            template_content, 
-            lang_config, 
-            requirements,
-            language_key
-        )
+        output_path = self._generate(prompt_type, language, requirements, feature_name,
+                                     output_path)[0]
+        if self.transaction is None:
+            self.save_manifests()
+        return output_path
+    
+    def _generate(self, prompt_type: str, language: str, requirements: Optional[str],
+                  feature_name: Optional[str], output_path: Optional[Path]) -> Tuple[Path, str]:
+        """
+        Generate a customized prompt file, returning its path and what was
+        done: 'written', 'unchanged' (identical content, file left alone) or
+        'skipped' (inputs unchanged, nothing rendered; incremental mode).
+        """
+        # Resolve the language once; the canonical key is an exact index hit below
+        language = self.resolve_language(language)[0]
         
         # Determine output path
         if output_path is None:
-            filename = self.generate_filename(prompt_type, language, feature_name)
-            output_path = self.specify_dir / filename
+            output_path = self.specify_dir / self.generate_filename(prompt_type, language, feature_name)
         else:
             output_path = Path(output_path)
             if output_path.is_dir():
                 filename = self.generate_filename(prompt_type, language, feature_name)
                 output_path = output_path / filename
         
-        # Write output
-        output_path.write_text(customized_content, encoding='utf-8')
+        if self.layered and feature_name:
+            return self._generate_layered(prompt_type, language, requirements, output_path)
         
-        return output_path
+        manifest = inputs = None
+        if self.incremental:
+            manifest = self._manifest(output_path.parent)
+            inputs = self.input_hash(prompt_type, language, requirements)
+            if manifest.is_current(output_path, inputs):
+                return output_path, 'skipped'
+        
+        if self.profiler is not None:
+            chunks = iter([self.render_profiled(prompt_type, language, requirements)])
+        else:
+            chunks = self.iter_render(prompt_type, language, requirements)
+        # Template and config errors surface here, before the output file is touched
+        first_chunk = next(chunks)
+        if output_path.parent == self.specify_dir:
+            self.specify_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Write output, streaming it in chunks
+        if self.profiler is not None:
+            write_stage = self.profiler.stage('write', _utf8_size(first_chunk))
+        else:
+            # Timed into a throwaway profiler
+            write_stage = StageProfiler().stage('write')
+        with write_stage as record:
+            written = self._write_output(output_path, first_chunk, chunks)
+            record['bytes_out'] = record['bytes_in'] if written else 0
+        
+        if manifest is not None:
+            manifest.record(output_path, inputs, self._staged(output_path))
+        return output_path, 'written' if written else 'unchanged'
+    
+    @property
+    def lock_dir(self) -> Optional[Path]:
+        """Where output lock files are kept: the cache's lock directory if there is a cache."""
+        return self.cache.lock_dir if self.cache is not None else None
+    
+    def _write_output(self, path: Path, first_chunk: str, chunks) -> bool:
+        """Write an output file, through the transaction when there is one."""
+        if self.transaction is not None:
+            return self.transaction.write(path, first_chunk, chunks)
+        with FileLock.for_path(path, self.lock_dir):
+            return _write_if_changed(path, first_chunk, chunks)
+    
+    def _staged(self, path: Path) -> Optional[Path]:
+        return self.transaction.staged(path) if self.transaction is not None else None
+    
+    def _manifest(self, directory: Path) -> BuildManifest:
+        manifest = self._manifests.get(directory)
+        if manifest is None:
+            manifest = self._manifests[directory] = BuildManifest(directory, self.lock_dir)
+        if self.transaction is not None:
+            self.transaction.track(manifest)
+        return manifest
+    
+    def save_manifests(self) -> None:
+        """
+        Write the manifest entries recorded in incremental mode, once per
+        output directory. Runs call this at their end; under a transaction,
+        its commit saves them instead.
+        """
+        for manifest in list(self._manifests.values()):
+            manifest.save()
+    
+    def _take_manifest_updates(self) -> Dict[Path, Dict[str, Dict]]:
+        """Manifest entries recorded since the last take, by directory (see generate_matrix)."""
+        updates = {}
+        for directory, manifest in list(self._manifests.items()):
+            entries = manifest.take_updates()
+            if entries:
+                updates[directory] = entries
+        return updates
+    
+    def _generate_layered(self, prompt_type: str, language: str, requirements: Optional[str],
+                          output_path: Path) -> Tuple[Path, str]:
+        """
+        Write a feature's prompt to output_path as an overlay on the base file
+        of its prompt type and language, writing the base too if it changed.
+        """
+        import hashlib
+        base_path = output_path.parent / self.generate_base_filename(prompt_type, language)
+        manifest = inputs = base_inputs = None
+        if self.incremental:
+            manifest = self._manifest(output_path.parent)
+            inputs = TemplateCache.key('overlay', self.input_hash(prompt_type, language, requirements))
+            base_inputs = TemplateCache.key('base', self.input_hash(prompt_type, language))
+            if (manifest.is_current(output_path, inputs)
+                    and manifest.is_current(base_path, base_inputs)):
+                return output_path, 'skipped'
+        
+        language_key, lang_config = self.resolve_language(language)
+        prompt_config = self.get_prompt_config(prompt_type)
+        try:
+            body = self.render_language_body(prompt_config['template'], lang_config, language_key)
+        except TemplateSyntaxError as e:
+            if e.template is None:
+                e.template = prompt_config['template']
+            raise
+        head = ''
+        if requirements:
+            reference = self._reference_section(prompt_config, language_key, requirements)
+            head = self._stamp(self._requirements_section(requirements, lang_config) + reference)
+        footer = self._stamp(self._metadata_section(lang_config))
+        base_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        overlay = PromptOverlay.build(
+            base_path.name, base_hash, self._requirements_position(body) or 0, head, footer
+        )
+        
+        if output_path.parent == self.specify_dir:
+            self.specify_dir.mkdir(parents=True, exist_ok=True)
+        written = False
+        if self._bases.get(base_path) != base_hash or not base_path.exists():
+            # Every feature of the language shares the base; compare it once per run
+            written = self._write_output(base_path, body, iter(()))
+            self._bases[base_path] = base_hash
+        written = self._write_output(output_path, overlay, iter(())) or written
+        
+        if manifest is not None:
+            manifest.record(base_path, base_inputs, self._staged(base_path))
+            manifest.record(output_path, inputs, self._staged(output_path))
+        return output_path, 'written' if written else 'unchanged'
+    
+    def input_hash(self, prompt_type: str, language: str,
+                   requirements: Optional[str] = None) -> str:
+        """
+        Hash of everything a generated prompt is built from: the template,
+        the language configuration, terminology rules, requirements, matching
+        reference rows, rendering options and the generator version. Generation
+        dates are included only when they are fixed (see __init__).
+        """
+        import json
+        language_key, lang_config = self.resolve_language(language)
+        prompt_config = self.get_prompt_config(prompt_type)
+        return TemplateCache.key(
+            'output', prompt_type,
+            self.template_key(prompt_config['template']),
+            language_key,
+            json.dumps(lang_config, sort_keys=True),
+            json.dumps(self._terminology_rules(language_key), sort_keys=True),
+            json.dumps(requirements),
+            self._reference_section(prompt_config, language_key, requirements),
+            self._options_key(),
+        )
+    
+    def _options_key(self) -> str:
+        """The rendering options, for input hashes."""
+        import json
+        return json.dumps([self.strict_sections, self.token_budget, self.source_date_epoch])
     
     def generate_all(
         self,
@@ -641,18 +3083,289 @@ class PromptGenerator:
         generated_files = []
         for prompt_type in self.PROMPT_TYPES.keys():
             try:
-                output_path = self.generate(
-                    prompt_type, 
-                    language, 
-                    requirements, 
-                    feature_name,
-                    output_dir,
-                )
-                generated_files.append(output_path)
-                print(f"✓ Generated: {output_path.name}")
-            except Exception as e:
-                print(f"✗ Failed to generate {prompt_type}: {e}")
-        return generated_files
+                output_path, status = self._generate(
+                    prompt_type, 
+                    language, 
+                    requirements, 
+                    feature_name,
+                    output_dir,
+                )
+                generated_files.append(output_path)
+                print(f"✓ {STATUS_LABELS[status]}: {output_path.name}")
+            except Exception as e:
+                print(f"✗ Failed to generate {prompt_type}: {e}")
+        if self.transaction is None:
+            self.save_manifests()
+        return generated_files
+    
+    def generate_matrix(
+        self,
+        prompt_types: List[str],
+        languages: List[str],
+        requirements: Optional[str] = None,
+        feature_name: Optional[str] = None,
+        output_dir: Optional[Path] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[JobResult]:
+        """
+        Generate every (prompt_type, language) combination in parallel.
+        
+        Each template is loaded and compiled once here and shared with a pool
+        of worker processes sized to the available cores. Failures are
+        collected per job instead of stopping the run.
+        """
+        jobs = [(prompt_type, language) for prompt_type in prompt_types for language in languages]
+        
+        templates = {}
+        for prompt_type in prompt_types:
+            template_name = self.get_prompt_config(prompt_type)['template']
+            try:
+                templates[template_name] = self.load_template(template_name)
+            except (OSError, ValueError):
+                # Reported by each affected job
+                pass
+        if max_workers is None:
+            max_workers = _available_cpus()
+        max_workers = min(max_workers, len(jobs))
+        if max_workers <= 1:
+            self.preload_templates(templates)
+            results = [self._run_job(job, requirements, feature_name, output_dir) for job in jobs]
+            if self.transaction is None:
+                self.save_manifests()
+            return results
+        
+        from concurrent.futures import ProcessPoolExecutor
+        
+        shared = {
+            name: (content_hash, compiled.to_data())
+            for name, (content_hash, compiled) in templates.items()
+        }
+        cache_args = (self.cache.cache_dir, self.cache.max_bytes) if self.cache else None
+        render_cache_args = None
+        if self.render_cache is not None:
+            store = self.render_cache.store
+            render_cache_args = (self.render_cache.max_entries, self.render_cache.max_chars,
+                                 (store.cache_dir, store.max_bytes) if store else None)
+        transaction_id = self.transaction.id if self.transaction is not None else None
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_matrix_worker,
+            initargs=(self.base_dir, cache_args, shared, self._options(), render_cache_args,
+                      transaction_id),
+        ) as executor:
+            futures = [
+                executor.submit(_run_matrix_job, job, requirements, feature_name, output_dir)
+                for job in jobs
+            ]
+            results = []
+            for future in futures:
+                result, manifest_updates = future.result()
+                results.append(result)
+                for directory, entries in manifest_updates.items():
+                    self._manifest(directory).merge(entries)
+        if self.transaction is None:
+            self.save_manifests()
+        else:
+            # The workers staged their files under this transaction's id
+            for result in results:
+                if result.path is not None:
+                    self.transaction.adopt(result.path.parent)
+        return results
+    
+    def _options(self) -> Dict:
+        """The constructor options a copy of this generator needs (see generate_matrix)."""
+        return {
+            'strict_sections': self.strict_sections,
+            'token_budget': self.token_budget,
+            'deterministic': self.deterministic,
+            'incremental': self.incremental,
+            'layered': self.layered,
+        }
+    
+    def _run_job(self, job: Tuple[str, str], requirements: Optional[str],
+                 feature_name: Optional[str], output_dir: Optional[Path]) -> JobResult:
+        """Run one generation job, capturing its outcome instead of raising."""
+        prompt_type, language = job
+        start = time.perf_counter()
+        try:
+            path, status = self._generate(prompt_type, language, requirements, feature_name,
+                                          output_dir)
+        except Exception as e:
+            return JobResult(prompt_type, language, None, str(e), time.perf_counter() - start)
+        return JobResult(prompt_type, language, path, None, time.perf_counter() - start, status)
+
+
+# Generator owned by each matrix worker process (see PromptGenerator.generate_matrix)
+_matrix_generator: Optional[PromptGenerator] = None
+
+
+def _init_matrix_worker(base_dir: Path, cache_args: Optional[Tuple],
+                        templates: Dict[str, Tuple[str, Dict]], options: Dict,
+                        render_cache_args: Optional[Tuple] = None,
+                        transaction_id: Optional[str] = None) -> None:
+    """Set up the worker's generator with the templates and options of the parent."""
+    global _matrix_generator
+    cache = TemplateCache(*cache_args) if cache_args else None
+    render_cache = None
+    if render_cache_args:
+        max_entries, max_chars, store_args = render_cache_args
+        store = TemplateCache(*store_args) if store_args else None
+        render_cache = RenderCache(max_entries, max_chars, store=store)
+    _matrix_generator = PromptGenerator(base_dir, cache=cache, render_cache=render_cache,
+                                        **options)
+    if transaction_id is not None:
+        _matrix_generator.transaction = OutputTransaction(transaction_id,
+                                                          _matrix_generator.lock_dir)
+    _matrix_generator.preload_templates({
+        name: (content_hash, CompiledTemplate.from_data(data))
+        for name, (content_hash, data) in templates.items()
+    })
+
+
+def _run_matrix_job(job: Tuple[str, str], requirements: Optional[str],
+                    feature_name: Optional[str],
+                    output_dir: Optional[Path]) -> Tuple[JobResult, Dict[Path, Dict[str, Dict]]]:
+    """Run one job, handing its manifest entries to the parent, which saves them."""
+    result = _matrix_generator._run_job(job, requirements, feature_name, output_dir)
+    return result, _matrix_generator._take_manifest_updates()
+
+
+def _shared_render_cache(cache: TemplateCache) -> RenderCache:
+    """
+    Render cache for --share-renders: nothing is kept in memory, but through
+    the template cache concurrent runs asking for the same prompt render it
+    once (see RenderCache.get_or_render).
+    """
+    return RenderCache(max_entries=0, store=cache)
+
+
+def _timestamp(epoch: Optional[int] = None) -> str:
+    """Current local time as shown in generated prompts, or the UTC time of epoch."""
+    from datetime import datetime, timezone
+    if epoch is not None:
+        return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class _deferred_interrupts:
+    """
+    Hold back Ctrl-C inside the block, raising KeyboardInterrupt after it
+    instead; only the main thread can handle signals, so elsewhere it does
+    nothing.
+    """
+
+    def __enter__(self):
+        import signal
+        import threading
+        self._interrupted = False
+        self._previous = None
+        if threading.current_thread() is threading.main_thread():
+            self._previous = signal.signal(signal.SIGINT, self._interrupt)
+        return self
+
+    def _interrupt(self, signum, frame) -> None:
+        self._interrupted = True
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        import signal
+        if self._previous is not None:
+            signal.signal(signal.SIGINT, self._previous)
+        if self._interrupted and exc_type is None:
+            raise KeyboardInterrupt
+
+
+def _write_atomic(path: Path, text: str, mode: Optional[int] = None) -> None:
+    """
+    Write a file through a temporary file in its directory, so readers never
+    see it partial. The file is private to the user unless mode is given.
+    """
+    import tempfile
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, str(path))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _fsync(path: Path) -> None:
+    """Flush a file, or on POSIX a directory, to disk."""
+    fd = os.open(path, os.O_RDONLY if os.name == 'posix' else os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_if_changed(path: Path, first_chunk: str, chunks,
+                      destination: Optional[Path] = None) -> bool:
+    """
+    Write the chunks to path unless the file already holds exactly that text;
+    returns whether it was written. Unchanged files keep their mtime, so
+    watchers and indexers do not see a change. With a destination, the text
+    is compared with path but written there, with the permissions of path.
+    """
+    try:
+        existing = open(path, 'r', encoding='utf-8')
+    except (OSError, ValueError):
+        existing = None
+    consumed = [first_chunk]
+    mode = None
+    if existing is not None:
+        with existing:
+            mode = os.fstat(existing.fileno()).st_mode & 0o7777
+            try:
+                same = existing.read(len(first_chunk)) == first_chunk
+                for chunk in chunks:
+                    consumed.append(chunk)
+                    if not same:
+                        break
+                    same = existing.read(len(chunk)) == chunk
+                if same and not existing.read(1):
+                    return False
+            except UnicodeDecodeError:
+                pass
+    with open(destination or path, 'w', encoding='utf-8') as f:
+        for chunk in consumed:
+            f.write(chunk)
+        for chunk in chunks:
+            f.write(chunk)
+    if destination is not None and mode is not None:
+        os.chmod(destination, mode)
+    return True
+
+
+def _split_chunks(text: str, size: int):
+    """Yield text in chunks of size characters."""
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+def _coalesce(pieces, size: int):
+    """Join small text pieces into chunks of at least size characters."""
+    buffered = []
+    length = 0
+    for piece in pieces:
+        buffered.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffered)
+            buffered = []
+            length = 0
+    if buffered:
+        yield ''.join(buffered)
+
+
+def _available_cpus() -> int:
+    """Number of CPUs this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
 
 
 def _infer_language_from_description(description: str) -> str:
@@ -741,9 +3454,9 @@ def _run_project_wizard() -> int:
             generator_temp = PromptGenerator()
             try:
                 normalized = generator_temp.normalize_language(lang_input)
-                if normalized in generator_temp.LANGUAGE_MAPPINGS:
+                if normalized in generator_temp.languages:
                     lang = normalized
-                    print(f"   ✓ Using: {generator_temp.LANGUAGE_MAPPINGS[normalized]['name']}")
+                    print(f"   ✓ Using: {generator_temp.languages[normalized]['name']}")
                 else:
                     print(f"   ⚠ Could not recognize '{lang_input}', using default: {inferred_lang}")
                     lang = inferred_lang
@@ -792,10 +3505,9 @@ def _run_project_wizard() -> int:
     # Initialize generator early to verify and normalize language
     generator = PromptGenerator()
     try:
-        lang_config = generator.get_language_config(lang)
-        actual_lang_name = lang_config['name']
         # Update lang to normalized version
-        lang = generator.normalize_language(lang)
+        lang, lang_config = generator.resolve_language(lang)
+        actual_lang_name = lang_config['name']
     except Exception as e:
         print(f"\n✗ Error with language '{lang}': {e}")
         return 1
@@ -840,11 +3552,947 @@ def _run_project_wizard() -> int:
     return 0
 
 
+def _matrix_axes(generator: PromptGenerator, args) -> Tuple[List[str], List[str]]:
+    """The prompt types and normalized languages selected by args.prompt_type, args.language and args.languages."""
+    languages = []
+    if args.languages and args.languages.strip().lower() == 'all':
+        languages = list(generator.languages)
+    elif args.languages:
+        for language in args.languages.split(','):
+            normalized = generator.normalize_language(language)
+            if normalized not in languages:
+                languages.append(normalized)
+    if args.language:
+        normalized = generator.normalize_language(args.language)
+        if normalized not in languages:
+            languages.insert(0, normalized)
+    if args.prompt_type == 'all':
+        prompt_types = list(generator.PROMPT_TYPES)
+    else:
+        prompt_types = [args.prompt_type]
+    return prompt_types, languages
+
+
+def _run_matrix(generator: PromptGenerator, args) -> int:
+    """Generate the prompt type × language matrix and print a per-job summary."""
+    prompt_types, languages = _matrix_axes(generator, args)
+    
+    print(f"Generating {len(prompt_types) * len(languages)} prompts "
+          f"({len(prompt_types)} types × {len(languages)} languages)...")
+    start = time.perf_counter()
+    results = generator.generate_matrix(
+        prompt_types,
+        languages,
+        args.requirements,
+        args.feature,
+        args.output,
+        args.jobs,
+    )
+    elapsed = time.perf_counter() - start
+    
+    for result in results:
+        if result.ok:
+            status = '' if result.status == 'written' else f", {STATUS_LABELS[result.status].lower()}"
+            print(f"✓ {result.prompt_type} × {result.language}: {result.path.name} "
+                  f"({result.duration:.2f}s{status})")
+        else:
+            print(f"✗ {result.prompt_type} × {result.language}: {result.error}")
+    failed = sum(1 for result in results if not result.ok)
+    print(f"\nSummary: {len(results) - failed} succeeded, {failed} failed in {elapsed:.2f}s")
+    return 1 if failed else 0
+
+
+class FileWatcher:
+    """Detects changed, added and removed files by polling their stat data."""
+
+    def __init__(self, paths):
+        """paths is a callable returning the files to watch on each poll."""
+        self._paths = paths
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for path in self._paths():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def changed(self) -> List[Path]:
+        """Return the files that changed since the previous call."""
+        snapshot = self._scan()
+        changed = [path for path in snapshot.keys() | self._snapshot.keys()
+                   if snapshot.get(path) != self._snapshot.get(path)]
+        self._snapshot = snapshot
+        return sorted(changed)
+
+
+class PromptWatcher:
+    """
+    Regenerates prompt files when the files they are built from change.
+
+    Every output, identified by (prompt_type, language, feature), depends on
+    its template, its language file, the terminology rules and, for prompt
+    types with reference data, the reference CSV files. A change regenerates
+    only the outputs that depend on the changed files. Changes are collected
+    until no file has changed for debounce seconds, so a burst of saves
+    regenerates each output once.
+    """
+
+    def __init__(self, generator: PromptGenerator, jobs: List[Tuple[str, str, Optional[str]]],
+                 requirements: Optional[str] = None, output_dir: Optional[Path] = None,
+                 debounce: float = 0.3):
+        self.generator = generator
+        self.jobs = jobs
+        self.requirements = requirements
+        self.output_dir = output_dir
+        self.debounce = debounce
+        self._dependencies: Dict[Path, set] = {}
+        self._language_keys: Dict[str, Optional[str]] = {}
+        self._map_dependencies()
+        self._watcher = FileWatcher(self._watched_files)
+
+    def _map_dependencies(self) -> None:
+        """Map every input file to the jobs that read it."""
+        generator = self.generator
+        dependencies: Dict[Path, set] = {}
+        self._language_keys = {}
+        for job in self.jobs:
+            prompt_type, language, _ = job
+            paths = [generator.terminology_file]
+            prompt_config = generator.PROMPT_TYPES.get(prompt_type)
+            if prompt_config is not None:
+                # Unloadable templates are watched too, so fixing one regenerates its outputs
+                paths.append(generator.common_dir / prompt_config['template'])
+                if (self.requirements and prompt_config.get('reference_data')
+                        and generator.reference_dir.is_dir()):
+                    paths.extend(generator.reference_dir.rglob('*.csv'))
+            key = generator.registry.resolve(language)
+            self._language_keys[language] = key
+            if key is not None:
+                paths.append(generator.language_dir / f'{key}.json')
+            for path in paths:
+                dependencies.setdefault(path, set()).add(job)
+        self._dependencies = dependencies
+
+    def _watched_files(self) -> List[Path]:
+        paths = set(self._dependencies)
+        if self.generator.language_dir.is_dir():
+            # New language files can change how a language name resolves
+            paths.update(self.generator.language_dir.glob('*.json'))
+        return sorted(paths)
+
+    def affected(self, changed: List[Path]) -> List[Tuple[str, str, Optional[str]]]:
+        """Reload what the changed files feed and return the jobs to rerun, in job order."""
+        generator = self.generator
+        jobs = set()
+        for path in changed:
+            jobs.update(self._dependencies.get(path, ()))
+        if generator.terminology_file in changed:
+            generator.reload_terminology()
+        if any(path.parent == generator.language_dir for path in changed):
+            generator.reload_languages()
+            jobs.update(job for job in self.jobs
+                        if generator.registry.resolve(job[1]) != self._language_keys[job[1]])
+        self._map_dependencies()
+        return [job for job in self.jobs if job in jobs]
+
+    def regenerate(self, jobs: List[Tuple[str, str, Optional[str]]]) -> List[JobResult]:
+        """Generate the given outputs, capturing each outcome."""
+        return [
+            self.generator._run_job((prompt_type, language), self.requirements, feature,
+                                    self.output_dir)
+            for prompt_type, language, feature in jobs
+        ]
+
+    def run(self, interval: float = 0.5, report=None) -> None:
+        """
+        Poll every interval seconds and regenerate affected outputs once the
+        changes settle; report(changed, results) is called after each round.
+        """
+        pending = set()
+        last_change = 0.0
+        while True:
+            changed = self._watcher.changed()
+            now = time.monotonic()
+            if changed:
+                pending.update(changed)
+                last_change = now
+            elif pending and now - last_change >= self.debounce:
+                changed_files = sorted(pending)
+                pending.clear()
+                results = self.regenerate(self.affected(changed_files))
+                if report is not None:
+                    report(changed_files, results)
+            time.sleep(interval)
+
+
+class LatencyStats:
+    """Thread-safe rolling window of request latencies."""
+
+    def __init__(self, window: int = 10000):
+        import collections
+        import threading
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> Dict:
+        """Get request count and latency percentiles in milliseconds."""
+        with self._lock:
+            samples = sorted(self._samples)
+        result = {'requests': self.count}
+        if samples:
+            for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+                index = min(len(samples) - 1, int(fraction * len(samples)))
+                result[f'{name}_ms'] = round(samples[index] * 1000, 3)
+            result['max_ms'] = round(samples[-1] * 1000, 3)
+        return result
+
+
+class PromptServer:
+    """
+    Long-running renderer that keeps templates and language configs resident.
+
+    Templates are loaded once at startup and reloaded individually when
+    their files change, as are the terminology rules and language files;
+    requests never touch the template directory.
+
+    Written prompts may only go to the generator's specify directory or to
+    one of output_dirs.
+    """
+
+    def __init__(self, generator: PromptGenerator, poll_interval: float = 1.0,
+                 output_dirs: Optional[List[Path]] = None):
+        self.generator = generator
+        self.poll_interval = poll_interval
+        self.output_dirs = [Path(directory).resolve()
+                            for directory in [generator.specify_dir] + list(output_dirs or [])]
+        self.stats = LatencyStats()
+        self.reloads = 0
+        self._template_names: List[str] = []
+        for config in generator.PROMPT_TYPES.values():
+            if config['template'] not in self._template_names:
+                self._template_names.append(config['template'])
+        for name in self._template_names:
+            try:
+                generator.reload_template(name)
+            except (OSError, ValueError) as e:
+                print(f"⚠ Could not load {name}: {e}", file=sys.stderr)
+        self._watched: List[Path] = []
+        self._list_watched_files()
+        self._watcher = FileWatcher(self._watched_files)
+
+    def _list_watched_files(self) -> None:
+        """List the files to poll; done again only when language files come or go."""
+        generator = self.generator
+        paths = [generator.common_dir / name for name in self._template_names]
+        paths.append(generator.terminology_file)
+        # The directory's mtime changes when a language file is added or removed
+        paths.append(generator.language_dir)
+        if generator.language_dir.is_dir():
+            paths.extend(sorted(generator.language_dir.glob('*.json')))
+        self._watched = paths
+
+    def _watched_files(self) -> List[Path]:
+        return self._watched
+
+    def reload_changed(self) -> List[str]:
+        """Reload the templates, rules and languages whose files changed."""
+        generator = self.generator
+        reloaded = []
+        languages_changed = False
+        for path in self._watcher.changed():
+            if path == generator.language_dir:
+                languages_changed = True
+                continue
+            try:
+                if path == generator.terminology_file:
+                    generator.reload_terminology()
+                elif path.parent == generator.language_dir:
+                    languages_changed = True
+                else:
+                    generator.reload_template(path.relative_to(generator.common_dir).as_posix())
+            except (OSError, ValueError) as e:
+                print(f"⚠ Could not reload {path.name}: {e}", file=sys.stderr)
+                continue
+            reloaded.append(path.name)
+        if languages_changed:
+            # Read again on the next request
+            generator.reload_languages()
+            self._list_watched_files()
+        self.reloads += len(reloaded)
+        return reloaded
+
+    def _check_output(self, output) -> None:
+        """ValueError unless a requested output path is in an allowed directory."""
+        if output is None:
+            return
+        target = Path(output).resolve()
+        directory = target if target.is_dir() else target.parent
+        for allowed in self.output_dirs:
+            if directory == allowed or allowed in directory.parents:
+                return
+        raise ValueError(f"Output must be inside {', '.join(map(str, self.output_dirs))}")
+
+    def start_reloader(self) -> None:
+        """Poll for template changes in a background thread."""
+        import threading
+
+        def poll() -> None:
+            while True:
+                time.sleep(self.poll_interval)
+                for name in self.reload_changed():
+                    print(f"↻ Reloaded {name}", file=sys.stderr)
+
+        threading.Thread(target=poll, daemon=True).start()
+
+    def handle_render(self, payload: Dict) -> Tuple[int, Dict]:
+        """Render (and optionally write) one prompt; returns (HTTP status, body)."""
+        start = time.perf_counter()
+        try:
+            if payload.get('write'):
+                self._check_output(payload.get('output'))
+                path = self.generator.generate(
+                    payload['prompt_type'],
+                    payload['language'],
+                    payload.get('requirements'),
+                    payload.get('feature'),
+                    payload.get('output'),
+                )
+                result = {'ok': True, 'path': str(path), 'bytes': path.stat().st_size}
+            else:
+                content = self.generator.render(
+                    payload['prompt_type'],
+                    payload['language'],
+                    payload.get('requirements'),
+                )
+                result = {'ok': True, 'content': content, 'bytes': len(content.encode('utf-8'))}
+            status = 200
+        except KeyError as e:
+            result, status = {'ok': False, 'error': f"Missing field: {e}"}, 400
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            result, status = {'ok': False, 'error': str(e)}, 400
+        except Exception as e:
+            result, status = {'ok': False, 'error': f"Internal error: {e}"}, 500
+        duration = time.perf_counter() - start
+        self.stats.record(duration)
+        result['duration'] = round(duration, 6)
+        return status, result
+
+    def handle_stats(self) -> Dict:
+        stats = self.stats.summary()
+        stats['reloads'] = self.reloads
+        if self.generator.render_cache is not None:
+            stats['render_cache'] = self.generator.render_cache.stats()
+        return stats
+
+
+def _make_request_handler(server: PromptServer, allowed_hosts: Optional[set] = None):
+    """
+    Build the HTTP request handler class bound to a PromptServer. With
+    allowed_hosts, requests whose Host header names another host are
+    refused, so that web pages cannot reach the server by DNS rebinding.
+    """
+    import json
+    from http.server import BaseHTTPRequestHandler
+
+    class PromptRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def address_string(self) -> str:
+            # Unix socket peers have no (host, port) address
+            return self.client_address[0] if self.client_address else 'unix'
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+        def _send_json(self, status: int, body: Dict) -> None:
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _host_allowed(self) -> bool:
+            if allowed_hosts is None:
+                return True
+            host = (self.headers.get('Host') or '').strip().lower()
+            if host.startswith('['):
+                # [IPv6]:port
+                host = host[1:].partition(']')[0]
+            elif host.count(':') == 1:
+                host = host.partition(':')[0]
+            return host in allowed_hosts
+
+        def do_GET(self) -> None:
+            if not self._host_allowed():
+                self._send_json(403, {'ok': False, 'error': 'Host not allowed'})
+                return
+            if self.path == '/stats':
+                self._send_json(200, server.handle_stats())
+            elif self.path == '/health':
+                self._send_json(200, {'ok': True})
+            else:
+                self._send_json(404, {'ok': False, 'error': f"Unknown path: {self.path}"})
+
+        def do_POST(self) -> None:
+            if not self._host_allowed():
+                self._send_json(403, {'ok': False, 'error': 'Host not allowed'})
+                return
+            if self.path != '/render':
+                self._send_json(404, {'ok': False, 'error': f"Unknown path: {self.path}"})
+                return
+            # Browsers cannot send this content type cross-origin without a preflight
+            if self.headers.get_content_type() != 'application/json':
+                self._send_json(415, {'ok': False, 'error': 'Content-Type must be application/json'})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(payload, dict):
+                    raise ValueError('request body must be a JSON object')
+            except ValueError as e:
+                self._send_json(400, {'ok': False, 'error': f"Invalid request: {e}"})
+                return
+            self._send_json(*server.handle_render(payload))
+
+    return PromptRequestHandler
+
+
+def _run_server(argv: List[str]) -> int:
+    """Server mode: answer render requests over localhost HTTP or a Unix socket."""
+    import argparse
+    import json
+    import socketserver
+    
+    parser = argparse.ArgumentParser(
+        prog='generate_prompt.py serve',
+        description='Keep templates resident and render prompts on request',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Endpoints:
+  POST /render  {"prompt_type": "...", "language": "...", "requirements": "...",
+                 "feature": "...", "write": false}
+  GET  /stats   request count, latency percentiles, template reloads and
+                render cache counters
+  GET  /health
+        """
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Host to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--socket', type=Path, help='Listen on a Unix socket instead of HTTP over TCP')
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help='Seconds between template change checks (default: 1)')
+    parser.add_argument('--base-dir', type=Path, help='Base directory (default: script directory)')
+    parser.add_argument('--cache-dir', type=Path,
+                        help='Cache directory for compiled templates (default: ~/.cache/cursorflow)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the template cache')
+    parser.add_argument('--render-cache', type=int, default=0, metavar='N',
+                        help='Keep up to N rendered prompts in memory, and in the '
+                             'template cache unless --no-cache (default: 0, off)')
+    parser.add_argument('--output-dir', type=Path, action='append', default=[], metavar='DIR',
+                        help='Also allow "write" requests to put prompts in DIR (repeatable; '
+                             'default: only .cursor/commands/specify/)')
+    parser.add_argument('--allow-host', action='append', default=[], metavar='NAME',
+                        help='Also accept requests whose Host header is NAME (repeatable; '
+                             'default: localhost and the --host address)')
+    args = parser.parse_args(argv)
+    
+    cache = None
+    if not args.no_cache:
+        cache = TemplateCache(args.cache_dir or TemplateCache.default_dir())
+    render_cache = None
+    if args.render_cache > 0:
+        render_cache = RenderCache(args.render_cache, store=cache)
+    server = PromptServer(PromptGenerator(args.base_dir, cache=cache, render_cache=render_cache),
+                          args.poll_interval, args.output_dir)
+    allowed_hosts = None
+    if not args.socket:
+        allowed_hosts = {'localhost', '127.0.0.1', '::1', args.host.lower()}
+        allowed_hosts.update(host.lower() for host in args.allow_host)
+    handler = _make_request_handler(server, allowed_hosts)
+    
+    if args.socket:
+        class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+        
+        if args.socket.exists():
+            args.socket.unlink()
+        httpd = UnixHTTPServer(str(args.socket), handler)
+        location = f"unix:{args.socket}"
+    else:
+        class TCPHTTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+        
+        httpd = TCPHTTPServer((args.host, args.port), handler)
+        location = f"http://{args.host}:{httpd.server_address[1]}"
+    
+    server.start_reloader()
+    print(f"Serving prompts on {location} (Ctrl-C to stop)", file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        if args.socket and args.socket.exists():
+            args.socket.unlink()
+        print(f"\nStats: {json.dumps(server.handle_stats())}", file=sys.stderr)
+    return 0
+
+
+class LeaseQueue:
+    """
+    Work queue kept as files in a directory that several machines share, so
+    that they can split one job set between them.
+
+    Every worker reads the same jobs and claims each one as it starts
+    running it by creating a lease file exclusively; a job is finished once
+    its done file exists. Jobs are identified by their inputs (see job_id),
+    so a queue reused after the templates changed runs them again.
+
+    While a job runs, its lease is renewed every third of lease_seconds. A
+    lease older than lease_seconds is taken to belong to a worker that died,
+    and the next claim of the job gets a new lease (lease files are numbered
+    by attempt, so only one worker can win each).
+    """
+
+    def __init__(self, directory: Path, lease_seconds: float = 60.0):
+        import socket
+        import threading
+        self.directory = Path(directory)
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.leases_dir = self.directory / 'leases'
+        self.done_dir = self.directory / 'done'
+        self.leases_dir.mkdir(parents=True, exist_ok=True)
+        self.done_dir.mkdir(parents=True, exist_ok=True)
+        # Leases of claimed, unfinished jobs, renewed by a background thread
+        self._held: Dict[str, Path] = {}
+        self._held_lock = threading.Lock()
+        self._renewer = None
+
+    @staticmethod
+    def job_id(record: Dict, inputs: str = '') -> str:
+        """
+        Identifier of a job record, the same on every machine. inputs is the
+        hash of what the job's output is built from (see
+        PromptGenerator.input_hash).
+        """
+        import hashlib
+        import json
+        return hashlib.sha256(
+            json.dumps([record, inputs], sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+    def is_done(self, job_id: str) -> bool:
+        """Whether some worker finished the job."""
+        return (self.done_dir / f'{job_id}.json').exists()
+
+    def claim(self, job_id: str) -> bool:
+        """Take the lease on an unfinished job; False if it is done or leased elsewhere."""
+        attempt = 0
+        while not self.is_done(job_id):
+            lease = self.leases_dir / f'{job_id}.{attempt}'
+            try:
+                fd = os.open(lease, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                try:
+                    age = time.time() - lease.stat().st_mtime
+                except OSError:
+                    age = 0.0
+                if age < self.lease_seconds:
+                    return False
+                # Expired: whoever creates the next attempt's lease takes the job over
+                attempt += 1
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.owner + '\n')
+            with self._held_lock:
+                self._held[job_id] = lease
+                if self._renewer is None:
+                    self._start_renewer()
+            return True
+        return False
+
+    def _start_renewer(self) -> None:
+        """Renew the held leases in a background thread until none is left."""
+        import threading
+
+        def renew() -> None:
+            while True:
+                time.sleep(self.lease_seconds / 3)
+                with self._held_lock:
+                    if not self._held:
+                        self._renewer = None
+                        return
+                    leases = list(self._held.values())
+                for lease in leases:
+                    try:
+                        os.utime(lease)
+                    except OSError:
+                        pass
+
+        self._renewer = threading.Thread(target=renew, daemon=True)
+        self._renewer.start()
+
+    def finish(self, job_id: str, result: Dict) -> None:
+        """Mark a claimed job finished, with its result."""
+        import json
+        _write_atomic(self.done_dir / f'{job_id}.json',
+                      json.dumps(dict(result, worker=self.owner), sort_keys=True) + '\n')
+        with self._held_lock:
+            self._held.pop(job_id, None)
+
+
+def _parse_shard(text: str) -> Tuple[int, int]:
+    """Parse a --shard value i/N into (i, N), for argparse."""
+    import argparse
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}") from None
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {index} is not between 1 and {count}")
+    return index, count
+
+
+def _in_shard(job_id: str, shard: Tuple[int, int]) -> bool:
+    """Whether a job (see LeaseQueue.job_id of its record alone) belongs to shard i of N."""
+    index, count = shard
+    return int(job_id[:16], 16) % count == index - 1
+
+
+def _run_batch(argv: List[str]) -> int:
+    """Batch mode: render JSONL job records with one warm generator."""
+    import argparse
+    import json
+    import queue
+    import threading
+    
+    parser = argparse.ArgumentParser(
+        prog='generate_prompt.py batch',
+        description='Generate prompts for job records read from a JSONL file or stdin',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Each input line is a JSON object:
+  {"prompt_type": "research_plan", "language": "flutter",
+   "requirements": "...", "feature": "auth", "output": "optional/path"}
+
+One JSON result line is printed per job, in completion order:
+  {"line": 1, "ok": true, "path": "...", "bytes": 51234, "duration": 0.004, ...}
+
+To split one job file between several machines, give each the same file
+and either --shard i/N, or a --work-queue directory they all share, or both.
+        """
+    )
+    parser.add_argument('jobs_file', nargs='?', default='-',
+                        help='JSONL job file (default: - for stdin)')
+    parser.add_argument('--workers', '-w', type=int, default=min(4, _available_cpus()),
+                        help='Number of worker threads (default: up to 4)')
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help='Maximum number of jobs read ahead of the workers (default: 64)')
+    parser.add_argument('--base-dir', type=Path,
+                        help='Base directory (default: script directory)')
+    parser.add_argument('--cache-dir', type=Path,
+                        help='Cache directory for compiled templates (default: ~/.cache/cursorflow)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the template cache')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip outputs whose inputs are unchanged since the last run '
+                             '(recorded in .prompt-manifest.json next to them)')
+    parser.add_argument('--share-renders', action='store_true',
+                        help='Store rendered prompts in the template cache, so that '
+                             'concurrent runs asking for the same prompt render it once')
+    parser.add_argument('--shard', type=_parse_shard, metavar='i/N',
+                        help='Only run shard i of N (1-based) of the jobs; every job belongs '
+                             'to exactly one shard, the same on every machine')
+    parser.add_argument('--work-queue', type=Path, metavar='DIR',
+                        help='Claim each job through lease files in DIR, shared by every '
+                             'machine; once done, take over unfinished jobs of other shards '
+                             'and of expired leases')
+    parser.add_argument('--lease-seconds', type=float, default=60.0,
+                        help='Time after which an unfinished job leased by another worker '
+                             'may be taken over (default: 60)')
+    args = parser.parse_args(argv)
+    if args.lease_seconds <= 0:
+        parser.error('--lease-seconds must be positive')
+    if args.share_renders and args.no_cache:
+        parser.error('--share-renders needs the template cache')
+    
+    cache = None
+    if not args.no_cache:
+        cache = TemplateCache(args.cache_dir or TemplateCache.default_dir())
+    render_cache = _shared_render_cache(cache) if args.share_renders else None
+    generator = PromptGenerator(args.base_dir, cache=cache, incremental=args.incremental,
+                                render_cache=render_cache)
+    work_queue = LeaseQueue(args.work_queue, args.lease_seconds) if args.work_queue else None
+    # Jobs of other shards, which this worker takes over once its own are done
+    other_shards: List[Tuple[int, Dict, str]] = []
+    # Jobs leased elsewhere, which this worker may still have to run
+    waiting: List[Tuple[int, Dict, str]] = []
+    waiting_lock = threading.Lock()
+    
+    jobs = queue.Queue(maxsize=max(1, args.queue_size))
+    output_lock = threading.Lock()
+    failures = []
+    
+    def emit(result: Dict) -> None:
+        with output_lock:
+            if not result['ok']:
+                failures.append(result['line'])
+            sys.stdout.write(json.dumps(result) + '\n')
+            sys.stdout.flush()
+    
+    def worker() -> None:
+        while True:
+            item = jobs.get()
+            if item is None:
+                return
+            try:
+                run(*item)
+            finally:
+                jobs.task_done()
+    
+    def run(line_number: int, record: Dict, job_id: str) -> None:
+        # Claimed only now, so a lease never expires while its job waits in the queue
+        if work_queue is not None and not work_queue.claim(job_id):
+            if not work_queue.is_done(job_id):
+                with waiting_lock:
+                    waiting.append((line_number, record, job_id))
+            return
+        result = {'line': line_number}
+        start = time.perf_counter()
+        try:
+            result['prompt_type'] = record['prompt_type']
+            result['language'] = record['language']
+            path, status = generator._generate(
+                record['prompt_type'],
+                record['language'],
+                record.get('requirements'),
+                record.get('feature'),
+                record.get('output'),
+            )
+            result.update(ok=True, path=str(path), bytes=path.stat().st_size, status=status)
+        except KeyError as e:
+            result.update(ok=False, error=f"Missing field: {e}")
+        except Exception as e:
+            result.update(ok=False, error=str(e))
+        result['duration'] = round(time.perf_counter() - start, 6)
+        if work_queue is not None:
+            # Failed jobs are finished too, so that no worker retries them
+            work_queue.finish(job_id, result)
+        emit(result)
+    
+    def queue_id(record: Dict) -> str:
+        """The job's id in the work queue, which changes with its inputs."""
+        if work_queue is None:
+            return ''
+        try:
+            inputs = generator.input_hash(record['prompt_type'], record['language'],
+                                          record.get('requirements'))
+        except Exception:
+            # The job reports the error when it runs
+            inputs = ''
+        return LeaseQueue.job_id(record, inputs)
+    
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, args.workers))]
+    for thread in threads:
+        thread.start()
+    
+    stream = sys.stdin if args.jobs_file == '-' else open(args.jobs_file, encoding='utf-8')
+    try:
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('job record must be a JSON object')
+            except ValueError as e:
+                # Assigned like a job, so that exactly one worker reports it
+                line_id = LeaseQueue.job_id({'line': line_number, 'text': line})
+                if args.shard and not _in_shard(line_id, args.shard):
+                    continue
+                if work_queue is None or work_queue.claim(line_id):
+                    result = {'line': line_number, 'ok': False,
+                              'error': f"Invalid job record: {e}"}
+                    if work_queue is not None:
+                        work_queue.finish(line_id, result)
+                    emit(result)
+                continue
+            if args.shard and not _in_shard(LeaseQueue.job_id(record), args.shard):
+                if work_queue is not None:
+                    other_shards.append((line_number, record, queue_id(record)))
+                continue
+            # Blocks while the queue is full, which bounds memory use
+            jobs.put((line_number, record, queue_id(record)))
+        
+        # Idle: take over what other workers have not finished, until every job is
+        for item in other_shards:
+            jobs.put(item)
+        jobs.join()
+        poll_interval = min(1.0, args.lease_seconds / 4)
+        while waiting:
+            time.sleep(poll_interval)
+            with waiting_lock:
+                pending, waiting[:] = list(waiting), []
+            for item in pending:
+                jobs.put(item)
+            jobs.join()
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        for _ in threads:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+        generator.save_manifests()
+    
+    return 1 if failures else 0
+
+
+def _run_resolve(argv: List[str]) -> int:
+    """Resolve mode: materialize the full prompt of a layered feature overlay."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog='generate_prompt.py resolve',
+        description='Print the full prompt of a feature overlay written with --layered',
+    )
+    parser.add_argument('overlay', type=Path,
+                        help='Overlay file, e.g. .cursor/commands/specify/research_plan_flutter_login.prompt.md')
+    parser.add_argument('--output', '-o', type=Path,
+                        help='Write the full prompt to this file instead of standard output')
+    args = parser.parse_args(argv)
+    
+    try:
+        content = PromptOverlay.resolve(args.overlay)
+        if args.output:
+            _write_atomic(args.output, content, mode=0o644)
+        else:
+            sys.stdout.write(content)
+    except (OSError, ValueError) as e:
+        print(f"✗ Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _run_watch(argv: List[str]) -> int:
+    """Watch mode: regenerate prompts whose templates or settings change."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog='generate_prompt.py watch',
+        description='Generate prompts, then regenerate the affected ones whenever '
+                    'a template, language file, terminology rule or '
+                    'reference file changes',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python generate_prompt.py watch all flutter
+  python generate_prompt.py watch research_plan --languages react,vue -f auth -f profile
+        """
+    )
+    parser.add_argument('prompt_type', choices=list(PromptGenerator.PROMPT_TYPES.keys()) + ['all'],
+                        help='Type of prompt to generate')
+    parser.add_argument('language', nargs='?', help='Target language/framework')
+    parser.add_argument('--languages', '-l',
+                        help='Comma-separated languages to generate for, or "all"')
+    parser.add_argument('--requirements', '-r', help='User requirements/description for the feature')
+    parser.add_argument('--feature', '-f', action='append',
+                        help='Feature name used in the filename; repeat for several outputs')
+    parser.add_argument('--output', '-o', type=Path,
+                        help='Output directory (default: .cursor/commands/specify/)')
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help='Seconds between change checks (default: 0.5)')
+    parser.add_argument('--debounce', type=float, default=0.3,
+                        help='Seconds without changes before regenerating (default: 0.3)')
+    parser.add_argument('--base-dir', type=Path, help='Base directory (default: script directory)')
+    parser.add_argument('--lenient-sections', action='store_true',
+                        help='Keep unbalanced BEGIN/END markers as text instead of failing')
+    parser.add_argument('--token-budget', type=int, metavar='TOKENS',
+                        help='Cut low-priority sections until each prompt fits this many tokens')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Stamp prompts with SOURCE_DATE_EPOCH (default 0) instead of the current time')
+    parser.add_argument('--layered', action='store_true',
+                        help='Write one base file per prompt type and language plus a small '
+                             'overlay per feature')
+    parser.add_argument('--cache-dir', type=Path,
+                        help='Cache directory for compiled templates (default: ~/.cache/cursorflow)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the template cache')
+    args = parser.parse_args(argv)
+    if not args.language and not args.languages:
+        parser.error('a language or --languages is required')
+    if args.layered and args.token_budget is not None:
+        parser.error('--layered cannot be combined with --token-budget')
+    
+    cache = None
+    if not args.no_cache:
+        cache = TemplateCache(args.cache_dir or TemplateCache.default_dir())
+    generator = PromptGenerator(
+        args.base_dir,
+        strict_sections=not args.lenient_sections,
+        cache=cache,
+        token_budget=args.token_budget,
+        deterministic=args.deterministic,
+        layered=args.layered,
+    )
+    prompt_types, languages = _matrix_axes(generator, args)
+    jobs = [(prompt_type, language, feature)
+            for prompt_type in prompt_types
+            for language in languages
+            for feature in (args.feature or [None])]
+    watcher = PromptWatcher(generator, jobs, args.requirements, args.output, args.debounce)
+    
+    def report(changed: List[Path], results: List[JobResult]) -> None:
+        if changed:
+            names = ', '.join(path.name for path in changed)
+            print(f"↻ Changed: {names} → {len(results)} affected", flush=True)
+        for result in results:
+            if result.ok:
+                print(f"✓ {STATUS_LABELS[result.status]}: {result.path.name} "
+                      f"({result.duration:.2f}s)", flush=True)
+            else:
+                print(f"✗ {result.prompt_type} × {result.language}: {result.error}", flush=True)
+    
+    report([], watcher.regenerate(jobs))
+    print(f"Watching the inputs of {len(jobs)} outputs (Ctrl-C to stop)", flush=True)
+    try:
+        watcher.run(args.interval, report)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
 def main():
     """Main CLI entry point."""
     # If no arguments are provided, run interactive project wizard.
     if len(sys.argv) == 1:
         return _run_project_wizard()
+    
+    if sys.argv[1] == 'batch':
+        return _run_batch(sys.argv[2:])
+    if sys.argv[1] == 'serve':
+        return _run_server(sys.argv[2:])
+    if sys.argv[1] == 'watch':
+        return _run_watch(sys.argv[2:])
+    if sys.argv[1] == 'resolve':
+        return _run_resolve(sys.argv[2:])
+    
+    import argparse
 
     parser = argparse.ArgumentParser(
         description='Generate customized prompt files from common templates',
@@ -859,21 +4507,35 @@ Examples:
   
   # Generate implementation plan for TypeScript
   python generate_prompt.py implementation_plan typescript --requirements "Dashboard component"
+  
+  # Generate every prompt type for every language in parallel
+  python generate_prompt.py all --languages all
         """
     )
     
     parser.add_argument(
         'prompt_type',
-        choices=['research_plan', 'implementation_plan', 'ui_ux_design', 
-                'ui_ux_bridge', 'all'],
+        choices=list(PromptGenerator.PROMPT_TYPES) + ['all'],
         help='Type of prompt to generate'
     )
     
     parser.add_argument(
         'language',
+        nargs='?',
         help='Target language/framework (e.g., flutter, kotlin, swift, typescript)'
     )
     
+    parser.add_argument(
+        '--languages', '-l',
+        help='Generate for several languages in parallel: "all" or a comma-separated list'
+    )
+    
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        help='Number of worker processes for --languages (default: available cores)'
+    )
+    
     parser.add_argument(
         '--requirements', '-r',
         help='User requirements/description for the feature'
@@ -896,13 +4558,148 @@ Examples:
         help='Base directory (default: script directory)'
     )
     
+    parser.add_argument(
+        '--lenient-sections',
+        action='store_true',
+        help='Keep unbalanced BEGIN/END markers as text instead of failing'
+    )
+    
+    parser.add_argument(
+        '--token-budget',
+        type=int,
+        metavar='TOKENS',
+        help='Cut low-priority sections until each prompt fits this many tokens (estimated)'
+    )
+    
+    parser.add_argument(
+        '--deterministic',
+        action='store_true',
+        help='Stamp prompts with SOURCE_DATE_EPOCH (default 0) instead of the current time'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Skip outputs whose inputs are unchanged since the last run '
+             '(recorded in .prompt-manifest.json next to them)'
+    )
+    
+    parser.add_argument(
+        '--layered',
+        action='store_true',
+        help='With --feature, write one base file per prompt type and language plus a '
+             'small overlay per feature (see "generate_prompt.py resolve")'
+    )
+    
+    parser.add_argument(
+        '--share-renders',
+        action='store_true',
+        help='Store rendered prompts in the template cache, so that concurrent runs '
+             'asking for the same prompt render it once'
+    )
+    
+    parser.add_argument(
+        '--cache-dir',
+        type=Path,
+        help='Cache directory for compiled templates (default: ~/.cache/cursorflow)'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not read or write the template cache'
+    )
+    
+    parser.add_argument(
+        '--stdout',
+        action='store_true',
+        help='Stream the prompt to standard output instead of writing a file'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report time, bytes in/out and replacements per pipeline stage'
+    )
+    
+    parser.add_argument(
+        '--profile-json',
+        type=Path,
+        help='Also write the per-stage report as JSON to this file (implies --profile)'
+    )
+    
+    parser.add_argument(
+        '--cprofile',
+        type=Path,
+        help='Dump cProfile statistics for the whole run to this file'
+    )
+    
+    parser.add_argument(
+        '--tracemalloc',
+        type=Path,
+        help='Dump a tracemalloc snapshot taken at the end of the run to this file'
+    )
+    
     args = parser.parse_args()
+    if not args.language and not args.languages:
+        parser.error('a language or --languages is required')
+    if args.stdout and (args.languages or args.prompt_type == 'all'):
+        parser.error('--stdout renders a single prompt type for a single language')
+    if args.token_budget is not None and args.token_budget <= 0:
+        parser.error('--token-budget must be a positive number of tokens')
+    if args.layered and args.token_budget is not None:
+        parser.error('--layered cannot be combined with --token-budget')
+    if args.share_renders and (args.no_cache or args.profile or args.profile_json):
+        parser.error('--share-renders needs the template cache and cannot be profiled')
     
     # Initialize generator
-    generator = PromptGenerator(args.base_dir)
+    cache = None
+    if not args.no_cache:
+        cache = TemplateCache(args.cache_dir or TemplateCache.default_dir())
+    profiler = StageProfiler() if args.profile or args.profile_json else None
+    render_cache = None
+    if args.share_renders:
+        render_cache = _shared_render_cache(cache)
+    generator = PromptGenerator(
+        args.base_dir,
+        strict_sections=not args.lenient_sections,
+        cache=cache,
+        profiler=profiler,
+        token_budget=args.token_budget,
+        deterministic=args.deterministic,
+        incremental=args.incremental,
+        render_cache=render_cache,
+        layered=args.layered,
+    )
+    if profiler is not None and args.languages:
+        # Stages can only be recorded in this process
+        args.jobs = 1
+    
+    cprofile = None
+    if args.cprofile:
+        import cProfile
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    tracer = None
+    if args.tracemalloc:
+        import tracemalloc
+        tracer = tracemalloc
+        tracer.start()
     
+    # Outputs are staged and published together once every prompt succeeded
+    transaction = generator.transaction = OutputTransaction(lock_dir=generator.lock_dir)
+    status = 0
     try:
-        if args.prompt_type == 'all':
+        if args.languages:
+            status = _run_matrix(generator, args)
+        elif args.stdout:
+            generator.write_stream(
+                sys.stdout,
+                args.prompt_type,
+                args.language,
+                args.requirements
+            )
+        elif args.prompt_type == 'all':
             # Generate all prompt types
             print(f"Generating all prompts for {args.language}...")
             generated_files = generator.generate_all(
@@ -910,24 +4707,58 @@ Examples:
                 args.requirements,
                 args.feature
             )
-            print(f"\n✓ Generated {len(generated_files)} files in {generator.specify_dir}")
+            if len(generated_files) < len(generator.PROMPT_TYPES):
+                status = 1
+            else:
+                print(f"\n✓ Generated {len(generated_files)} files in {generator.specify_dir}")
         else:
             # Generate single prompt type
-            output_path = generator.generate(
+            output_path, outcome = generator._generate(
                 args.prompt_type,
                 args.language,
                 args.requirements,
                 args.feature,
                 args.output
             )
-            print(f"✓ Generated: {output_path}")
+            print(f"✓ {STATUS_LABELS[outcome]}: {output_path}")
             print(f"  Location: {output_path.absolute()}")
+        
+        if status:
+            print("✗ Not all prompts could be generated; no files were changed", file=sys.stderr)
+        else:
+            transaction.commit()
     
     except Exception as e:
         print(f"✗ Error: {e}", file=sys.stderr)
         return 1
+    except KeyboardInterrupt:
+        print("\n✗ Interrupted; no files were changed", file=sys.stderr)
+        return 130
+    finally:
+        # Nothing is left to discard once committed
+        transaction.rollback()
+        _finish_profiling(args, profiler, cprofile, tracer)
     
-    return 0
+    return status
+
+
+def _finish_profiling(args, profiler: Optional[StageProfiler], cprofile, tracer) -> None:
+    """Write the reports and dumps requested with the profiling options."""
+    import json
+    if cprofile is not None:
+        cprofile.disable()
+        cprofile.dump_stats(str(args.cprofile))
+        print(f"cProfile statistics written to {args.cprofile}", file=sys.stderr)
+    if tracer is not None:
+        tracer.take_snapshot().dump(str(args.tracemalloc))
+        tracer.stop()
+        print(f"tracemalloc snapshot written to {args.tracemalloc}", file=sys.stderr)
+    if profiler is not None:
+        print(profiler.report(), file=sys.stderr)
+        if args.profile_json:
+            args.profile_json.write_text(
+                json.dumps(profiler.to_data(), indent=2) + '\n', encoding='utf-8'
+            )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,22 @@
+"""Shared fixtures for the prompt generator tests."""
+
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+
+@pytest.fixture
+def base_dir(tmp_path: Path) -> Path:
+    """A copy of the repository's .cursor directory to generate from."""
+    shutil.copytree(REPO_DIR / '.cursor' / 'commands' / 'common',
+                    tmp_path / '.cursor' / 'commands' / 'common')
+    for name in ('prompt_generator', 'uiux_reference'):
+        source = REPO_DIR / '.cursor' / name
+        if source.is_dir():
+            shutil.copytree(source, tmp_path / '.cursor' / name)
+    return tmp_path
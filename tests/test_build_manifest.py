@@ -0,0 +1,40 @@
+"""BuildManifest: incremental runs record their outputs and save once per directory."""
+
+from generate_prompt import BuildManifest, PromptGenerator
+
+
+def test_matrix_saves_each_manifest_once(base_dir, tmp_path, monkeypatch):
+    saves = []
+    save = BuildManifest.save
+
+    def counted_save(manifest):
+        saves.append(manifest.path)
+        save(manifest)
+
+    monkeypatch.setattr(BuildManifest, 'save', counted_save)
+    generator = PromptGenerator(base_dir, incremental=True)
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    results = generator.generate_matrix(['research_plan', 'test_rules'], ['go', 'react'],
+                                        output_dir=output_dir, max_workers=1)
+    assert all(result.ok for result in results)
+    assert saves == [output_dir / BuildManifest.FILENAME]
+
+    manifest = BuildManifest(output_dir)
+    assert all(manifest.is_current(result.path, generator.input_hash(result.prompt_type,
+                                                                    result.language))
+               for result in results)
+
+
+def test_worker_entries_are_merged_into_the_parent(base_dir, tmp_path):
+    generator = PromptGenerator(base_dir, incremental=True)
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    results = generator.generate_matrix(['research_plan'], ['go', 'react'],
+                                        output_dir=output_dir, max_workers=2)
+    assert all(result.ok for result in results)
+
+    rerun = PromptGenerator(base_dir, incremental=True).generate_matrix(
+        ['research_plan'], ['go', 'react'], output_dir=output_dir, max_workers=2
+    )
+    assert [result.status for result in rerun] == ['skipped', 'skipped']
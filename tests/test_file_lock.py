@@ -0,0 +1,71 @@
+"""FileLock: exclusive locks between processes, kept away from the outputs."""
+
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR
+from generate_prompt import FileLock, OutputTransaction
+
+# Without flock() every lock is granted (see FileLock)
+pytest.importorskip('fcntl')
+
+HOLD_LOCK = """
+import sys
+sys.path.insert(0, {repo_dir!r})
+from generate_prompt import FileLock
+lock = FileLock({path!r})
+lock.acquire()
+print('held', flush=True)
+sys.stdin.read()
+"""
+
+
+def test_lock_excludes_other_holders(tmp_path):
+    path = tmp_path / 'locks' / 'job.lock'
+    with FileLock(path) as held:
+        assert held.locked
+        other = FileLock(path, blocking=False)
+        assert not other.acquire()
+    assert other.acquire()
+    other.release()
+
+
+def test_lock_excludes_other_processes_until_they_exit(tmp_path):
+    path = tmp_path / 'job.lock'
+    holder = subprocess.Popen(
+        [sys.executable, '-c', HOLD_LOCK.format(repo_dir=str(REPO_DIR), path=str(path))],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == 'held'
+        assert not FileLock(path, blocking=False).acquire()
+    finally:
+        holder.stdin.close()
+        holder.wait(timeout=10)
+    lock = FileLock(path, blocking=False)
+    assert lock.acquire()
+    lock.release()
+
+
+def test_unusable_lock_file_does_not_block(tmp_path):
+    blocker = tmp_path / 'not-a-directory'
+    blocker.write_text('')
+    lock = FileLock(blocker / 'job.lock')
+    assert lock.acquire()
+    lock.release()
+
+
+def test_path_locks_are_kept_outside_the_locked_directory(tmp_path):
+    output_dir, lock_dir = tmp_path / 'out', tmp_path / 'locks'
+    output_dir.mkdir()
+    lock = FileLock.for_path(output_dir, lock_dir)
+    assert lock.path.parent == lock_dir
+    assert FileLock.for_path(output_dir / '.', lock_dir).path == lock.path
+    assert FileLock.for_path(tmp_path / 'other', lock_dir).path != lock.path
+
+    transaction = OutputTransaction(lock_dir=lock_dir)
+    transaction.write(output_dir / 'prompt.md', 'text', iter(()))
+    transaction.commit()
+    assert sorted(p.name for p in output_dir.iterdir()) == ['prompt.md']
@@ -0,0 +1,91 @@
+"""LanguageRegistry: name lookup, suggestions and languages loaded from files."""
+
+import json
+
+import pytest
+
+from generate_prompt import LanguageRegistry, PromptGenerator
+
+ELIXIR = {
+    'name': 'Elixir', 'extension': '.ex', 'package_manager': 'mix', 'package_file': 'mix.exs',
+    'build_command': 'mix compile', 'linter': 'credo', 'code_gen': 'macros',
+    'di_library': 'none', 'state_management': ['GenServer'], 'async_pattern': 'processes',
+    'result_type': '{:ok, value}', 'immutability': 'immutable by default',
+    'json_serialization': 'Jason',
+}
+
+
+@pytest.fixture
+def registry():
+    return LanguageRegistry(PromptGenerator.LANGUAGE_MAPPINGS, PromptGenerator.LANGUAGE_ALIASES)
+
+
+def write_language(base_dir, key, config):
+    directory = base_dir / '.cursor' / 'prompt_generator' / 'languages'
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f'{key}.json').write_text(json.dumps(config), encoding='utf-8')
+
+
+@pytest.mark.parametrize('name,key', [
+    ('react', 'react'),
+    ('reactjs', 'react'),
+    ('golang', 'go'),
+    ('  Flutter ', 'flutter'),
+])
+def test_keys_and_aliases_resolve_as_typed(registry, name, key):
+    assert registry.resolve(name) == key
+
+
+@pytest.mark.parametrize('name,key', [
+    ('React.js', 'react'),
+    ('react-js', 'react'),
+    ('React_JS', 'react'),
+    ('C#', 'csharp'),
+])
+def test_normalized_names_resolve(registry, name, key):
+    assert registry.resolve(name) == key
+
+
+def test_words_of_a_description_resolve(registry):
+    assert registry.resolve('flutter app') == 'flutter'
+    assert registry.resolve('a go service') == 'go'
+    assert registry.resolve('cobol mainframe') is None
+
+
+def test_unknown_names_get_trigram_suggestions(registry):
+    assert registry.suggest('fluter')[0] == 'flutter'
+    assert registry.suggest('kotln')[0] == 'kotlin'
+    assert registry.suggest('zzzz') == []
+
+
+def test_unknown_language_error_suggests_names(tmp_path):
+    with pytest.raises(ValueError, match='Did you mean: flutter'):
+        PromptGenerator(tmp_path).resolve_language('fluter')
+
+
+def test_aliases_must_name_a_known_language(registry):
+    with pytest.raises(ValueError, match='unknown language'):
+        registry.add_alias('ex', 'elixir')
+    with pytest.raises(ValueError, match='missing'):
+        registry.add('elixir', {'name': 'Elixir'})
+
+
+def test_language_files_add_languages_and_aliases(base_dir):
+    write_language(base_dir, 'elixir', dict(ELIXIR, aliases=['ex', 'Phoenix']))
+    generator = PromptGenerator(base_dir)
+    assert generator.resolve_language('phoenix') == ('elixir', ELIXIR)
+    assert generator.resolve_language('EX')[0] == 'elixir'
+    assert 'Elixir' in generator.render('test_rules', 'elixir')
+
+
+def test_language_file_replaces_a_built_in_language(base_dir):
+    config = dict(PromptGenerator.LANGUAGE_MAPPINGS['go'], linter='staticcheck')
+    write_language(base_dir, 'go', config)
+    generator = PromptGenerator(base_dir)
+    assert generator.resolve_language('golang')[1]['linter'] == 'staticcheck'
+
+
+def test_invalid_language_file_names_the_file(base_dir):
+    write_language(base_dir, 'elixir', {'name': 'Elixir'})
+    with pytest.raises(ValueError, match='elixir.json'):
+        PromptGenerator(base_dir).resolve_language('elixir')
@@ -0,0 +1,57 @@
+"""Layered outputs: an overlay resolves to exactly what render() returns."""
+
+import pytest
+
+from generate_prompt import PromptGenerator, PromptOverlay, _run_resolve
+
+CASES = [
+    ('research_plan', 'react', 'Login with email'),
+    ('implementation_plan', 'kotlin', 'Offline sync of notes'),
+    ('ui_ux_design', 'flutter', 'A calm meditation timer'),
+    ('test_rules', 'go', None),
+]
+
+
+@pytest.mark.parametrize('case', CASES, ids=['-'.join(case[:2]) for case in CASES])
+def test_overlay_resolves_to_the_rendered_prompt(base_dir, tmp_path, case):
+    prompt_type, language, requirements = case
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    generator = PromptGenerator(base_dir, deterministic=True, layered=True)
+    overlay = generator.generate(prompt_type, language, requirements, 'feature', output_dir)
+    base = output_dir / generator.generate_base_filename(prompt_type, language)
+    assert base.exists()
+    expected = PromptGenerator(base_dir, deterministic=True).render(*case)
+    assert PromptOverlay.resolve(overlay) == expected
+
+    resolved = tmp_path / 'resolved.md'
+    assert _run_resolve([str(overlay), '--output', str(resolved)]) == 0
+    assert resolved.read_text(encoding='utf-8') == expected
+
+
+def test_features_share_one_base(base_dir, tmp_path):
+    generator = PromptGenerator(base_dir, deterministic=True, layered=True)
+    single = PromptGenerator(base_dir, deterministic=True)
+    overlays = {
+        requirements: generator.generate('research_plan', 'react', requirements, name, tmp_path)
+        for name, requirements in (('login', 'Login with email'), ('search', 'Full-text search'))
+    }
+    assert sorted(path.name for path in tmp_path.glob('*.base.md')) == \
+        [generator.generate_base_filename('research_plan', 'react')]
+    for requirements, overlay in overlays.items():
+        expected = single.render('research_plan', 'react', requirements)
+        assert PromptOverlay.resolve(overlay) == expected
+
+
+def test_changed_base_is_refused(base_dir, tmp_path):
+    generator = PromptGenerator(base_dir, deterministic=True, layered=True)
+    overlay = generator.generate('test_rules', 'go', 'Login with email', 'login', tmp_path)
+    base = tmp_path / generator.generate_base_filename('test_rules', 'go')
+    base.write_text(base.read_text(encoding='utf-8') + 'edited\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='changed after'):
+        PromptOverlay.resolve(overlay)
+
+
+def test_layered_outputs_refuse_a_token_budget(base_dir):
+    with pytest.raises(ValueError):
+        PromptGenerator(base_dir, layered=True, token_budget=3000)
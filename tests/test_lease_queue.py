@@ -0,0 +1,118 @@
+"""LeaseQueue: each job runs once across workers sharing a queue directory."""
+
+import json
+import os
+import threading
+import time
+
+from generate_prompt import LeaseQueue, PromptGenerator, _run_batch
+
+
+def test_claim_is_exclusive_until_finished(tmp_path):
+    first, second = LeaseQueue(tmp_path / 'q'), LeaseQueue(tmp_path / 'q')
+    job = LeaseQueue.job_id({'prompt_type': 'research_plan', 'language': 'go'})
+    assert first.claim(job)
+    assert not second.claim(job)
+    first.finish(job, {'ok': True})
+    assert second.is_done(job)
+    assert not second.claim(job)
+
+
+def test_expired_lease_is_taken_over_once(tmp_path):
+    first = LeaseQueue(tmp_path / 'q', lease_seconds=5)
+    job = LeaseQueue.job_id({'prompt_type': 'research_plan', 'language': 'go'})
+    assert first.claim(job)
+    old = time.time() - 10
+    os.utime(first.leases_dir / f'{job}.0', (old, old))
+    second, third = LeaseQueue(tmp_path / 'q', 5), LeaseQueue(tmp_path / 'q', 5)
+    assert second.claim(job)
+    assert not third.claim(job)
+
+
+def test_job_id_follows_the_inputs():
+    record = {'prompt_type': 'research_plan', 'language': 'go'}
+    assert LeaseQueue.job_id(dict(record)) == LeaseQueue.job_id(record)
+    assert LeaseQueue.job_id(record, 'a') != LeaseQueue.job_id(record, 'b')
+
+
+def write_jobs(path, output_dir, languages):
+    path.write_text(''.join(
+        json.dumps({'prompt_type': 'research_plan', 'language': language,
+                    'output': str(output_dir)}) + '\n'
+        for language in languages
+    ))
+
+
+def test_jobs_are_claimed_when_they_start(base_dir, tmp_path, monkeypatch, capsys):
+    queue_dir, output_dir = tmp_path / 'q', tmp_path / 'out'
+    output_dir.mkdir()
+    jobs = tmp_path / 'jobs.jsonl'
+    write_jobs(jobs, output_dir, ['go', 'react', 'flutter'])
+    leases_seen = []
+    generate = PromptGenerator._generate
+
+    def observed_generate(generator, *args):
+        leases_seen.append(len(os.listdir(queue_dir / 'leases')))
+        return generate(generator, *args)
+
+    monkeypatch.setattr(PromptGenerator, '_generate', observed_generate)
+    assert _run_batch([str(jobs), '--base-dir', str(base_dir), '--no-cache',
+                       '--workers', '1', '--work-queue', str(queue_dir)]) == 0
+    assert leases_seen == [1, 2, 3]
+    assert len(capsys.readouterr().out.splitlines()) == 3
+
+
+def test_reused_queue_reruns_jobs_whose_inputs_changed(base_dir, tmp_path, capsys):
+    queue_dir, output_dir = tmp_path / 'q', tmp_path / 'out'
+    output_dir.mkdir()
+    jobs = tmp_path / 'jobs.jsonl'
+    write_jobs(jobs, output_dir, ['go'])
+    argv = [str(jobs), '--base-dir', str(base_dir), '--no-cache', '--work-queue', str(queue_dir)]
+
+    assert _run_batch(argv) == 0
+    assert len(capsys.readouterr().out.splitlines()) == 1
+    assert _run_batch(argv) == 0
+    assert capsys.readouterr().out == ''
+
+    template = base_dir / '.cursor' / 'commands' / 'common' / 'research_plan_common.prompt.md'
+    template.write_text(template.read_text(encoding='utf-8') + '\nEdited.\n', encoding='utf-8')
+    assert _run_batch(argv) == 0
+    assert len(capsys.readouterr().out.splitlines()) == 1
+
+
+def test_slow_job_keeps_its_lease_and_runs_once(base_dir, tmp_path, monkeypatch, capsys):
+    queue_dir, output_dir = tmp_path / 'q', tmp_path / 'out'
+    output_dir.mkdir()
+    jobs = tmp_path / 'jobs.jsonl'
+    write_jobs(jobs, output_dir, ['go'])
+    runs = []
+    generate = PromptGenerator._generate
+
+    def slow_generate(generator, *args):
+        runs.append(args[1])
+        time.sleep(1.0)
+        return generate(generator, *args)
+
+    monkeypatch.setattr(PromptGenerator, '_generate', slow_generate)
+    argv = [str(jobs), '--base-dir', str(base_dir), '--no-cache',
+            '--work-queue', str(queue_dir), '--lease-seconds', '0.3']
+    first = threading.Thread(target=_run_batch, args=(argv,))
+    first.start()
+    while not runs:
+        time.sleep(0.01)
+    # The second worker waits out several lease periods while the first one runs
+    assert _run_batch(argv) == 0
+    first.join()
+    assert runs == ['go']
+    assert len(capsys.readouterr().out.splitlines()) == 1
+
+
+def test_invalid_lines_are_reported_by_one_shard(base_dir, tmp_path, capsys):
+    jobs = tmp_path / 'jobs.jsonl'
+    jobs.write_text('not json\n[1, 2]\n{"broken": \n')
+    reported = []
+    for index in (1, 2, 3):
+        assert _run_batch([str(jobs), '--base-dir', str(base_dir), '--no-cache',
+                           '--shard', f'{index}/3']) in (0, 1)
+        reported.extend(json.loads(line)['line'] for line in capsys.readouterr().out.splitlines())
+    assert sorted(reported) == [1, 2, 3]
@@ -0,0 +1,71 @@
+"""OutputTransaction: staged writes are published together or not at all."""
+
+import os
+
+import pytest
+
+from generate_prompt import BuildManifest, OutputTransaction, PromptGenerator
+
+
+def stage(transaction, path, text):
+    return transaction.write(path, text, iter(()))
+
+
+def test_commit_publishes_every_staged_file(tmp_path):
+    first, second = tmp_path / 'a' / 'one.md', tmp_path / 'b' / 'two.md'
+    transaction = OutputTransaction()
+    assert stage(transaction, first, 'one')
+    assert stage(transaction, second, 'two')
+    assert not first.exists() and not second.exists()
+
+    assert transaction.commit() == 2
+    assert first.read_text() == 'one' and second.read_text() == 'two'
+    assert os.listdir(tmp_path / 'a') == ['one.md']
+
+
+def test_rollback_leaves_destinations_untouched(tmp_path):
+    target = tmp_path / 'out.md'
+    target.write_text('old')
+    with pytest.raises(RuntimeError):
+        with OutputTransaction() as transaction:
+            stage(transaction, target, 'new')
+            raise RuntimeError('job failed')
+    assert target.read_text() == 'old'
+    assert os.listdir(tmp_path) == ['out.md']
+
+
+def test_unchanged_file_is_not_staged(tmp_path):
+    target = tmp_path / 'out.md'
+    target.write_text('same')
+    transaction = OutputTransaction()
+    assert not stage(transaction, target, 'same')
+    assert transaction.commit() == 0
+
+
+def test_published_file_keeps_the_target_mode(tmp_path):
+    target = tmp_path / 'out.md'
+    target.write_text('old')
+    target.chmod(0o600)
+    transaction = OutputTransaction()
+    stage(transaction, target, 'new')
+    transaction.commit()
+    assert target.stat().st_mode & 0o777 == 0o600
+
+
+def test_manifest_is_saved_on_commit_only(base_dir, tmp_path):
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    manifest_path = output_dir / BuildManifest.FILENAME
+
+    generator = PromptGenerator(base_dir, incremental=True)
+    generator.transaction = OutputTransaction()
+    generator.generate('research_plan', 'go', output_path=output_dir)
+    assert not manifest_path.exists()
+    generator.transaction.rollback()
+    assert not manifest_path.exists()
+    assert os.listdir(output_dir) == []
+
+    generator.transaction = OutputTransaction()
+    path = generator.generate('research_plan', 'go', output_path=output_dir)
+    generator.transaction.commit()
+    assert BuildManifest(output_dir).is_current(path, generator.input_hash('research_plan', 'go'))
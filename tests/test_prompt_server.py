@@ -0,0 +1,46 @@
+"""PromptServer: resident templates reloaded from a watch list built once."""
+
+import json
+import os
+
+from generate_prompt import PromptGenerator, PromptServer
+
+
+def touch(path, text):
+    path.write_text(text, encoding='utf-8')
+    stat = path.stat()
+    # Make the change visible even within the file system's mtime resolution
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_polling_reuses_the_watch_list(base_dir, monkeypatch):
+    server = PromptServer(PromptGenerator(base_dir))
+    watched = server._watched_files()
+
+    def fail(self):
+        raise AssertionError('watch list built again')
+
+    monkeypatch.setattr(PromptServer, '_list_watched_files', fail)
+    assert server.reload_changed() == []
+    assert server._watched_files() is watched
+
+
+def test_edited_template_is_reloaded(base_dir):
+    server = PromptServer(PromptGenerator(base_dir))
+    template = base_dir / '.cursor' / 'commands' / 'common' / 'test_rules_common.prompt.md'
+    touch(template, template.read_text(encoding='utf-8') + '\nServer edit.\n')
+    assert server.reload_changed() == ['test_rules_common.prompt.md']
+    assert 'Server edit.' in server.generator.render('test_rules', 'go')
+
+
+def test_new_language_file_is_watched(base_dir):
+    language_dir = base_dir / '.cursor' / 'prompt_generator' / 'languages'
+    language_dir.mkdir(parents=True)
+    server = PromptServer(PromptGenerator(base_dir))
+    config = dict(PromptGenerator.LANGUAGE_MAPPINGS['go'], name='Zig', extension='.zig')
+    path = language_dir / 'zig.json'
+    touch(path, json.dumps(config))
+    os.utime(language_dir, ns=(0, 0))
+    server.reload_changed()
+    assert path in server._watched_files()
+    assert server.generator.resolve_language('zig')[1]['name'] == 'Zig'
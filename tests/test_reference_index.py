@@ -0,0 +1,97 @@
+"""ReferenceIndex: inverted index over the CSV files, ranked by IDF."""
+
+import os
+
+import pytest
+
+from generate_prompt import PromptGenerator, ReferenceIndex, TemplateCache
+
+STYLES = """Style Category,Keywords,Best For,Notes
+Minimalism,"clean, whitespace, simple",portfolios,Few colors
+Brutalism,"raw, bold, simple",portfolios,Harsh type
+Neumorphism,"soft, shadow, simple",fitness apps,Low contrast
+Glassmorphism,"frosted, blur, translucent",dashboards,Layered panels
+"""
+
+COLORS = """Product Type,Keywords,Primary
+Fitness App,"energetic, health",#FF5722
+Banking,"trust, secure",#1A237E
+"""
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    directory = tmp_path / 'data'
+    (directory / 'stacks').mkdir(parents=True)
+    (directory / 'styles.csv').write_text(STYLES, encoding='utf-8')
+    (directory / 'colors.csv').write_text(COLORS, encoding='utf-8')
+    (directory / 'stacks' / 'flutter.csv').write_text(
+        'Category,Guideline\nLayout,Use simple slivers for long lists\n', encoding='utf-8'
+    )
+    return directory
+
+
+def test_terms_drop_stopwords_and_fold_plurals():
+    assert ReferenceIndex.terms('The Dashboards for Categories and C# apps') == \
+        ['dashboard', 'category', 'c#', 'app']
+
+
+def test_build_indexes_weighted_columns_only():
+    index = ReferenceIndex.build(STYLES)
+    assert index['header'] == ['Style Category', 'Keywords', 'Best For', 'Notes']
+    assert index['postings']['frosted'] == [[3, 3]]
+    assert index['postings']['dashboard'] == [[3, 2]]
+    assert index['postings']['portfolio'] == [[0, 2], [1, 2]]
+    # Notes is not an indexed column
+    assert 'layered' not in index['postings']
+
+
+def test_rare_terms_outrank_common_ones(data_dir):
+    results = ReferenceIndex(data_dir).search('simple frosted look', limit=2)
+    _, rows = results['styles']
+    # "frosted" is in one row, "simple" in three: the rare match ranks first,
+    # ahead of rows that come earlier in the file
+    assert rows[0][0] == 'Glassmorphism'
+    assert len(rows) == 2
+
+
+def test_results_are_per_file_and_filterable(data_dir):
+    index = ReferenceIndex(data_dir)
+    results = index.search('simple fitness app')
+    assert sorted(results) == ['colors', 'stacks/flutter', 'styles']
+    assert results['colors'][1][0][0] == 'Fitness App'
+    results = index.search('simple fitness app', include=lambda source: '/' not in source)
+    assert sorted(results) == ['colors', 'styles']
+    assert index.search('quantum') == {}
+
+
+def test_refresh_reindexes_only_changed_files(data_dir):
+    index = ReferenceIndex(data_dir)
+    assert index.refresh() == ['colors', 'stacks/flutter', 'styles']
+    assert index.refresh() == []
+    colors = data_dir / 'colors.csv'
+    colors.write_text(COLORS + 'Crypto Wallet,"secure, dark",#00E676\n', encoding='utf-8')
+    assert index.refresh() == ['colors']
+    assert index.search('wallet')['colors'][1][0][0] == 'Crypto Wallet'
+    os.remove(data_dir / 'stacks' / 'flutter.csv')
+    assert index.refresh() == ['stacks/flutter']
+
+
+def test_cached_indexes_are_not_parsed_again(data_dir, tmp_path, monkeypatch):
+    cache = TemplateCache(tmp_path / 'cache')
+    expected = ReferenceIndex(data_dir, cache).search('simple fitness app')
+
+    def fail(cls, text):
+        raise AssertionError('parsed an unchanged file')
+
+    monkeypatch.setattr(ReferenceIndex, 'build', classmethod(fail))
+    assert ReferenceIndex(data_dir, cache).search('simple fitness app') == expected
+
+
+def test_ui_ux_design_embeds_the_best_rows(base_dir):
+    generator = PromptGenerator(base_dir, deterministic=True)
+    prompt = generator.render('ui_ux_design', 'flutter', 'A fitness tracking app')
+    assert '## Relevant UI/UX Reference Data' in prompt
+    assert '### stacks/flutter.csv' in prompt
+    assert '### stacks/react.csv' not in prompt
+    assert '## Relevant UI/UX Reference Data' not in generator.render('ui_ux_design', 'flutter')
@@ -0,0 +1,103 @@
+"""RenderCache: rendered prompts memoized by their inputs, in memory and on disk."""
+
+import threading
+import time
+
+import pytest
+
+from generate_prompt import PromptGenerator, RenderCache, TemplateCache
+
+
+class Renderer:
+    """Counts calls, optionally taking a while to render."""
+
+    def __init__(self, text='rendered', delay=0.0):
+        self.text = text
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.text
+
+
+def test_get_or_render_renders_each_key_once():
+    cache = RenderCache()
+    render = Renderer()
+    assert cache.get_or_render('a', render) == 'rendered'
+    assert cache.get_or_render('a', render) == 'rendered'
+    assert render.calls == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_shared_store_renders_once_across_caches(tmp_path):
+    store = TemplateCache(tmp_path / 'cache')
+    render = Renderer()
+    RenderCache(store=store).get_or_render('a', render)
+    other = RenderCache(store=store)
+    assert other.get_or_render('a', render) == 'rendered'
+    assert render.calls == 1
+    assert other.stats()['store_hits'] == 1
+
+
+def test_concurrent_misses_render_once_with_a_store(tmp_path):
+    # Waiting for the renderer relies on flock() (see FileLock)
+    pytest.importorskip('fcntl')
+    store = TemplateCache(tmp_path / 'cache')
+    render = Renderer(delay=0.2)
+    results = []
+
+    def lookup():
+        results.append(RenderCache(store=store).get_or_render('a', render))
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['rendered'] * 4
+    assert render.calls == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = RenderCache(max_entries=2)
+    cache.put('a', 'A')
+    cache.put('b', 'B')
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A' and cache.get('c') == 'C'
+
+    cache = RenderCache(max_chars=10)
+    cache.put('a', 'x' * 6)
+    cache.put('b', 'y' * 6)
+    assert cache.get('a') is None
+    assert cache.stats()['evictions'] == 1 and cache.stats()['chars'] == 6
+
+
+def test_generator_renders_each_prompt_once(base_dir, monkeypatch):
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', '0')
+    calls = []
+    render = PromptGenerator._render
+
+    def counted_render(generator, *args):
+        calls.append(args)
+        return render(generator, *args)
+
+    monkeypatch.setattr(PromptGenerator, '_render', counted_render)
+    generator = PromptGenerator(base_dir, render_cache=RenderCache())
+    first = generator.render('test_rules', 'go', 'Login with email')
+    assert generator.render('test_rules', 'golang', 'Login with email') == first
+    assert len(calls) == 1
+    generator.render('test_rules', 'go', 'Password reset')
+    assert len(calls) == 2
+    assert first == PromptGenerator(base_dir).render('test_rules', 'go', 'Login with email')
+
+
+def test_dates_are_stamped_when_prompts_are_returned(base_dir, monkeypatch):
+    generator = PromptGenerator(base_dir, render_cache=RenderCache())
+    first = generator.render('test_rules', 'go')
+    assert PromptGenerator.DATE_PLACEHOLDER not in first
+    monkeypatch.setattr('generate_prompt._timestamp', lambda epoch=None: '2030-01-01 00:00:00')
+    assert '2030-01-01 00:00:00' in generator.render('test_rules', 'go')
@@ -0,0 +1,30 @@
+"""Matrix rendering: render_matrix() gives every language what render() gives it."""
+
+import pytest
+
+from generate_prompt import PromptGenerator
+
+REQUIREMENTS = 'Login with email and a password reset flow'
+
+
+@pytest.mark.parametrize('token_budget', [None, 3000], ids=['full', 'budget'])
+@pytest.mark.parametrize('prompt_type,requirements', [
+    ('research_plan', None),
+    ('implementation_plan', REQUIREMENTS),
+    ('ui_ux_design', REQUIREMENTS),
+    ('test_rules', None),
+])
+def test_matrix_matches_render(base_dir, prompt_type, requirements, token_budget):
+    generator = PromptGenerator(base_dir, deterministic=True, token_budget=token_budget)
+    prompts = generator.render_matrix(prompt_type, requirements=requirements)
+    assert list(prompts) == list(generator.languages)
+    single = PromptGenerator(base_dir, deterministic=True, token_budget=token_budget)
+    for language, prompt in prompts.items():
+        assert prompt == single.render(prompt_type, language, requirements), language
+
+
+def test_matrix_keys_are_the_languages_as_given(base_dir):
+    generator = PromptGenerator(base_dir, deterministic=True)
+    prompts = generator.render_matrix('test_rules', ['React', 'golang', 'flutter'])
+    assert list(prompts) == ['React', 'golang', 'flutter']
+    assert prompts['golang'] == generator.render('test_rules', 'go')
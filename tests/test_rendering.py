@@ -0,0 +1,67 @@
+"""Compiled templates and terminology: output matches the known-good prompts."""
+
+from pathlib import Path
+
+import pytest
+
+from generate_prompt import PromptGenerator, TemplateCache, TerminologyRewriter
+
+# Rendered by the multi-pass replace chain that compiled templates replaced,
+# with every generation date fixed at the epoch
+RENDERED_DIR = Path(__file__).parent / 'data' / 'rendered'
+REQUIREMENTS = 'Login with email'
+
+CASES = [
+    ('project_rules', 'flutter', None),
+    ('project_rules', 'react', None),
+    ('project_rules', 'go', None),
+    ('test_rules', 'kotlin', REQUIREMENTS),
+    ('test_rules', 'python', REQUIREMENTS),
+    ('implementation_plan', 'react', None),
+    ('ui_ux_bridge', 'kotlin', None),
+]
+
+
+def expected(prompt_type, language, requirements):
+    suffix = '_requirements' if requirements else ''
+    return (RENDERED_DIR / f'{prompt_type}_{language}{suffix}.md').read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize('prompt_type,language,requirements', CASES)
+def test_render_matches_known_good_output(base_dir, monkeypatch, prompt_type, language,
+                                          requirements):
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', '0')
+    generator = PromptGenerator(base_dir)
+    assert generator.render(prompt_type, language, requirements) == \
+        expected(prompt_type, language, requirements)
+
+
+def test_cached_templates_render_the_same(base_dir, tmp_path, monkeypatch):
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', '0')
+    cache_dir = tmp_path / 'cache'
+    for _ in range(2):
+        generator = PromptGenerator(base_dir, cache=TemplateCache(cache_dir))
+        for case in CASES:
+            assert generator.render(*case) == expected(*case)
+
+
+def test_leftmost_terminology_rule_wins(tmp_path):
+    rewriter = PromptGenerator(tmp_path).get_terminology_rewriter('react')
+    # Sequential rules turned this into "flutter npm dependencies"; the match
+    # starting first now takes the whole phrase
+    assert rewriter.sub('Run flutter pub dependencies') == 'Run npm dependencies'
+    assert rewriter.sub('Check pub dependencies') == 'Check npm dependencies'
+    assert rewriter.sub('Edit pubspec.yaml') == 'Edit package.json'
+
+
+def test_replacements_are_not_rewritten_again():
+    rewriter = TerminologyRewriter([(r'\bnpm\b', 'flutter pub'), (r'\bflutter pub\b', 'npm')])
+    assert rewriter.sub('npm and flutter pub') == 'flutter pub and npm'
+
+
+def test_regex_rules_win_over_terms_at_the_same_position():
+    rewriter = TerminologyRewriter([(r'\bstate\b', 'signal')],
+                                   {'state': 'store', 'state machine': 'reducer'})
+    assert rewriter.sub('state machine') == 'signal machine'
+    rewriter = TerminologyRewriter([], {'state': 'store', 'state machine': 'reducer'})
+    assert rewriter.sub('a state machine and state') == 'a reducer and store'
@@ -0,0 +1,96 @@
+"""Conditional section parsing: error reporting and bounded time on hostile input."""
+
+import time
+
+import pytest
+
+from benchmark_prompt import ADVERSARIAL_CASES, fuzz_corpus
+from generate_prompt import CompiledTemplate, PromptGenerator, TemplateSyntaxError
+
+# Per case at 1 MB, the size the adversarial benchmark starts from
+MAX_SECONDS = 5.0
+SIZE = 1024 * 1024
+
+
+def _render(generator: PromptGenerator, content: str) -> None:
+    generator.customize_content(content, generator.get_language_config('react'), None, 'react')
+
+
+@pytest.mark.parametrize('name', sorted(ADVERSARIAL_CASES))
+@pytest.mark.parametrize('strict', [True, False], ids=['strict', 'lenient'])
+def test_adversarial_case_within_bound(tmp_path, name, strict):
+    content = ADVERSARIAL_CASES[name](SIZE)
+    generator = PromptGenerator(tmp_path, strict_sections=strict)
+    start = time.perf_counter()
+    try:
+        _render(generator, content)
+    except TemplateSyntaxError:
+        assert strict
+    assert time.perf_counter() - start < MAX_SECONDS
+
+
+def test_lenient_mode_accepts_fuzzed_markers(tmp_path):
+    generator = PromptGenerator(tmp_path, strict_sections=False)
+    start = time.perf_counter()
+    for content in fuzz_corpus(200):
+        _render(generator, content)
+    assert time.perf_counter() - start < MAX_SECONDS
+
+
+def test_unclosed_begin_reports_its_line():
+    source = "# Title\n\n<!-- BEGIN:REACT -->\nReact only\n"
+    with pytest.raises(TemplateSyntaxError) as excinfo:
+        CompiledTemplate(source, [])
+    assert excinfo.value.line == 3
+    assert 'Unclosed' in str(excinfo.value)
+
+
+def test_stray_end_reports_its_line():
+    source = "one\ntwo\n<!-- END:GO -->\n"
+    with pytest.raises(TemplateSyntaxError) as excinfo:
+        CompiledTemplate(source, [])
+    assert excinfo.value.line == 3
+
+
+def test_crossed_end_names_the_open_section():
+    source = "<!-- BEGIN:REACT -->\n<!-- BEGIN:GO -->\n<!-- END:REACT -->\n"
+    with pytest.raises(TemplateSyntaxError) as excinfo:
+        CompiledTemplate(source, [])
+    assert excinfo.value.line == 3
+    assert 'END:GO' in str(excinfo.value)
+
+
+def test_template_name_is_part_of_the_error(base_dir):
+    template = base_dir / '.cursor' / 'commands' / 'common' / 'research_plan_common.prompt.md'
+    template.write_text("intro\n<!-- BEGIN:FLUTTER -->\n", encoding='utf-8')
+    generator = PromptGenerator(base_dir)
+    with pytest.raises(TemplateSyntaxError) as excinfo:
+        generator.render('research_plan', 'flutter')
+    assert str(excinfo.value).startswith('research_plan_common.prompt.md, line 2:')
+
+
+def test_lenient_mode_keeps_unbalanced_markers_as_text():
+    source = "a\n<!-- BEGIN:REACT -->\nb\n"
+    compiled = CompiledTemplate(source, [], strict=False)
+    assert compiled.render({}, {'react'}) == source
+
+
+# Source, line of the error in strict mode, marker kept as text in lenient mode
+UNBALANCED = [
+    ("intro\n\n<!-- BEGIN:GO -->\nGo only\n", 3, '<!-- BEGIN:GO -->'),
+    ("one\ntwo\n<!-- END:GO -->\n", 3, '<!-- END:GO -->'),
+    ("<!-- BEGIN:GO -->\nGo\n<!-- BEGIN:REACT -->\n\n<!-- END:GO -->\n", 5, '<!-- BEGIN:REACT -->'),
+]
+
+
+@pytest.mark.parametrize('source,line,kept', UNBALANCED)
+def test_strict_reports_the_line_lenient_keeps_the_marker(base_dir, source, line, kept):
+    template = base_dir / '.cursor' / 'commands' / 'common' / 'test_rules_common.prompt.md'
+    template.write_text(source, encoding='utf-8')
+    with pytest.raises(TemplateSyntaxError) as excinfo:
+        PromptGenerator(base_dir).render('test_rules', 'go')
+    assert excinfo.value.line == line
+    assert str(excinfo.value).startswith(f'test_rules_common.prompt.md, line {line}:')
+
+    lenient = PromptGenerator(base_dir, strict_sections=False).render('test_rules', 'go')
+    assert kept in lenient.splitlines()
@@ -0,0 +1,25 @@
+"""Startup: the import time budget and the modules importing must not load."""
+
+import py_compile
+import subprocess
+import sys
+
+from benchmark_prompt import DEFERRED_MODULES, _import_time_ms
+from conftest import REPO_DIR
+
+# Same budget as `benchmark_prompt.py startup`
+IMPORT_BUDGET_MS = 25
+
+
+def test_import_within_budget():
+    # Measure warm starts: bytecode is normally cached after the first run
+    py_compile.compile(str(REPO_DIR / 'generate_prompt.py'))
+    best = min(_import_time_ms(REPO_DIR) for _ in range(20))
+    assert best <= IMPORT_BUDGET_MS, f"import took {best:.1f}ms"
+
+
+def test_import_does_not_load_deferred_modules():
+    probe = (f"import sys; sys.path.insert(0, {str(REPO_DIR)!r}); import generate_prompt; "
+             f"print(','.join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
@@ -0,0 +1,141 @@
+"""TemplateCache and the stage memo: keys, the stat index, eviction, unusable directories."""
+
+import os
+
+from generate_prompt import CompiledTemplate, PromptGenerator, TemplateCache
+
+
+def counted(function, calls):
+    """Wrap function to record the arguments of each call in calls."""
+    def wrapper(*args, **kwargs):
+        calls.append(args[1:])
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def test_text_round_trip_and_miss(tmp_path):
+    cache = TemplateCache(tmp_path / 'cache')
+    assert cache.get_text('missing') is None
+    cache.put_text('key', 'some text')
+    assert TemplateCache(tmp_path / 'cache').get_text('key') == 'some text'
+
+
+def test_compiled_round_trip(tmp_path):
+    cache = TemplateCache(tmp_path / 'cache')
+    compiled = CompiledTemplate("a [language]\n<!-- BEGIN:GO -->go<!-- END:GO -->\n", ['[language]'])
+    cache.put_compiled('key', compiled)
+    loaded = cache.get_compiled('key')
+    assert loaded.render({'[language]': 'Go'}, {'go'}) == compiled.render({'[language]': 'Go'}, {'go'})
+
+
+def test_keys_depend_on_every_part():
+    assert TemplateCache.key('a', 'b') == TemplateCache.key('a', 'b')
+    assert TemplateCache.key('a', 'b') != TemplateCache.key('ab')
+    assert TemplateCache.key('a', 'b') != TemplateCache.key('b', 'a')
+
+
+def test_content_hash_follows_file_changes(tmp_path):
+    cache = TemplateCache(tmp_path / 'cache')
+    template = tmp_path / 'template.md'
+    template.write_text('one', encoding='utf-8')
+    first = cache.content_hash(template)
+    assert TemplateCache(tmp_path / 'cache').content_hash(template) == first
+    template.write_text('two!', encoding='utf-8')
+    assert cache.content_hash(template) != first
+
+
+def test_index_keeps_entries_of_other_processes(tmp_path):
+    first, second = TemplateCache(tmp_path / 'cache'), TemplateCache(tmp_path / 'cache')
+    a, b = tmp_path / 'a.md', tmp_path / 'b.md'
+    a.write_text('a', encoding='utf-8')
+    b.write_text('b', encoding='utf-8')
+    first._load_index()
+    second.content_hash(b)
+    first.content_hash(a)
+    index = TemplateCache(tmp_path / 'cache')._load_index()
+    assert str(a) in index and str(b) in index
+
+
+def test_eviction_keeps_the_cache_under_max_bytes(tmp_path):
+    cache = TemplateCache(tmp_path / 'cache', max_bytes=1000)
+    for i in range(5):
+        cache.put_text(f'k{i}', 'x' * 400)
+        os.utime(tmp_path / 'cache' / f'k{i}.txt', ns=(i * 10 ** 9, i * 10 ** 9))
+    assert cache.get_text('k0') is None
+    assert cache.get_text('k4') == 'x' * 400
+    size = sum(path.stat().st_size for path in (tmp_path / 'cache').glob('*.txt'))
+    assert size <= 1000
+
+
+def test_unusable_cache_directory_does_not_fail_generation(base_dir, tmp_path):
+    blocker = tmp_path / 'not-a-directory'
+    blocker.write_text('', encoding='utf-8')
+    cache = TemplateCache(blocker / 'cache')
+    generator = PromptGenerator(base_dir, cache=cache, deterministic=True)
+    output = generator.generate('research_plan', 'flutter', output_path=tmp_path / 'out.md')
+    expected = PromptGenerator(base_dir, deterministic=True).render('research_plan', 'flutter')
+    assert output.read_text(encoding='utf-8') == expected
+
+
+def test_new_generator_version_misses(base_dir, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    PromptGenerator(base_dir, cache=TemplateCache(cache_dir)).render('test_rules', 'go')
+    compiled = []
+    monkeypatch.setattr(CompiledTemplate, '__init__', counted(CompiledTemplate.__init__, compiled))
+    PromptGenerator(base_dir, cache=TemplateCache(cache_dir)).render('test_rules', 'go')
+    assert compiled == []
+    monkeypatch.setattr('generate_prompt.__version__', '0.0.0-test')
+    PromptGenerator(base_dir, cache=TemplateCache(cache_dir)).render('test_rules', 'go')
+    assert len(compiled) == 1
+
+
+def test_stat_index_skips_reading_unchanged_files(tmp_path, monkeypatch):
+    cache = TemplateCache(tmp_path / 'cache')
+    template = tmp_path / 'template.md'
+    template.write_text('one', encoding='utf-8')
+    first = cache.content_hash(template)
+    reads = []
+    monkeypatch.setattr(type(template), 'read_bytes', counted(type(template).read_bytes, reads))
+    assert TemplateCache(tmp_path / 'cache').content_hash(template) == first
+    assert reads == []
+    # Same size, new mtime: read and hashed again
+    template.write_text('two', encoding='utf-8')
+    os.utime(template, ns=(1, 1))
+    assert cache.content_hash(template) != first
+    assert len(reads) == 1
+
+
+def test_reading_an_entry_protects_it_from_eviction(tmp_path):
+    cache = TemplateCache(tmp_path / 'cache', max_bytes=1000)
+    for i in range(2):
+        cache.put_text(f'k{i}', 'x' * 400)
+        os.utime(tmp_path / 'cache' / f'k{i}.txt', ns=(i * 10 ** 9, i * 10 ** 9))
+    assert cache.get_text('k0') is not None
+    cache.put_text('k2', 'x' * 400)
+    assert cache.get_text('k1') is None
+    assert cache.get_text('k0') is not None and cache.get_text('k2') is not None
+
+
+def test_requirements_only_change_skips_template_processing(base_dir, monkeypatch):
+    requirements = ['Login with email', 'Password reset', None]
+    expected = [PromptGenerator(base_dir, deterministic=True).render('research_plan', 'go', text)
+                for text in requirements]
+    bodies = []
+    monkeypatch.setattr(PromptGenerator, '_render_body',
+                        counted(PromptGenerator._render_body, bodies))
+    generator = PromptGenerator(base_dir, deterministic=True)
+    assert [generator.render('research_plan', 'go', text) for text in requirements] == expected
+    assert len(bodies) == 1
+
+
+def test_stage_memo_drops_least_recently_used_bodies(base_dir, monkeypatch):
+    monkeypatch.setattr(PromptGenerator, 'STAGE_MEMO_ENTRIES', 2)
+    bodies = []
+    monkeypatch.setattr(PromptGenerator, '_render_body',
+                        counted(PromptGenerator._render_body, bodies))
+    generator = PromptGenerator(base_dir)
+    for language in ('go', 'rust', 'go', 'kotlin', 'go', 'rust'):
+        generator.render('test_rules', language)
+    # go stays in memory as the most recently used; rust was dropped for kotlin
+    assert len(bodies) == 4
+
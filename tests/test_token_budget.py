@@ -0,0 +1,28 @@
+"""Token budget: PRIORITY markers survive rendering until the pruner has used them."""
+
+from generate_prompt import PromptGenerator
+
+TEMPLATE = """# Guide
+
+## Essentials <!-- PRIORITY: 100 -->
+
+Always keep this.
+
+## Background <!-- PRIORITY: 10 -->
+
+""" + "Optional detail. " * 200 + "\n"
+
+
+def test_customize_content_prunes_low_priority_sections(base_dir):
+    generator = PromptGenerator(base_dir, token_budget=200)
+    content = generator.customize_content(TEMPLATE, generator.get_language_config('go'))
+    assert 'Always keep this.' in content
+    assert 'Optional detail.' not in content
+    assert 'PRIORITY' not in content
+
+
+def test_customize_content_without_budget_drops_markers(base_dir):
+    generator = PromptGenerator(base_dir)
+    content = generator.customize_content(TEMPLATE, generator.get_language_config('go'))
+    assert 'Optional detail.' in content
+    assert 'PRIORITY' not in content
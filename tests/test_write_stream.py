@@ -0,0 +1,43 @@
+"""Streaming: write_stream() writes exactly what render() returns."""
+
+import io
+
+import pytest
+
+from generate_prompt import PromptGenerator
+
+REQUIREMENTS = 'Login with email and a password reset flow'
+
+CASES = [
+    ('research_plan', 'react', None),
+    ('implementation_plan', 'kotlin', REQUIREMENTS),
+    ('ui_ux_design', 'flutter', REQUIREMENTS),
+    ('ui_ux_bridge', 'swift', None),
+    ('test_rules', 'go', REQUIREMENTS),
+]
+
+
+def streamed(generator, *case):
+    stream = io.StringIO()
+    written = generator.write_stream(stream, *case)
+    assert written == len(stream.getvalue())
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize('token_budget', [None, 3000], ids=['full', 'budget'])
+@pytest.mark.parametrize('case', CASES, ids=['-'.join(case[:2]) for case in CASES])
+def test_stream_matches_render(base_dir, case, token_budget):
+    generator = PromptGenerator(base_dir, deterministic=True, token_budget=token_budget)
+    single = PromptGenerator(base_dir, deterministic=True, token_budget=token_budget)
+    expected = single.render(*case)
+    assert streamed(generator, *case) == expected
+    # The second time the language body comes from the stage memo
+    assert streamed(generator, *case) == expected
+
+
+def test_small_chunks_match_render(base_dir, monkeypatch):
+    # Terminology rewrites and the requirements insertion cross chunk boundaries
+    monkeypatch.setattr(PromptGenerator, 'STREAM_CHUNK_SIZE', 97)
+    for case in CASES:
+        generator = PromptGenerator(base_dir, deterministic=True)
+        assert streamed(generator, *case) == generator.render(*case)